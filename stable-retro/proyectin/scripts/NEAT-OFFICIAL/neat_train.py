@@ -6,32 +6,23 @@ import csv
 import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
 
-# Crear el entorno
-def create_environment():
-    """Crear y configurar el entorno de GradiusIII-Snes."""
-    env = retro.make(game="GradiusIII-Snes")
-    return env
+# Política de un genoma; se construye dentro de cada proceso evaluador
+def genome_policy(job):
+    """Crear la red neuronal de un genoma y devolver su función de acción."""
+    genome, config = job
+    net = neat.nn.FeedForwardNetwork.create(genome, config)
+    return lambda obs: np.argmax(net.activate(obs))
+
+# Evaluador paralelo con un emulador ya cargado por proceso
+evaluator = None
 
 # Función para evaluar una red neuronal en el entorno
 def eval_genomes(genomes, config):
-    """Evaluar la población de redes neuronales."""
-    for genome_id, genome in genomes:
-        genome.fitness = 0  # Inicializar la puntuación de cada genoma
-
-        net = neat.nn.FeedForwardNetwork.create(genome, config)
-        env = create_environment()
-
-        done = False
-        obs = env.reset()
-        total_reward = 0
-
-        while not done:
-            action = np.argmax(net.activate(obs))  # Tomar acción usando la red neuronal
-            obs, reward, done, info = env.step(action)  # Realizar la acción en el entorno
-            total_reward += reward
-
-        genome.fitness = total_reward  # Asignar la recompensa total como la aptitud del genoma
-        env.close()
+    """Evaluar la población de redes neuronales en paralelo."""
+    results = evaluator.evaluate([(genome, config) for _, genome in genomes])
+    for (genome_id, genome), result in zip(genomes, results):
+        # La recompensa total es la aptitud del genoma
+        genome.fitness = result.fitness if result.error is None else 0
 
 # Función para guardar los datos de entrenamiento en un archivo CSV
 def save_training_data(times, scores, filename="training_data_neat.csv"):
@@ -92,8 +83,10 @@ def train_neat():
     generations = 1000  # Ajusta según tus necesidades
     print(f"Iniciando el entrenamiento con {generations} generaciones...")
 
-    # Iniciar el entrenamiento
-    p.run(eval_genomes, generations)
+    # Iniciar el entrenamiento usando todos los núcleos
+    global evaluator
+    with retro.PopulationEvaluator("GradiusIII-Snes", genome_policy) as evaluator:
+        p.run(eval_genomes, generations)
 
     # Unificar los datos de todos los callbacks
     unified_times = eval_callback.times_in_minutes
@@ -1,21 +1,33 @@
+import importlib
 import os
 import sys
 
 import retro.data
-from retro._retro import Movie, RetroEmulator, core_path
+from retro._retro import Movie, StateStore, core_path
 from retro.enums import Actions, Observations, State
-from retro.retro_env import RetroEnv
 
 ROOT_DIR = os.path.abspath(os.path.dirname(__file__))
 core_path(os.path.join(os.path.dirname(__file__), "cores"))
 
-with open(os.path.join(os.path.dirname(__file__), "VERSION.txt")) as f:
-    __version__ = f.read()
+# Attributes that are only imported on first use, as they pull in numpy and
+# gymnasium, which most command line tools and subprocesses never need
+_LAZY_ATTRS = {
+    "RetroEnv": "retro.retro_env",
+    "VecRetroEnv": "retro.retro_env",
+    "AsyncRetroVecEnv": "retro.retro_env",
+    "SubprocVecRetroEnv": "retro.subproc_env",
+    "EvaluationResult": "retro.evaluation",
+    "PopulationEvaluator": "retro.evaluation",
+    "TrajectoryRecorder": "retro.trajectory",
+    "load_trajectory": "retro.trajectory",
+}
 
 
 __all__ = [
     "Movie",
     "RetroEmulator",
+    "RetroVecEmulator",
+    "StateStore",
     "Actions",
     "State",
     "Observations",
@@ -23,10 +35,36 @@ __all__ = [
     "get_romfile_system",
     "get_system_info",
     "make",
+    "clear_env_pool",
     "RetroEnv",
+    "VecRetroEnv",
+    "AsyncRetroVecEnv",
+    "SubprocVecRetroEnv",
+    "EvaluationResult",
+    "PopulationEvaluator",
+    "TrajectoryRecorder",
+    "load_trajectory",
 ]
 
-retro.data.init_core_info(core_path())
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        value = getattr(importlib.import_module(_LAZY_ATTRS[name]), name)
+    elif name in ("RetroEmulator", "RetroVecEmulator"):
+        # Emulators look up their core by ROM extension in the core info
+        retro.data.load_core_info()
+        value = getattr(retro._retro, name)
+    elif name == "__version__":
+        with open(os.path.join(os.path.dirname(__file__), "VERSION.txt")) as f:
+            value = f.read()
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRS) | set(__all__))
 
 
 def get_core_path(corename):
@@ -48,9 +86,22 @@ def get_system_info(system):
         raise KeyError(f"Unsupported system type: {system}")
 
 
-def make(game, state=State.DEFAULT, inttype=retro.data.Integrations.DEFAULT, **kwargs):
+_env_pool = {}
+
+
+def make(
+    game,
+    state=State.DEFAULT,
+    inttype=retro.data.Integrations.DEFAULT,
+    pooled=False,
+    **kwargs,
+):
     """
     Create a Gym environment for the specified game
+
+    With ``pooled=True``, closing the environment keeps its emulator booted
+    and a later pooled ``make`` for the same game and options hands it out
+    again, only swapping the state, scenario and data file
     """
     try:
         retro.data.get_romfile_path(game, inttype)
@@ -61,13 +112,54 @@ def make(game, state=State.DEFAULT, inttype=retro.data.Integrations.DEFAULT, **k
             raise FileNotFoundError(
                 f"Game not found: {game}. Did you make sure to import the ROM?",
             )
-    return RetroEnv(game, state, inttype=inttype, **kwargs)
+    _notify()
+    if not pooled:
+        return retro.RetroEnv(game, state, inttype=inttype, **kwargs)
+
+    scenario = kwargs.pop("scenario", None)
+    info = kwargs.pop("info", None)
+    key = (game, inttype, repr(sorted(kwargs.items())))
+    idle = _env_pool.setdefault(key, [])
+    if idle:
+        env = idle.pop()
+        env.reconfigure(state, scenario=scenario, info=info)
+        return env
+    env = retro.RetroEnv(
+        game,
+        state,
+        inttype=inttype,
+        scenario=scenario,
+        info=info,
+        **kwargs,
+    )
+    env._pool = idle
+    return env
+
+
+def clear_env_pool():
+    """
+    Close every idle environment kept by ``make(pooled=True)``
+    """
+    for idle in _env_pool.values():
+        for env in idle:
+            env._pool = None
+            env.close()
+    _env_pool.clear()
 
 
-try:
-    from farama_notifications import notifications
+_notified = False
+
+
+def _notify():
+    global _notified
+    if _notified:
+        return
+    _notified = True
+    try:
+        from farama_notifications import notifications
 
-    if "stable-retro" in notifications and __version__ in notifications["stable-retro"]:
-        print(notifications["stable-retro"][__version__], file=sys.stderr)
-except Exception:  # nosec
-    pass
+        version = retro.__version__
+        if "stable-retro" in notifications and version in notifications["stable-retro"]:
+            print(notifications["stable-retro"][version], file=sys.stderr)
+    except Exception:  # nosec
+        pass
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+"""
+Measure emulator and environment throughput
+
+Runs every core on the test ROMs, breaks :meth:`retro.RetroEnv.step` down into
+its phases and measures how :class:`retro.SubprocVecRetroEnv` scales with the
+number of worker processes and how long a fresh interpreter takes to import
+retro. Phase times are in microseconds per call.
+Results are written as JSON for regression tracking::
+
+    python -m retro.benchmark --output benchmark.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import retro
+import retro.data
+
+DEFAULT_ROMS = os.path.join(retro.ROOT_DIR, "..", "tests", "roms")
+
+
+def _per_call(fn, count):
+    start = time.perf_counter_ns()
+    for _ in range(count):
+        fn()
+    return (time.perf_counter_ns() - start) / count / 1000
+
+
+def _roms(path, systems=None):
+    for name in sorted(os.listdir(path)):
+        stem, ext = os.path.splitext(name)
+        system = retro.data.EMU_EXTENSIONS.get(ext)
+        if system is None or (systems and system not in systems):
+            continue
+        yield stem, system, os.path.join(path, name)
+
+
+def bench_core(rom, frames):
+    """Return the frames per second of ``em.step()`` on ``rom``"""
+    em = retro.RetroEmulator(rom)
+    for _ in range(min(frames, 60)):
+        em.step()
+    return 1e6 / _per_call(em.step, frames)
+
+
+def make_integration(root, game, system, rom, variables):
+    """
+    Write a custom integration for a bare ROM, with the variables from
+    ``variables`` that belong to its system and an empty scenario
+    """
+    game_dir = os.path.join(root, game)
+    os.makedirs(game_dir)
+    shutil.copy(rom, os.path.join(game_dir, "rom" + os.path.splitext(rom)[1]))
+    info = {}
+    if system in variables:
+        info["value"] = variables[system]
+    with open(os.path.join(game_dir, "data.json"), "w") as f:
+        json.dump({"info": info}, f)
+    with open(os.path.join(game_dir, "scenario.json"), "w") as f:
+        json.dump({}, f)
+
+
+def bench_env(game, steps, **kwargs):
+    """
+    Return the time in microseconds spent in each phase of ``RetroEnv.step``.
+    Phases are timed by calling the same bindings that ``step`` uses one by
+    one; ``overhead`` is the rest of a full step
+    """
+    env = retro.RetroEnv(game, retro.State.NONE, render_mode=None, **kwargs)
+    try:
+        env.reset(seed=0)
+        action = env.action_space.sample()
+        out = np.empty(env.observation_space.shape, dtype=np.uint8)
+        phases = {
+            "action_decode": lambda: env.action_to_array(action),
+            "emulate": env.em.step,
+            "update_ram": env.data.update_ram,
+            "reward_done": lambda: (env.data.current_reward(), env.data.is_done()),
+            "obs": lambda: env.get_observation(out=out),
+            "lookup_all": env.data.lookup_all,
+        }
+        result = {name: _per_call(fn, steps) for name, fn in phases.items()}
+        result["step"] = _per_call(lambda: env.step(action), steps)
+        result["overhead"] = result["step"] - sum(result[name] for name in phases)
+        return result
+    finally:
+        env.close()
+
+
+def bench_vec(game, steps, processes, **kwargs):
+    """
+    Return the total steps per second of :class:`retro.SubprocVecRetroEnv`
+    with one game per worker, for 1, 2, 4, ... up to ``processes`` workers
+    """
+    results = []
+    count = 1
+    while True:
+        env = retro.SubprocVecRetroEnv(
+            game,
+            count,
+            state=retro.State.NONE,
+            num_workers=count,
+            **kwargs,
+        )
+        try:
+            env.reset(seed=0)
+            actions = env.action_space.sample()
+            elapsed = _per_call(lambda: env.step(actions), steps)
+        finally:
+            env.close()
+        results.append({"processes": count, "steps_per_second": count * 1e6 / elapsed})
+        if count >= processes:
+            return results
+        count = min(count * 2, processes)
+
+
+def bench_startup(runs):
+    """
+    Return the best wall time in milliseconds of a new interpreter running
+    ``import retro``, and of one that also imports the environment classes
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [os.path.dirname(retro.ROOT_DIR), env.get("PYTHONPATH")]),
+    )
+    commands = {
+        "import": "import retro",
+        "import_env": "import retro; retro.RetroEnv",
+    }
+    result = {}
+    for name, command in commands.items():
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", command], env=env, check=True)
+            times.append((time.perf_counter() - start) * 1000)
+        result[name] = min(times)
+    return result
+
+
+def run(
+    roms,
+    frames,
+    steps,
+    processes,
+    systems=None,
+    variables=None,
+    startup_runs=10,
+):
+    report = {
+        "version": retro.__version__.strip(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "cores": {},
+        "env_us": {},
+        "vec": {},
+    }
+    if startup_runs:
+        report["startup_ms"] = bench_startup(startup_runs)
+    integrations = tempfile.mkdtemp()
+    retro.data.Integrations.add_custom_path(integrations)
+    kwargs = dict(inttype=retro.data.Integrations.CUSTOM_ONLY)
+    try:
+        for game, system, rom in _roms(roms, systems):
+            core = retro.data.EMU_INFO[system]["lib"]
+            try:
+                fps = bench_core(rom, frames)
+            except RuntimeError as e:
+                report["cores"][core] = {"rom": game, "error": str(e)}
+                continue
+            report["cores"][core] = {"rom": game, "fps": fps}
+
+            make_integration(integrations, game, system, rom, variables or {})
+            report["env_us"][game] = bench_env(game, steps, **kwargs)
+            if processes:
+                report["vec"][game] = bench_vec(game, steps, processes, **kwargs)
+    finally:
+        retro.data.Integrations.CUSTOM_PATHS.remove(integrations)
+        shutil.rmtree(integrations, ignore_errors=True)
+    return report
+
+
+def main(argv=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--roms", default=DEFAULT_ROMS, help="directory of ROMs")
+    parser.add_argument(
+        "--data",
+        help="JSON file mapping systems to a variable, like tests/dummy.json",
+    )
+    parser.add_argument("--system", "-s", action="append", dest="systems")
+    parser.add_argument("--frames", "-f", type=int, default=3000)
+    parser.add_argument("--steps", "-n", type=int, default=1000)
+    parser.add_argument(
+        "--processes",
+        "-p",
+        type=int,
+        default=os.cpu_count(),
+        help="largest number of vec env workers, 0 to skip",
+    )
+    parser.add_argument(
+        "--startup-runs",
+        type=int,
+        default=10,
+        help="interpreter starts to time importing retro, 0 to skip",
+    )
+    parser.add_argument("--output", "-o", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    data = args.data
+    if data is None and os.path.exists(os.path.join(args.roms, "..", "dummy.json")):
+        data = os.path.join(args.roms, "..", "dummy.json")
+    variables = {}
+    if data:
+        with open(data) as f:
+            variables = json.load(f)["info"]
+
+    report = run(
+        args.roms,
+        args.frames,
+        args.steps,
+        args.processes,
+        systems=args.systems,
+        variables=variables,
+        startup_runs=args.startup_runs,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,12 @@
 import glob
+import gzip
 import hashlib
 import json
 import os
 import sys
 from enum import Flag
 
-from retro._retro import GameDataGlue, RetroEmulator
+from retro._retro import GameDataGlue, RetroEmulator, core_path
 from retro._retro import data_path as _data_path
 
 __all__ = [
@@ -16,6 +17,10 @@ __all__ = [
     "path",
     "get_file_path",
     "get_romfile_path",
+    "load_state",
+    "load_json",
+    "clear_cache",
+    "load_core_info",
     "list_games",
     "list_states",
     "merge",
@@ -32,9 +37,27 @@ else:
 
 DATA_PATH = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
 
-EMU_CORES = {}
-EMU_INFO = {}
-EMU_EXTENSIONS = {}
+# Filled in from the cores directory on first use, see load_core_info
+_EMU_CORES = {}
+_EMU_INFO = {}
+_EMU_EXTENSIONS = {}
+_core_info_loaded = False
+_EMU_ATTRS = {
+    "EMU_CORES": _EMU_CORES,
+    "EMU_INFO": _EMU_INFO,
+    "EMU_EXTENSIONS": _EMU_EXTENSIONS,
+}
+
+# Directory for decompressed copies of .state files shared between processes;
+# set it or the RETRO_STATE_CACHE environment variable to enable it
+STATE_CACHE_DIR = os.environ.get("RETRO_STATE_CACHE")
+
+# Directory for the integration index shared between processes; set it or the
+# RETRO_INDEX_CACHE environment variable to enable it
+INDEX_CACHE_DIR = os.environ.get("RETRO_INDEX_CACHE")
+
+_file_cache = {}
+_integration_index = {}
 
 
 class DefaultIntegrations:
@@ -275,11 +298,30 @@ def init_core_info(path):
         with open(fname) as f:
             core_info = f.read()
             RetroEmulator.load_core_info(core_info)
-            EMU_INFO.update(json.loads(core_info))
-            for platform, core in EMU_INFO.items():
-                EMU_CORES[platform] = core["lib"] + "_libretro." + EXT
+            _EMU_INFO.update(json.loads(core_info))
+            for platform, core in _EMU_INFO.items():
+                _EMU_CORES[platform] = core["lib"] + "_libretro." + EXT
                 for ext in core["ext"]:
-                    EMU_EXTENSIONS["." + ext] = platform
+                    _EMU_EXTENSIONS["." + ext] = platform
+
+
+def load_core_info():
+    """
+    Load the description of every core in the cores directory, unless that
+    was already done. This happens on first use of EMU_CORES, EMU_INFO,
+    EMU_EXTENSIONS or an emulator rather than on import
+    """
+    global _core_info_loaded
+    if not _core_info_loaded:
+        _core_info_loaded = True
+        init_core_info(core_path())
+
+
+def __getattr__(name):
+    if name in _EMU_ATTRS:
+        load_core_info()
+        return _EMU_ATTRS[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def path(hint=DATA_PATH):
@@ -291,14 +333,137 @@ def path(hint=DATA_PATH):
     return _data_path(hint)
 
 
+def _is_name(name):
+    return (
+        name not in ("", ".", "..")
+        and os.sep not in name
+        and not (os.altsep and os.altsep in name)
+    )
+
+
+def _root_index(root):
+    index = _integration_index.get(root)
+    if index is None:
+        index = _load_index(root)
+        _integration_index[root] = index
+    return index
+
+
+def _load_index(root):
+    index = {"mtime": None, "names": [], "games": {}, "dirty": False}
+    if not INDEX_CACHE_DIR:
+        return index
+    try:
+        with open(_index_cache_path(root)) as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return index
+    index["mtime"] = saved["mtime"]
+    index["names"] = saved["names"]
+    for game, entry in saved["games"].items():
+        entry["files"] = set(entry["files"])
+        index["games"][game] = entry
+    return index
+
+
+def _index_cache_path(root):
+    digest = hashlib.sha1(os.path.abspath(root).encode("utf-8")).hexdigest()
+    return os.path.join(INDEX_CACHE_DIR, "index-%s.json" % digest)
+
+
+def _save_index(root):
+    index = _integration_index.get(root)
+    if not INDEX_CACHE_DIR or not index or not index["dirty"]:
+        return
+    saved = {
+        "mtime": index["mtime"],
+        "names": index["names"],
+        "games": {
+            game: dict(entry, files=sorted(entry["files"]))
+            for game, entry in index["games"].items()
+        },
+    }
+    cache_path = _index_cache_path(root)
+    try:
+        os.makedirs(INDEX_CACHE_DIR, exist_ok=True)
+        tmp_path = "%s.%d.tmp" % (cache_path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump(saved, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        return
+    index["dirty"] = False
+
+
+def _root_names(root):
+    """
+    Return every name in an integration directory, listing it again only when
+    its modification time changes
+    """
+    index = _root_index(root)
+    mtime = os.stat(root).st_mtime_ns
+    if index["mtime"] != mtime:
+        index["names"] = sorted(os.listdir(root))
+        index["mtime"] = mtime
+        index["dirty"] = True
+    return index["names"]
+
+
+def _game_entry(root, game):
+    """
+    Return the index entry for a game's directory, or None if it does not
+    exist. The directory is listed again when its modification time changes
+    """
+    index = _root_index(root)
+    try:
+        stat = os.stat(os.path.join(root, game))
+    except OSError:
+        return None
+    entry = index["games"].get(game)
+    if entry is None or entry["mtime"] != stat.st_mtime_ns:
+        try:
+            files = set(os.listdir(os.path.join(root, game)))
+        except NotADirectoryError:
+            files = set()
+        entry = {"mtime": stat.st_mtime_ns, "files": files, "sha": None}
+        index["games"][game] = entry
+        index["dirty"] = True
+    return entry
+
+
+def _game_files(root, game):
+    entry = _game_entry(root, game)
+    return entry["files"] if entry else set()
+
+
+def _game_shas(root, game):
+    entry = _game_entry(root, game)
+    if not entry or "rom.sha" not in entry["files"]:
+        return None
+    shafile = os.path.join(root, game, "rom.sha")
+    try:
+        mtime = os.stat(shafile).st_mtime_ns
+        if entry["sha"] is None or entry["sha"][0] != mtime:
+            with open(shafile) as f:
+                entry["sha"] = [mtime, f.read().strip().split("\n")]
+            _integration_index[root]["dirty"] = True
+    except (OSError, ValueError):
+        return None
+    return entry["sha"][1]
+
+
 def get_file_path(game, file, inttype=Integrations.DEFAULT):
     """
     Return the path to a given game's directory
     """
     base = path()
+    simple = _is_name(game) and _is_name(file)
     for t in inttype.paths:
         possible_path = os.path.join(base, t, game, file)
-        if os.path.exists(possible_path):
+        if simple:
+            if file in _game_files(os.path.join(base, t), game):
+                return possible_path
+        elif os.path.exists(possible_path):
             return possible_path
 
     return None
@@ -308,59 +473,148 @@ def get_romfile_path(game, inttype=Integrations.DEFAULT):
     """
     Return the path to a given game's romfile
     """
-    for extension in EMU_EXTENSIONS.keys():
-        possible_path = get_file_path(game, "rom" + extension, inttype)
-        if possible_path:
-            return possible_path
+    load_core_info()
+    base = path()
+    if _is_name(game):
+        roots = [os.path.join(base, t) for t in inttype.paths]
+        files = [_game_files(root, game) for root in roots]
+        for extension in _EMU_EXTENSIONS.keys():
+            for root, names in zip(roots, files):
+                if "rom" + extension in names:
+                    return os.path.join(root, game, "rom" + extension)
+    else:
+        for extension in _EMU_EXTENSIONS.keys():
+            possible_path = get_file_path(game, "rom" + extension, inttype)
+            if possible_path:
+                return possible_path
 
     raise FileNotFoundError(f"No romfiles found for game: {game}")
 
 
-def list_games(inttype=Integrations.DEFAULT):
-    files = []
-    for curpath in inttype.paths:
-        files.extend(os.listdir(os.path.join(path(), curpath)))
-    possible_games = []
-    for file in files:
-        if get_file_path(file, "rom.sha", inttype):
-            possible_games.append(file)
-    return sorted(set(possible_games))
+def _cached(path, loader):
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _file_cache.get(path)
+    if cached is None or cached[0] != key:
+        cached = (key, loader(path, key))
+        _file_cache[path] = cached
+    return cached[1]
 
 
-def list_states(game, inttype=Integrations.DEFAULT):
-    paths = []
+def _read_state(path, key):
+    if not STATE_CACHE_DIR:
+        with gzip.open(path, "rb") as f:
+            return f.read()
+
+    digest = hashlib.sha1(path.encode("utf-8")).hexdigest()
+    cache_path = os.path.join(STATE_CACHE_DIR, "%s-%d-%d.state" % (digest, *key))
+    try:
+        with open(cache_path, "rb") as f:
+            return f.read()
+    except OSError:
+        pass
+    with gzip.open(path, "rb") as f:
+        state = f.read()
+    try:
+        os.makedirs(STATE_CACHE_DIR, exist_ok=True)
+        tmp_path = "%s.%d.tmp" % (cache_path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            f.write(state)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+    return state
+
+
+def _read_json(path, key):
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_state(path):
+    """
+    Return the decompressed contents of a .state file. Results are cached per
+    process by path and modification time, and also on disk when
+    STATE_CACHE_DIR is set
+    """
+    return _cached(path, _read_state)
+
+
+def load_json(path):
+    """
+    Return the parsed contents of a JSON file, cached per process by path and
+    modification time. The returned object is shared and must not be modified
+    """
+    return _cached(path, _read_json)
+
+
+def clear_cache():
+    """
+    Forget every state and JSON file cached by load_state and load_json, and
+    the in-process integration index
+    """
+    _file_cache.clear()
+    _integration_index.clear()
+
+
+def _list_files(game, inttype, extension):
+    names = []
+    base = path()
     for curpath in inttype.paths:
-        paths.append(os.path.join(path(), curpath, game))
-    states = []
-    for curpath in paths:
-        local_states = glob.glob(os.path.join(curpath, "*.state"))
-        states.extend(
-            os.path.split(local_state)[-1][: -len(".state")]
-            for local_state in local_states
-            if not os.path.split(local_state)[-1].startswith("_")
+        if _is_name(game):
+            files = _game_files(os.path.join(base, curpath), game)
+        else:
+            pattern = os.path.join(base, curpath, game, "*" + extension)
+            files = [os.path.split(f)[-1] for f in glob.glob(pattern)]
+        names.extend(
+            (curpath, name[: -len(extension)])
+            for name in files
+            if name.endswith(extension) and not name.startswith(".")
         )
-    return sorted(set(states))
+    return names
+
+
+def list_games(inttype=Integrations.DEFAULT):
+    """
+    Return the sorted names of every game with a rom.sha in the integrations.
+    Directory listings are kept in an index that is refreshed when their
+    modification times change, and saved to INDEX_CACHE_DIR when it is set
+    """
+    base = path()
+    roots = [os.path.join(base, curpath) for curpath in inttype.paths]
+    names = {root: set(_root_names(root)) for root in roots}
+    possible_games = set()
+    for root in roots:
+        for file in names[root]:
+            if file not in possible_games and any(
+                "rom.sha" in _game_files(r, file) for r in roots if file in names[r]
+            ):
+                possible_games.add(file)
+    for root in roots:
+        _save_index(root)
+    return sorted(possible_games)
+
+
+def list_states(game, inttype=Integrations.DEFAULT):
+    states = _list_files(game, inttype, ".state")
+    return sorted({state for _, state in states if not state.startswith("_")})
 
 
 def list_scenarios(game, inttype=Integrations.DEFAULT):
-    paths = []
-    for curpath in inttype.paths:
-        paths.append(os.path.join(path(), curpath, game))
     scens = []
-    for curpath in paths:
-        local_json = glob.glob(os.path.join(curpath, "*.json"))
-        for j in local_json:
-            try:
-                with open(j) as f:
-                    scen = json.load(f)
-            except (json.JSONDecodeError, OSError):
-                continue
-            if (
-                scen.get("reward") is not None
-                or scen.get("rewards") is not None
-                or scen.get("done") is not None
-            ):
-                scens.append(os.path.split(j)[-1][: -len(".json")])
+    base = path()
+    for curpath, name in _list_files(game, inttype, ".json"):
+        try:
+            scen = load_json(os.path.join(base, curpath, game, name + ".json"))
+        except (json.JSONDecodeError, OSError):
+            continue
+        if (
+            scen.get("reward") is not None
+            or scen.get("rewards") is not None
+            or scen.get("done") is not None
+        ):
+            scens.append(name)
     return sorted(set(scens))
 
 
@@ -427,20 +681,25 @@ def verify_hash(game, inttype=Integrations.DEFAULT):
 
 
 def get_known_hashes():
+    load_core_info()
     known_hashes = {}
-    for game in list_games(Integrations.ALL):
-        for curpath in Integrations.ALL.paths:
-            shafile = os.path.join(path(), curpath, game, "rom.sha")
-            try:
-                with open(shafile) as f:
-                    shas = f.read().strip().split("\n")
-            except (FileNotFoundError, ValueError):
+    roots = [os.path.join(path(), curpath) for curpath in Integrations.ALL.paths]
+    games = list_games(Integrations.ALL)
+    names = {root: set(_root_names(root)) for root in roots}
+    for game in games:
+        for root in roots:
+            if game not in names[root]:
+                continue
+            shas = _game_shas(root, game)
+            if shas is None:
                 continue
-            for ext, platform in EMU_EXTENSIONS.items():
+            for ext, platform in _EMU_EXTENSIONS.items():
                 if game.endswith("-" + platform):
                     break
             for sha in shas:
-                known_hashes[sha] = (game, ext, os.path.join(path(), curpath))
+                known_hashes[sha] = (game, ext, root)
+    for root in roots:
+        _save_index(root)
     return known_hashes
 
 
@@ -0,0 +1,239 @@
+import multiprocessing
+import random
+import time
+import traceback
+from collections import namedtuple
+from multiprocessing.connection import wait
+
+import numpy as np
+
+import retro
+
+EvaluationResult = namedtuple(
+    "EvaluationResult",
+    ["fitness", "steps", "done", "timed_out", "info", "seconds", "error"],
+)
+EvaluationResult.__doc__ = """
+Outcome of one rollout. ``fitness`` is the summed reward, ``done`` tells
+whether the episode ended before ``max_steps``, ``timed_out`` whether the job
+ran out of time and ``error`` holds the traceback of a failed job, in which
+case ``fitness`` is ``None``
+"""
+
+
+def _rollout(env, act, max_steps, seed, timeout):
+    start = time.monotonic()
+    random.seed(seed)
+    np.random.seed(seed)
+    obs, info = env.reset(seed=seed)
+    fitness = 0
+    steps = 0
+    done = False
+    timed_out = False
+    while max_steps is None or steps < max_steps:
+        obs, rew, terminated, truncated, info = env.step(act(obs))
+        fitness += rew
+        steps += 1
+        if terminated or truncated:
+            done = True
+            break
+        if timeout is not None and time.monotonic() - start > timeout:
+            timed_out = True
+            break
+    return EvaluationResult(
+        fitness,
+        steps,
+        done,
+        timed_out,
+        info,
+        time.monotonic() - start,
+        None,
+    )
+
+
+def _start_from_here(env):
+    # Without a savestate every job still starts from the same point
+    if env.initial_state is None:
+        env.initial_state = env.em.get_state()
+
+
+def _worker(conn, game, policy, kwargs):
+    # The emulator is booted once and only reconfigured when a job asks for
+    # another state
+    env = retro.make(game, **kwargs)
+    _start_from_here(env)
+    current = kwargs["state"]
+    try:
+        while True:
+            job = conn.recv()
+            if job is None:
+                break
+            index, params, state, max_steps, seed, timeout = job
+            try:
+                if state != current:
+                    env.reconfigure(
+                        state,
+                        scenario=kwargs.get("scenario"),
+                        info=kwargs.get("info"),
+                    )
+                    _start_from_here(env)
+                    current = state
+                result = _rollout(env, policy(params), max_steps, seed, timeout)
+            except Exception:
+                result = EvaluationResult(
+                    None,
+                    0,
+                    False,
+                    False,
+                    None,
+                    0.0,
+                    traceback.format_exc(),
+                )
+            conn.send((index, result))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        env.close()
+
+
+class PopulationEvaluator:
+    """
+    Evaluate many policies in parallel, one warm emulator per worker process
+
+    ``policy`` is called in the worker with the parameters of a job and must
+    return a function mapping an observation to an action. Each job is reset
+    with its own seed, which also seeds ``random`` and ``numpy.random`` in the
+    worker, so results do not depend on which worker ran them. Rollouts stop
+    after ``timeout`` seconds; a worker that does not answer within twice that
+    time is restarted and its job reported with an ``error``. Remaining
+    keyword arguments are passed to :func:`retro.make`
+    """
+
+    def __init__(
+        self,
+        game,
+        policy,
+        state=retro.State.DEFAULT,
+        num_workers=None,
+        seed=0,
+        timeout=None,
+        context=None,
+        **kwargs,
+    ):
+        kwargs.setdefault("render_mode", None)
+        kwargs["state"] = state
+        self.game = game
+        self.policy = policy
+        self.state = state
+        self.seed = seed
+        self.timeout = timeout
+        self._kwargs = kwargs
+        self._context = multiprocessing.get_context(context)
+        self._workers = []
+        for _ in range(num_workers or multiprocessing.cpu_count()):
+            self._workers.append(self._start_worker())
+
+    def _start_worker(self):
+        parent, child = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker,
+            args=(child, self.game, self.policy, self._kwargs),
+            daemon=True,
+        )
+        process.start()
+        child.close()
+        return process, parent
+
+    def evaluate(self, params, state=None, max_steps=None, seeds=None):
+        """
+        Run one rollout for every entry of ``params`` and return their
+        :class:`EvaluationResult` in the same order. Job ``i`` is seeded with
+        ``seeds[i]``, or ``seed + i`` when no seeds are given
+        """
+        if state is None:
+            state = self.state
+        params = list(params)
+        if seeds is None:
+            seeds = [self.seed + i for i in range(len(params))]
+        pending = list(reversed(range(len(params))))
+        results = [None] * len(params)
+        running = {}
+
+        while pending or running:
+            for w, (_, conn) in enumerate(self._workers):
+                if w not in running and pending:
+                    index = pending.pop()
+                    conn.send(
+                        (
+                            index,
+                            params[index],
+                            state,
+                            max_steps,
+                            seeds[index],
+                            self.timeout,
+                        ),
+                    )
+                    running[w] = (index, time.monotonic())
+
+            deadline = None
+            if self.timeout is not None:
+                # Wake up when the oldest running job runs out of time
+                deadline = 2 * self.timeout - max(
+                    time.monotonic() - started for _, started in running.values()
+                )
+            ready = wait(
+                [self._workers[w][1] for w in running],
+                timeout=None if deadline is None else max(deadline, 0),
+            )
+            for w in list(running):
+                process, conn = self._workers[w]
+                index, started = running[w]
+                if conn in ready:
+                    try:
+                        index, results[index] = conn.recv()
+                    except EOFError:
+                        results[index] = self._failure("worker exited")
+                        self._restart(w)
+                    del running[w]
+                elif (
+                    self.timeout is not None
+                    and time.monotonic() - started > 2 * self.timeout
+                ):
+                    results[index] = self._failure("worker timed out", timed_out=True)
+                    self._restart(w)
+                    del running[w]
+        return results
+
+    @staticmethod
+    def _failure(error, timed_out=False):
+        return EvaluationResult(None, 0, False, timed_out, None, 0.0, error)
+
+    def _restart(self, w):
+        process, conn = self._workers[w]
+        process.terminate()
+        process.join()
+        conn.close()
+        self._workers[w] = self._start_worker()
+
+    def close(self):
+        for process, conn in self._workers:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for process, conn in self._workers:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+        self._workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __del__(self):
+        if getattr(self, "_workers", None):
+            self.close()
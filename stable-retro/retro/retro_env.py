@@ -1,7 +1,8 @@
-import gc
-import gzip
+import asyncio
 import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import gymnasium as gym
 import numpy as np
@@ -9,7 +10,33 @@ import numpy as np
 import retro
 import retro.data
 
-__all__ = ["RetroEnv"]
+__all__ = ["RetroEnv", "VecRetroEnv", "AsyncRetroVecEnv"]
+
+# gymnasium 1.0 renamed the info keys describing an episode that was reset
+# automatically, and vector environments declare when they reset
+_GYM_1 = int(gym.__version__.split(".")[0]) >= 1
+_FINAL_OBS = "final_obs" if _GYM_1 else "final_observation"
+
+
+def _add_final_infos(infos, dones, final_obs, info_keys, final_info):
+    """
+    Report the last observation and info variables of the environments in
+    ``dones``, which have already been reset, under the keys the installed
+    gymnasium expects
+    """
+    infos[_FINAL_OBS] = final_obs
+    infos["_" + _FINAL_OBS] = dones
+    if _GYM_1:
+        final = {}
+        for k, key in enumerate(info_keys):
+            final[key] = final_info[:, k]
+            final["_" + key] = dones
+    else:
+        final = np.empty([len(dones)], dtype=object)
+        for i in np.flatnonzero(dones):
+            final[i] = {key: final_info[i, k] for k, key in enumerate(info_keys)}
+    infos["final_info"] = final
+    infos["_final_info"] = dones
 
 
 class RetroEnv(gym.Env):
@@ -20,6 +47,7 @@ class RetroEnv(gym.Env):
     """
 
     metadata = {"render_modes": ["human", "rgb_array"], "video.frames_per_second": 60.0}
+    supports_want_render = True
 
     def __init__(
         self,
@@ -33,33 +61,116 @@ class RetroEnv(gym.Env):
         inttype=retro.data.Integrations.STABLE,
         obs_type=retro.Observations.IMAGE,
         render_mode="human",
+        double_buffer=False,
+        grayscale=False,
+        resize=None,
+        frame_stack=1,
+        frameskip=1,
+        sticky_prob=0.0,
+        max_pool=False,
+        render_all_frames=False,
+        audio=True,
+        info_keys=None,
+        info_array=False,
+        perf_stats=False,
     ):
+        if frameskip < 1:
+            raise ValueError(f"frameskip must be at least 1, not {frameskip}")
+        if not 0 <= sticky_prob <= 1:
+            raise ValueError(f"sticky_prob must be in [0, 1], not {sticky_prob}")
         if not hasattr(self, "spec"):
             self.spec = None
         self._obs_type = obs_type
         self.img = None
         self.ram = None
         self.viewer = None
+        self._pool = None
         self.gamename = game
-        self.statename = state
-        self.initial_state = None
         self.players = players
+        self.frameskip = frameskip
+        self.sticky_prob = sticky_prob
+        self.max_pool = max_pool
+        self.render_all_frames = render_all_frames
+        self._acted = False
+        self._executor = None
+        self._pending = None
 
         # Don't return multiple rewards in multiplayer mode by default
         # as stable-baselines3 vectorized environments doesn't support it
         self.multi_rewards = False
 
-        metadata = {}
+        self.inttype = inttype
         rom_path = retro.data.get_romfile_path(game, inttype)
-        metadata_path = retro.data.get_file_path(game, "metadata.json", inttype)
+        self._set_initial_state(state)
+
+        self.data = retro.data.GameData()
+        self.system = retro.get_romfile_system(rom_path)
+
+        self.em = retro.RetroEmulator(rom_path)
+        # Native timers are switched on by reset, so only steps are profiled
+        self._perf = None
+        if perf_stats:
+            self._perf = {"steps": 0, "step_ns": 0, "info_ns": 0}
+        if not audio:
+            # Samples are dropped in the callbacks and cores that ask are told
+            # not to mix audio at all
+            self.em.set_audio_enabled(False)
+        self.em.configure_data(self.data)
+        self.em.step()
+
+        # Crop, grayscale, resize and frame stacking all happen natively while
+        # converting the core's framebuffer
+        self._preprocess = grayscale or resize is not None or frame_stack > 1
+        if self._preprocess:
+            height, width = resize if resize is not None else (0, 0)
+            self.em.configure_observation(
+                width=width,
+                height=height,
+                grayscale=grayscale,
+                stack=frame_stack,
+            )
+
+        core = retro.get_system_info(self.system)
+        self.buttons = core["buttons"]
+        self.num_buttons = len(self.buttons)
+        self.use_restricted_actions = use_restricted_actions
+        self._requested_info_keys = info_keys
+        self._info_array = info_array
+        self._double_buffer = double_buffer
+
+        try:
+            self._load_data(info, scenario)
+        except Exception:
+            del self.em
+            raise
 
+        self.movie = None
+        self.movie_id = 0
+        self.movie_path = None
+        self.movie_extension = "bk2"
+        self._trajectory = None
+        self._trajectory_obs = None
+        if record is True:
+            self.auto_record()
+        elif record is not False:
+            self.auto_record(record)
+
+        self.render_mode = render_mode
+
+    def _set_initial_state(self, state):
+        self.statename = state
+        self.initial_state = None
         if state == retro.State.NONE:
             self.statename = None
         elif state == retro.State.DEFAULT:
             self.statename = None
+            metadata_path = retro.data.get_file_path(
+                self.gamename,
+                "metadata.json",
+                self.inttype,
+            )
             try:
-                with open(metadata_path) as f:
-                    metadata = json.load(f)
+                metadata = retro.data.load_json(metadata_path)
                 if "default_player_state" in metadata and self.players <= len(
                     metadata["default_player_state"],
                 ):
@@ -72,10 +183,9 @@ class RetroEnv(gym.Env):
                 pass
 
         if self.statename:
-            self.load_state(self.statename, inttype)
-
-        self.data = retro.data.GameData()
+            self.load_state(self.statename, self.inttype)
 
+    def _load_data(self, info, scenario):
         if info is None:
             info = "data"
 
@@ -83,7 +193,11 @@ class RetroEnv(gym.Env):
             # assume it's a path
             info_path = info
         else:
-            info_path = retro.data.get_file_path(game, info + ".json", inttype)
+            info_path = retro.data.get_file_path(
+                self.gamename,
+                info + ".json",
+                self.inttype,
+            )
 
         if scenario is None:
             scenario = "scenario"
@@ -92,50 +206,53 @@ class RetroEnv(gym.Env):
             # assume it's a path
             scenario_path = scenario
         else:
-            scenario_path = retro.data.get_file_path(game, scenario + ".json", inttype)
-
-        self.system = retro.get_romfile_system(rom_path)
-
-        # We can't have more than one emulator per process. Before creating an
-        # emulator, ensure that unused ones are garbage-collected
-        gc.collect()
-        self.em = retro.RetroEmulator(rom_path)
-        self.em.configure_data(self.data)
-        self.em.step()
+            scenario_path = retro.data.get_file_path(
+                self.gamename,
+                scenario + ".json",
+                self.inttype,
+            )
 
-        core = retro.get_system_info(self.system)
-        self.buttons = core["buttons"]
-        self.num_buttons = len(self.buttons)
+        assert self.data.load(
+            info_path,
+            scenario_path,
+        ), "Failed to load info ({}) or scenario ({})".format(
+            info_path,
+            scenario_path,
+        )
 
-        try:
-            assert self.data.load(
-                info_path,
-                scenario_path,
-            ), "Failed to load info ({}) or scenario ({})".format(
-                info_path,
-                scenario_path,
-            )
-        except Exception:
-            del self.em
-            raise
+        # A fixed set of variables is read natively into a preallocated int64
+        # vector instead of building a dict of every variable each step
+        info_keys = self._requested_info_keys
+        self.info_keys = None if info_keys is None else list(info_keys)
+        self._info = None
+        if self._info_array or info_keys is not None:
+            if self.info_keys is None:
+                self.info_keys = sorted(self.data.lookup_all())
+            self.data.set_info_keys(self.info_keys)
+            self._info_values = np.zeros([len(self.info_keys)], dtype=np.int64)
+            dtype = np.dtype([(key, np.int64) for key in self.info_keys])
+            if self.info_keys:
+                self._info = self._info_values.view(dtype).reshape(())
+            else:
+                self._info = np.zeros((), dtype=dtype)
 
         self.button_combos = self.data.valid_actions()
-        if use_restricted_actions == retro.Actions.DISCRETE:
-            combos = 1
-            for combo in self.button_combos:
-                combos *= len(combo)
-            self.action_space = gym.spaces.Discrete(combos**players)
-        elif use_restricted_actions == retro.Actions.MULTI_DISCRETE:
+        self._build_action_tables()
+        if self.use_restricted_actions == retro.Actions.DISCRETE:
+            self.action_space = gym.spaces.Discrete(
+                len(self._action_table) ** self.players,
+            )
+        elif self.use_restricted_actions == retro.Actions.MULTI_DISCRETE:
             self.action_space = gym.spaces.MultiDiscrete(
-                [len(combos) for combos in self.button_combos] * players,
+                [len(combos) for combos in self.button_combos] * self.players,
             )
         else:
-            self.action_space = gym.spaces.MultiBinary(self.num_buttons * players)
+            self.action_space = gym.spaces.MultiBinary(self.num_buttons * self.players)
 
         if self._obs_type == retro.Observations.RAM:
             shape = self.get_ram().shape
         else:
-            img = [self.get_screen(p) for p in range(players)]
+            img = [self.get_observation(p) for p in range(self.players)]
             shape = img[0].shape
         self.observation_space = gym.spaces.Box(
             low=0,
@@ -144,89 +261,268 @@ class RetroEnv(gym.Env):
             dtype=np.uint8,
         )
 
-        self.use_restricted_actions = use_restricted_actions
-        self.movie = None
-        self.movie_id = 0
-        self.movie_path = None
-        if record is True:
-            self.auto_record()
-        elif record is not False:
-            self.auto_record(record)
+        # Observations alternate between two preallocated arrays, so each one
+        # stays valid until the step after the one that returned it
+        self._obs_buffers = None
+        self._obs_index = 0
+        if self._double_buffer:
+            self._obs_buffers = [np.zeros(shape, dtype=np.uint8) for _ in range(2)]
+
+    def reconfigure(self, state=retro.State.DEFAULT, scenario=None, info=None):
+        """
+        Switch to another initial state, scenario or data file while keeping
+        the loaded core and ROM. The arguments mean the same as for the
+        constructor, and :meth:`reset` must be called before the next step
+        """
+        data = retro.data.GameData()
+        self.em.configure_data(data)
+        previous, self.data = self.data, data
+        try:
+            self._load_data(info, scenario)
+        except Exception:
+            self.data = previous
+            self.em.configure_data(previous)
+            raise
+        self._set_initial_state(state)
+        self.img = None
+        self.ram = None
+        self._acted = False
 
-        self.render_mode = render_mode
+    def _next_obs_buffer(self):
+        if self._obs_buffers is None:
+            return None
+        self._obs_index ^= 1
+        return self._obs_buffers[self._obs_index]
 
     def _update_obs(self):
         if self._obs_type == retro.Observations.RAM:
-            self.ram = self.get_ram()
+            self.ram = self.get_ram(out=self._next_obs_buffer())
             return self.ram
         elif self._obs_type == retro.Observations.IMAGE:
-            self.img = self.get_screen()
+            self.img = self.get_observation(out=self._next_obs_buffer())
             return self.img
         else:
             raise ValueError(f"Unrecognized observation type: {self._obs_type}")
 
-    def action_to_array(self, a):
-        actions = []
-        for p in range(self.players):
-            action = 0
-            if self.use_restricted_actions == retro.Actions.DISCRETE:
-                for combo in self.button_combos:
-                    current = a % len(combo)
-                    a //= len(combo)
-                    action |= combo[current]
-            elif self.use_restricted_actions == retro.Actions.MULTI_DISCRETE:
-                ap = a[self.num_buttons * p : self.num_buttons * (p + 1)]
-                for i in range(len(ap)):
-                    buttons = self.button_combos[i]
-                    action |= buttons[ap[i]]
-            else:
-                ap = a[self.num_buttons * p : self.num_buttons * (p + 1)]
-                for i in range(len(ap)):
-                    action |= int(ap[i]) << i
-                if self.use_restricted_actions == retro.Actions.FILTERED:
-                    action = self.data.filter_action(action)
-            ap = np.zeros([self.num_buttons], np.uint8)
-            for i in range(self.num_buttons):
-                ap[i] = (action >> i) & 1
-            actions.append(ap)
-        return actions
+    def _lookup_info(self):
+        if self._info is None:
+            return self.data.lookup_all()
+        self.data.lookup_info(self._info_values)
+        if self._info_array:
+            return self._info
+        return dict(zip(self.info_keys, self._info_values.tolist()))
+
+    def _build_action_tables(self):
+        self._button_bits = np.left_shift(1, np.arange(self.num_buttons))
+        if self.use_restricted_actions == retro.Actions.DISCRETE:
+            # Every combination for one player; the first combo varies fastest
+            bits = np.zeros([1], dtype=np.int64)
+            for combo in self.button_combos:
+                bits = (np.array(combo, dtype=np.int64)[:, None] | bits).ravel()
+            self._action_table = self._unpack_buttons(bits)
+        elif self.use_restricted_actions == retro.Actions.MULTI_DISCRETE:
+            width = max([len(combo) for combo in self.button_combos], default=1)
+            self._combo_bits = np.zeros([len(self.button_combos), width], np.int64)
+            for i, combo in enumerate(self.button_combos):
+                self._combo_bits[i, : len(combo)] = combo
+
+    def _unpack_buttons(self, bits):
+        return ((np.asarray(bits)[..., None] & self._button_bits) != 0).astype(np.uint8)
+
+    def _discrete_indices(self, a):
+        combos = len(self._action_table)
+        return np.asarray(a)[..., None] // combos ** np.arange(self.players) % combos
+
+    def decode_actions(self, actions, out=None):
+        """
+        Decode a batch of actions into ``(n, players, buttons)`` button masks
+        using the tables built at construction time. MultiBinary actions are
+        passed through without applying the scenario's action filter
+        """
+        actions = np.asarray(actions)
+        n = len(actions)
+        if self.use_restricted_actions == retro.Actions.DISCRETE:
+            indices = self._discrete_indices(actions.reshape(n))
+            return np.take(self._action_table, indices, axis=0, out=out)
+        if self.use_restricted_actions == retro.Actions.MULTI_DISCRETE:
+            choices = actions.reshape(n, self.players, -1)
+            groups = np.arange(choices.shape[-1])
+            bits = np.bitwise_or.reduce(self._combo_bits[groups, choices], axis=-1)
+            masks = self._unpack_buttons(bits)
+        else:
+            masks = actions.reshape(n, self.players, self.num_buttons)
+        if out is None:
+            return masks.astype(np.uint8)
+        out[:] = masks
+        return out
 
-    def step(self, a):
+    def action_to_array(self, a):
+        masks = self.decode_actions([a])[0]
+        if self.use_restricted_actions == retro.Actions.FILTERED:
+            bits = masks.astype(np.int64) @ self._button_bits
+            masks = self._unpack_buttons(
+                [self.data.filter_action(int(action)) for action in bits],
+            )
+        return list(masks)
+
+    def step(self, a, want_render=True):
+        """
+        Advance the environment by one action. With ``want_render=False`` the
+        frame is not rendered and image observations are not updated, which
+        is useful when the caller discards the observation anyway
+        """
         if self.img is None and self.ram is None:
             raise RuntimeError("Please call env.reset() before env.step()")
+        if self._perf is not None:
+            start = time.perf_counter_ns()
+
+        # With sticky actions the previous buttons are held for the first
+        # frame with probability sticky_prob
+        delayed = None
+        sticky = (
+            self.sticky_prob
+            and self._acted
+            and self.np_random.random() < self.sticky_prob
+        )
+        if self.use_restricted_actions == retro.Actions.DISCRETE and not sticky:
+            for p, index in enumerate(self._discrete_indices(a)):
+                self.em.set_action_index(self._action_table, index, p)
+        elif sticky:
+            delayed = np.concatenate(self.action_to_array(a))
+        else:
+            for p, ap in enumerate(self.action_to_array(a)):
+                self.em.set_button_mask(ap, p)
+        self._acted = True
 
-        for p, ap in enumerate(self.action_to_array(a)):
-            if self.movie:
-                for i in range(self.num_buttons):
-                    self.movie.set_key(i, ap[i], p)
-            self.em.set_button_mask(ap, p)
-
-        if self.movie:
-            self.movie.step()
-        self.em.step()
-        self.data.update_ram()
-        ob = self._update_obs()
-        rew, done, info = self.compute_step()
+        # RAM observations only need the screen when something renders it
+        render = want_render and (
+            self._obs_type == retro.Observations.IMAGE or self.render_mode is not None
+        )
+        rewards, done, _ = self.em.step_frames(
+            self.data,
+            self.frameskip,
+            delayed,
+            players=self.players,
+            max_pool=self.max_pool,
+            render=render,
+            render_all=self.render_all_frames,
+            movie=self.movie,
+        )
+        if render or self._obs_type == retro.Observations.RAM:
+            ob = self._update_obs()
+        else:
+            ob = self.img
+        if self.players > 1 and self.multi_rewards:
+            rew = rewards
+        else:
+            rew = rewards[0]
+        if self._perf is not None:
+            info_start = time.perf_counter_ns()
+            info = self._lookup_info()
+            self._perf["info_ns"] += time.perf_counter_ns() - info_start
+        else:
+            info = self._lookup_info()
 
-        if self.render_mode == "human":
+        if self.render_mode == "human" and want_render:
             self.render()
 
-        return ob, rew, bool(done), False, dict(info)
+        if self._trajectory is not None and self._trajectory_obs is not None:
+            self._trajectory.append(
+                self._trajectory_obs, a, rew, bool(done), False, info
+            )
+            self._trajectory_obs = self._pending_obs(ob)
+
+        if self._perf is not None:
+            self._perf["steps"] += 1
+            self._perf["step_ns"] += time.perf_counter_ns() - start
+        return ob, rew, bool(done), False, info
+
+    def perf_stats(self, reset=False):
+        """
+        Return the time spent in each phase of :meth:`step` since the stats
+        were last reset, in nanoseconds. ``python_ns`` is the part of
+        ``step_ns`` spent outside the emulator, scenario, screen conversion
+        and info lookup. Requires ``perf_stats=True``
+        """
+        if self._perf is None:
+            raise RuntimeError("Please create the env with perf_stats=True")
+        stats = self.em.get_perf_stats()
+        stats["steps"] = self._perf["steps"]
+        stats["step_ns"] = self._perf["step_ns"]
+        stats["info_ns"] += self._perf["info_ns"]
+        stats["python_ns"] = stats["step_ns"] - sum(
+            stats[key]
+            for key in [
+                "run_ns",
+                "update_ram_ns",
+                "scenario_ns",
+                "screen_ns",
+                "info_ns",
+            ]
+        )
+        if reset:
+            self.reset_perf_stats()
+        return stats
+
+    def reset_perf_stats(self):
+        """
+        Zero the counters read by :meth:`perf_stats`
+        """
+        if self._perf is not None:
+            self.em.reset_perf_stats()
+            self._perf = dict.fromkeys(self._perf, 0)
+
+    def step_async(self, a, want_render=True):
+        """
+        Start :meth:`step` on a background thread and return a
+        :class:`concurrent.futures.Future` of its result. Emulation runs
+        without the GIL, so the caller can prepare the next action meanwhile;
+        wrap the future with :func:`asyncio.wrap_future` to await it. Every
+        step must be collected with :meth:`step_wait` before the next one,
+        and the environment must not be used otherwise until then
+        """
+        if self._pending is not None:
+            raise RuntimeError("Please call env.step_wait() before the next step")
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix="retro",
+            )
+        self._pending = self._executor.submit(self.step, a, want_render)
+        return self._pending
+
+    def step_wait(self):
+        """
+        Wait for the step started by :meth:`step_async` and return its result
+        """
+        if self._pending is None:
+            raise RuntimeError("Please call env.step_async() before env.step_wait()")
+        future, self._pending = self._pending, None
+        return future.result()
 
     def reset(self, seed=None, options=None):
         super().reset(seed=seed)
+        if self._perf is not None:
+            self.em.set_perf_enabled(False)
 
         if self.initial_state:
             self.em.set_state(self.initial_state)
         for p in range(self.players):
             self.em.set_button_mask(np.zeros([self.num_buttons], np.uint8), p)
+        self._acted = False
         self.em.step()
         if self.movie_path is not None:
             rel_statename = os.path.splitext(os.path.basename(self.statename))[0]
             self.record_movie(
                 os.path.join(
                     self.movie_path,
-                    "%s-%s-%06d.bk2" % (self.gamename, rel_statename, self.movie_id),
+                    "%s-%s-%06d.%s"
+                    % (
+                        self.gamename,
+                        rel_statename,
+                        self.movie_id,
+                        self.movie_extension,
+                    ),
                 ),
             )
             self.movie_id += 1
@@ -234,16 +530,45 @@ class RetroEnv(gym.Env):
             self.movie.step()
         self.data.reset()
         self.data.update_ram()
+        self.em.reset_observation()
 
         if self.render_mode == "human":
             self.render()
 
-        return self._update_obs(), {}
+        ob = self._update_obs()
+        if self._trajectory is not None:
+            self._trajectory_obs = self._pending_obs(ob)
+        if self._perf is not None:
+            self.em.set_perf_enabled(True)
+        return ob, {}
+
+    def _pending_obs(self, ob):
+        # Double buffered observations are overwritten before a recording
+        # thread that lags behind may have written them
+        return ob.copy() if self._obs_buffers is not None else ob
+
+    def record_trajectory(self, path, info_keys=None, shard_size=10000):
+        """
+        Record every step from the next :meth:`reset` on into memory-mapped
+        shards in ``path`` with a :class:`retro.TrajectoryRecorder`, keeping
+        the ``info_keys`` variables, by default the same as ``info``. Open
+        the recording with :func:`retro.load_trajectory`
+        """
+        self.stop_trajectory()
+        if info_keys is None:
+            info_keys = self.info_keys or sorted(self.data.lookup_all())
+        self._trajectory = retro.TrajectoryRecorder(path, info_keys, shard_size)
+
+    def stop_trajectory(self):
+        if getattr(self, "_trajectory", None) is not None:
+            trajectory, self._trajectory = self._trajectory, None
+            self._trajectory_obs = None
+            trajectory.close()
 
     def render(self):
         mode = self.render_mode
 
-        img = self.get_screen() if self.img is None else self.img
+        img = self.get_screen() if self.img is None or self._preprocess else self.img
         if mode == "rgb_array":
             return img
         elif mode == "human":
@@ -255,6 +580,24 @@ class RetroEnv(gym.Env):
             return self.viewer.isopen
 
     def close(self):
+        if self._executor is not None:
+            # Let a running step_async finish before the emulator is reused
+            self._executor.shutdown()
+            self._executor = None
+            self._pending = None
+        if self._pool is not None and hasattr(self, "em"):
+            # Pooled environments keep their emulator for the next retro.make
+            if self.viewer:
+                self.viewer.close()
+                self.viewer = None
+            if self.movie:
+                self.movie.close()
+                self.movie = None
+            self.stop_trajectory()
+            if self not in self._pool:
+                self._pool.append(self)
+            return
+        self.stop_trajectory()
         if hasattr(self, "em"):
             del self.em
         if self.viewer:
@@ -273,37 +616,35 @@ class RetroEnv(gym.Env):
     def set_value(self, name, val):
         self.data.set_value(name, val)
 
-    def get_ram(self):
+    def get_ram(self, out=None):
         blocks = []
-        for offset in sorted(self.data.memory.blocks):
-            arr = np.frombuffer(self.data.memory.blocks[offset], dtype=np.uint8)
+        memory_blocks = self.data.memory.blocks
+        for offset in sorted(memory_blocks):
+            arr = np.frombuffer(memory_blocks[offset], dtype=np.uint8)
             blocks.append(arr)
-        return np.concatenate(blocks)
-
-    def get_screen(self, player=0):
-        img = self.em.get_screen()
-        x, y, w, h = self.data.crop_info(player)
-        if not w or x + w > img.shape[1]:
-            w = img.shape[1]
-        else:
-            w += x
-        if not h or y + h > img.shape[0]:
-            h = img.shape[0]
-        else:
-            h += y
-        if x == 0 and y == 0 and w == img.shape[1] and h == img.shape[0]:
-            return img
-        return img[y:h, x:w]
+        return np.concatenate(blocks, out=out)
+
+    def get_screen(self, player=0, out=None):
+        """
+        Return the screen cropped for the given player, converting it directly
+        into ``out`` if it is given
+        """
+        return self.em.get_screen(out=out, crop=self.data.crop_info(player))
+
+    def get_observation(self, player=0, out=None):
+        """
+        Return the screen for the given player after the configured
+        grayscale, resize and frame stacking steps
+        """
+        return self.em.get_observation(out=out, crop=self.data.crop_info(player))
 
     def load_state(self, statename, inttype=retro.data.Integrations.DEFAULT):
         if not statename.endswith(".state"):
             statename += ".state"
 
-        with gzip.open(
+        self.initial_state = retro.data.load_state(
             retro.data.get_file_path(self.gamename, statename, inttype),
-            "rb",
-        ) as fh:
-            self.initial_state = fh.read()
+        )
 
         self.statename = statename
 
@@ -313,7 +654,7 @@ class RetroEnv(gym.Env):
         else:
             reward = self.data.current_reward()
         done = self.data.is_done()
-        return reward, done, self.data.lookup_all()
+        return reward, done, self._lookup_info()
 
     def record_movie(self, path):
         self.movie = retro.Movie(path, True, self.players)
@@ -328,7 +669,245 @@ class RetroEnv(gym.Env):
             self.movie.close()
             self.movie = None
 
-    def auto_record(self, path=None):
+    def auto_record(self, path=None, extension="bk2"):
         if not path:
             path = os.getcwd()
         self.movie_path = path
+        self.movie_extension = extension
+
+
+class VecRetroEnv(gym.vector.VectorEnv):
+    """
+    Vectorized Gym Retro environment
+
+    Owns ``num_envs`` copies of a game and steps all of them in a single native
+    call that releases the GIL. Observations, rewards, dones and info variables
+    are written straight into preallocated arrays. Environments that finish an
+    episode are reset in the same step; their last observation and info are
+    reported in ``infos["final_obs"]`` and ``infos["final_info"]``
+    (``infos["final_observation"]`` before gymnasium 1.0).
+
+    Remaining keyword arguments are passed to :class:`RetroEnv`; audio is
+    disabled unless ``audio=True`` is passed. Set ``copy=False`` to get the
+    internal buffers back from :meth:`step` and :meth:`reset`; they are
+    overwritten by the next call.
+    """
+
+    metadata = {"render_modes": ["rgb_array"], "video.frames_per_second": 60.0}
+    if hasattr(gym.vector, "AutoresetMode"):
+        metadata["autoreset_mode"] = gym.vector.AutoresetMode.SAME_STEP
+
+    def __init__(
+        self,
+        game,
+        num_envs,
+        state=retro.State.DEFAULT,
+        info_keys=None,
+        copy=True,
+        render_mode=None,
+        **kwargs,
+    ):
+        if kwargs.get("record", False) is not False:
+            raise ValueError("VecRetroEnv does not support recording")
+        kwargs.setdefault("audio", False)
+        self.envs = []
+        try:
+            for _ in range(num_envs):
+                self.envs.append(RetroEnv(game, state, render_mode=None, **kwargs))
+        except Exception:
+            for env in self.envs:
+                env.close()
+            raise
+
+        env = self.envs[0]
+        self.num_envs = num_envs
+        self.render_mode = render_mode
+        self.copy = copy
+        self.closed = False
+        self.single_observation_space = env.observation_space
+        self.single_action_space = env.action_space
+        self.observation_space = gym.vector.utils.batch_space(
+            env.observation_space,
+            num_envs,
+        )
+        self.action_space = gym.vector.utils.batch_space(env.action_space, num_envs)
+
+        if info_keys is None:
+            info_keys = sorted(env.data.lookup_all())
+        self.info_keys = list(info_keys)
+
+        self.players = env.players
+        self.num_buttons = env.num_buttons
+        self.use_restricted_actions = env.use_restricted_actions
+        self.em = retro.RetroVecEmulator(
+            [env.em for env in self.envs],
+            [env.data for env in self.envs],
+            players=self.players,
+            buttons=self.num_buttons,
+            filter=self.use_restricted_actions == retro.Actions.FILTERED,
+            info_keys=self.info_keys,
+        )
+
+        self._masks = np.zeros(
+            [num_envs, self.players, self.num_buttons],
+            dtype=np.uint8,
+        )
+        self._obs = np.zeros(self.observation_space.shape, dtype=np.uint8)
+        self._rewards = np.zeros([num_envs], dtype=np.float32)
+        self._dones = np.zeros([num_envs], dtype=bool)
+        self._truncated = np.zeros([num_envs], dtype=bool)
+        self._info = np.zeros([num_envs, len(self.info_keys)], dtype=np.int64)
+        self._final_info = np.zeros_like(self._info)
+        self._acted = np.zeros([num_envs], dtype=bool)
+        self._rng = np.random.default_rng()
+
+    def _set_masks(self, actions):
+        # Filtered MultiBinary actions are filtered natively by step
+        self.envs[0].decode_actions(actions, out=self._masks)
+
+    def _infos(self):
+        info = self._output(self._info)
+        return {key: info[:, k] for k, key in enumerate(self.info_keys)}
+
+    def _reset_env(self, i, **kwargs):
+        env = self.envs[i]
+        self._obs[i] = env.reset(**kwargs)[0]
+        self._acted[i] = False
+        for k, key in enumerate(self.info_keys):
+            self._info[i, k] = env.data.lookup_value(key)
+
+    def _output(self, arr):
+        return arr.copy() if self.copy else arr
+
+    def reset(self, seed=None, options=None):
+        if seed is not None:
+            self._rng = np.random.default_rng(seed)
+        for i in range(self.num_envs):
+            self._reset_env(i, seed=None if seed is None else seed + i, options=options)
+        return self._output(self._obs), self._infos()
+
+    def step(self, actions):
+        self._set_masks(actions)
+        return self._step_masks()
+
+    def _step_masks(self):
+        env = self.envs[0]
+        sticky = None
+        if env.sticky_prob:
+            sticky = self._acted & (self._rng.random(self.num_envs) < env.sticky_prob)
+        self.em.step(
+            self._masks,
+            self._obs,
+            self._rewards,
+            self._dones,
+            self._info,
+            frames=env.frameskip,
+            max_pool=env.max_pool,
+            sticky=sticky,
+            render_all=env.render_all_frames,
+        )
+        self._acted[:] = True
+
+        dones = self._dones.copy()
+        final_obs = None
+        if dones.any():
+            self._final_info[dones] = self._info[dones]
+            final_obs = np.empty([self.num_envs], dtype=object)
+            for i in np.flatnonzero(dones):
+                final_obs[i] = self._obs[i].copy()
+                self._reset_env(i)
+        infos = self._infos()
+        if final_obs is not None:
+            _add_final_infos(
+                infos,
+                dones,
+                final_obs,
+                self.info_keys,
+                self._output(self._final_info),
+            )
+
+        return (
+            self._output(self._obs),
+            self._output(self._rewards),
+            dones,
+            self._output(self._truncated),
+            infos,
+        )
+
+    def render(self):
+        return [env.get_screen() for env in self.envs]
+
+    def close_extras(self, **kwargs):
+        if hasattr(self, "em"):
+            del self.em
+        for env in self.envs:
+            env.close()
+
+
+class AsyncRetroVecEnv(VecRetroEnv):
+    """
+    Vectorized Gym Retro environment that steps in the background
+
+    A :class:`VecRetroEnv` whose native step runs on a worker thread with the
+    GIL released, so that policy inference on one batch can overlap emulation
+    of another. :meth:`step_async` returns a
+    :class:`concurrent.futures.Future` and :meth:`step_wait` waits for it;
+    from a coroutine, :meth:`astep` returns an awaitable instead. Only one step
+    can be in flight at a time, and with ``copy=False`` the buffers returned
+    by the previous step are overwritten while it runs.
+    """
+
+    def __init__(self, game, num_envs, state=retro.State.DEFAULT, **kwargs):
+        super().__init__(game, num_envs, state, **kwargs)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="retro")
+        self._pending = None
+
+    def step_async(self, actions):
+        if self._pending is not None:
+            raise RuntimeError("Please call env.step_wait() before the next step")
+        # Decode on the calling thread so the caller may reuse actions at once
+        self._set_masks(actions)
+        self._pending = self._executor.submit(self._step_masks)
+        return self._pending
+
+    def step_wait(self):
+        if self._pending is None:
+            raise RuntimeError("Please call env.step_async() before env.step_wait()")
+        future, self._pending = self._pending, None
+        return future.result()
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def astep(self, actions):
+        """
+        Start stepping every environment and return an :class:`asyncio.Future`
+        of the result. The step starts right away, before it is awaited, and
+        is collected once it completes, so no :meth:`step_wait` is needed
+        """
+        pending = self.step_async(actions)
+
+        def collect(_):
+            if self._pending is pending:
+                self._pending = None
+
+        future = asyncio.wrap_future(pending)
+        future.add_done_callback(collect)
+        return future
+
+    def areset(self, seed=None, options=None):
+        """
+        Start resetting every environment and return an
+        :class:`asyncio.Future` of the result
+        """
+        if self._pending is not None:
+            raise RuntimeError("Please call env.step_wait() before env.reset()")
+        return asyncio.wrap_future(
+            self._executor.submit(self.reset, seed=seed, options=options),
+        )
+
+    def close_extras(self, **kwargs):
+        self._executor.shutdown()
+        self._pending = None
+        super().close_extras(**kwargs)
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 import argparse
 import csv
+import hashlib
 import json
 import os
 import signal
@@ -9,12 +10,38 @@ import subprocess
 import sys
 import time
 from concurrent.futures import ProcessPoolExecutor as Executor
+from functools import partial
 
 import numpy as np
 
 import retro
 
 
+def drain_audio(em, ring, read):
+    """Return views of the audio written to ``ring`` since ``read`` and the new read position"""
+    written = em.get_audio_ring_written()
+    capacity = len(ring)
+    start = max(read, written - capacity)
+    head = start % capacity
+    end = head + written - start
+    if end <= capacity:
+        return [ring[head:end]], written
+    return [ring[head:], ring[: end - capacity]], written
+
+
+def send_audio(em, ring, read, sock=None):
+    """
+    Drain the audio written to ``ring`` since ``read``, sending it to ``sock``
+    unless it is None, and return the new read position
+    """
+    sound, read = drain_audio(em, ring, read)
+    if sock is not None:
+        for chunk in sound:
+            if len(chunk):
+                sock.sendall(chunk)
+    return read
+
+
 def playback_movie(
     emulator,
     movie,
@@ -30,6 +57,8 @@ def playback_movie(
     ffmpeg_proc = None
     viewer_proc = None
     info_steps = []
+    audio_ring = None
+    audio_read = 0
     actions = np.empty(shape=(0, emulator.num_buttons * movie.players), dtype=bool)
     if viewer or video_file:
         video = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -52,6 +81,10 @@ def playback_movie(
             "tcp://127.0.0.1:%i?listen" % vr,
         ]
         if record_audio:
+            # Samples of every emulated frame land in a ring that is sent
+            # without copying; one second is plenty of headroom per step
+            emulator.em.configure_audio_ring(int(emulator.em.get_audio_rate()))
+            audio_ring = emulator.em.get_audio_ring()
             audio = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             audio.bind(("127.0.0.1", 0))
             ar = audio.getsockname()[1]
@@ -239,16 +272,17 @@ def playback_movie(
                 signal.signal(signal.SIGCHLD, killprocs)
             if viewer_proc and viewer_proc.poll() is not None:
                 break
-            if ffmpeg_proc and frames > video_delay:
+            send = ffmpeg_proc and frames > video_delay
+            if send:
                 video.sendall(bytes(display))
-                if audio:
-                    sound = emulator.em.get_audio()
-                    if not audio_connected:
-                        time.sleep(0.2)
-                        audio.connect(("127.0.0.1", ar))
-                        audio_connected = True
-                    if len(sound):
-                        audio.sendall(bytes(sound))
+                if audio and not audio_connected:
+                    time.sleep(0.2)
+                    audio.connect(("127.0.0.1", ar))
+                    audio_connected = True
+            if audio:
+                # Audio of steps that are not sent is still drained
+                sock = audio if send else None
+                audio_read = send_audio(emulator.em, audio_ring, audio_read, sock)
         except BrokenPipeError:
             waitprocs()
             raise
@@ -309,6 +343,127 @@ def load_movie(movie_file):
     return emulator, movie, duration
 
 
+# Each export worker keeps its environment between movies of the same game
+_export_env = None
+
+
+def _warm_env(game, players, kwargs):
+    global _export_env
+    if _export_env is not None:
+        env, key, power_on = _export_env
+        if key == (game, players, kwargs):
+            return env, power_on
+        env.close()
+        _export_env = None
+    env = retro.make(
+        game=game,
+        state=retro.State.NONE,
+        use_restricted_actions=retro.Actions.ALL,
+        players=players,
+        render_mode=None,
+        info_array=True,
+        **kwargs,
+    )
+    # Movies without a savestate start from power-on, which a reused
+    # emulator has to be returned to
+    power_on = env.em.get_state()
+    _export_env = (env, (game, players, kwargs), power_on)
+    return env, power_on
+
+
+def export_movie(movie_file, output, shard_size=10000, compress=False, **kwargs):
+    """
+    Replay ``movie_file`` and write what the environment saw to ``.npz``
+    shards of at most ``shard_size`` steps in ``output``. Each shard holds
+    ``obs``, the observation before each step, and the ``actions``,
+    ``rewards``, ``terminated`` and ``info`` of the step. Remaining keyword
+    arguments are passed to :func:`retro.make`. Returns a list describing
+    the shards
+    """
+    movie = retro.Movie(movie_file)
+    movie.step()
+    env, power_on = _warm_env(movie.get_game(), movie.players, kwargs)
+    env.initial_state = movie.get_state() or power_on
+    obs, info = env.reset()
+
+    # Movies of the same name from different directories get their own shards
+    digest = hashlib.sha1(os.path.abspath(movie_file).encode("utf-8")).hexdigest()
+    basename = "%s-%s" % (os.path.splitext(os.path.basename(movie_file))[0], digest[:8])
+    players = movie.players
+    buttons = env.num_buttons
+    shards = []
+    buffers = None
+    steps = 0
+    while True:
+        more = movie.step()
+        if more:
+            keys = [movie.get_key(i, p) for p in range(players) for i in range(buttons)]
+            # The observation that the action was chosen from stays valid
+            # for one more step
+            last_obs = obs
+            obs, reward, terminated, truncated, info = env.step(keys)
+            if buffers is None:
+                buffers = {
+                    "obs": np.empty((shard_size,) + obs.shape, dtype=obs.dtype),
+                    "actions": np.empty((shard_size, len(keys)), dtype=bool),
+                    "rewards": np.empty(
+                        (shard_size,) + np.shape(reward),
+                        dtype=np.float32,
+                    ),
+                    "terminated": np.empty(shard_size, dtype=bool),
+                    "info": np.empty(shard_size, dtype=info.dtype),
+                }
+            buffers["obs"][steps] = last_obs
+            buffers["actions"][steps] = keys
+            buffers["rewards"][steps] = reward
+            buffers["terminated"][steps] = terminated
+            buffers["info"][steps] = info
+            steps += 1
+        if steps and (steps == shard_size or not more):
+            path = os.path.join(output, "%s-%05d.npz" % (basename, len(shards)))
+            save = np.savez_compressed if compress else np.savez
+            save(path, **{name: array[:steps] for name, array in buffers.items()})
+            shards.append(
+                {
+                    "path": os.path.basename(path),
+                    "movie": os.path.abspath(movie_file),
+                    "game": movie.get_game(),
+                    "steps": steps,
+                },
+            )
+            steps = 0
+        if not more:
+            break
+    return shards
+
+
+def export_movies(
+    movies,
+    output,
+    jobs=None,
+    shard_size=10000,
+    compress=False,
+    **kwargs,
+):
+    """
+    Export every movie in ``movies`` with :func:`export_movie` using ``jobs``
+    worker processes and write an ``index.json`` of the shards to ``output``
+    """
+    os.makedirs(output, exist_ok=True)
+    export = partial(
+        export_movie,
+        output=output,
+        shard_size=shard_size,
+        compress=compress,
+        **kwargs,
+    )
+    with Executor(jobs) as pool:
+        shards = [shard for result in pool.map(export, movies) for shard in result]
+    with open(os.path.join(output, "index.json"), "w") as f:
+        json.dump(shards, f, indent=2)
+    return shards
+
+
 def _play(movie, args, monitor_csv):
     video_file = None
     info_file = None
@@ -377,12 +532,31 @@ def main(argv=sys.argv[1:]):
         type=str,
         choices=["mp4", "mp4rgb", "png", "ffv1"],
     )
+    parser.add_argument(
+        "--export",
+        "-x",
+        type=str,
+        help="write observations, actions, rewards and info to .npz shards in "
+        "this directory instead of rendering video",
+    )
+    parser.add_argument("--shard-size", type=int, default=10000)
+    parser.add_argument("--compress", action="store_true")
     args = parser.parse_args(argv)
     monitor_csv = None
     monitor_file = None
 
     retro.data.add_integrations(retro.data.Integrations.ALL)
 
+    if args.export:
+        export_movies(
+            args.movies,
+            args.export,
+            args.jobs or None,
+            args.shard_size,
+            args.compress,
+        )
+        return
+
     if args.csv_out:
         m0 = retro.Movie(args.movies[0])
         game = m0.get_game()
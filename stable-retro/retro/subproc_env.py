@@ -0,0 +1,294 @@
+import multiprocessing
+import traceback
+from multiprocessing import resource_tracker, shared_memory
+
+import gymnasium as gym
+import numpy as np
+
+import retro
+from retro.retro_env import _FINAL_OBS, VecRetroEnv, _add_final_infos
+
+__all__ = ["SubprocVecRetroEnv"]
+
+
+def _attach(shms, name, shape):
+    shm = shared_memory.SharedMemory(name=name)
+    shms.append(shm)
+    return np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+
+
+def _worker(conn, game, num_envs, state, info_keys, kwargs):
+    try:
+        venv = VecRetroEnv(
+            game,
+            num_envs,
+            state,
+            info_keys=info_keys,
+            copy=False,
+            **kwargs,
+        )
+    except Exception:
+        conn.send((False, traceback.format_exc()))
+        return
+    shms = []
+    try:
+        conn.send(
+            (
+                True,
+                (
+                    venv.single_observation_space,
+                    venv.single_action_space,
+                    venv.info_keys,
+                    venv.envs[0].get_screen().shape,
+                ),
+            ),
+        )
+        (ring, final, screen), start, stop = conn.recv()
+        ring = _attach(shms, *ring)[:, start:stop]
+        final = _attach(shms, *final)[start:stop]
+        screen = _attach(shms, *screen)[start:stop]
+
+        while True:
+            cmd, *args = conn.recv()
+            if cmd == "close":
+                break
+            try:
+                if cmd == "step":
+                    slot, actions = args
+                    # Observations are written by the emulators straight into
+                    # the shared ring slot
+                    venv._obs = ring[slot]
+                    _, rewards, dones, truncated, infos = venv.step(actions)
+                    final_info = None
+                    if dones.any():
+                        for i in np.flatnonzero(dones):
+                            final[i] = infos[_FINAL_OBS][i]
+                        final_info = venv._final_info[dones]
+                    result = (rewards, dones, truncated, venv._info, final_info)
+                elif cmd == "reset":
+                    slot, seed, options = args
+                    venv._obs = ring[slot]
+                    venv.reset(seed=seed, options=options)
+                    result = venv._info
+                elif cmd == "render":
+                    for i, env in enumerate(venv.envs):
+                        env.get_screen(out=screen[i])
+                    result = None
+                else:
+                    raise ValueError(f"Unknown command: {cmd}")
+                conn.send((True, result))
+            except Exception:
+                conn.send((False, traceback.format_exc()))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        venv._obs = None
+        venv.close()
+
+
+class SubprocVecRetroEnv(gym.vector.VectorEnv):
+    """
+    Vectorized Gym Retro environment spread over worker processes
+
+    Each of the ``num_workers`` processes runs a :class:`VecRetroEnv` over its
+    share of the ``num_envs`` games. Observations are written by the emulators
+    directly into a ring of ``ring`` shared memory buffers, so only actions,
+    rewards, dones and info variables are sent over the pipes. Environments
+    that finish an episode are reset in the same step, and their last
+    observation and info are reported as by :class:`VecRetroEnv`.
+
+    Remaining keyword arguments are passed to :class:`RetroEnv`; audio is
+    disabled unless ``audio=True`` is passed. With ``copy=False``,
+    :meth:`step` and :meth:`reset` return a view of the shared ring, which
+    stays valid for the next ``ring - 1`` calls.
+    """
+
+    metadata = VecRetroEnv.metadata
+
+    def __init__(
+        self,
+        game,
+        num_envs,
+        state=retro.State.DEFAULT,
+        num_workers=None,
+        info_keys=None,
+        copy=True,
+        ring=2,
+        render_mode=None,
+        context=None,
+        **kwargs,
+    ):
+        if ring < 1:
+            raise ValueError("ring must hold at least one observation")
+        if kwargs.get("record", False) is not False:
+            raise ValueError("SubprocVecRetroEnv does not support recording")
+        self.num_envs = num_envs
+        self.render_mode = render_mode
+        self.copy = copy
+        self.closed = False
+        self._workers = []
+        self._shms = []
+        self._context = multiprocessing.get_context(context)
+
+        num_workers = min(num_workers or multiprocessing.cpu_count(), num_envs)
+        bounds = np.linspace(0, num_envs, num_workers + 1).astype(int)
+        self._slices = [slice(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:])]
+        # Workers must share the parent's resource tracker. One they started
+        # themselves would unlink the shared buffers when they exit
+        resource_tracker.ensure_running()
+        try:
+            for s in self._slices:
+                parent, child = self._context.Pipe()
+                process = self._context.Process(
+                    target=_worker,
+                    args=(child, game, s.stop - s.start, state, info_keys, kwargs),
+                    daemon=True,
+                )
+                process.start()
+                child.close()
+                self._workers.append((process, parent))
+            specs = self._gather()
+        except Exception:
+            self.close_extras()
+            raise
+
+        obs_space, action_space, self.info_keys, screen_shape = specs[0]
+        self.single_observation_space = obs_space
+        self.single_action_space = action_space
+        self.observation_space = gym.vector.utils.batch_space(obs_space, num_envs)
+        self.action_space = gym.vector.utils.batch_space(action_space, num_envs)
+
+        shared = [
+            self._shared((ring, num_envs) + obs_space.shape),
+            self._shared((num_envs,) + obs_space.shape),
+            self._shared((num_envs,) + screen_shape),
+        ]
+        self._ring, self._final, self._screen = (array for _, array in shared)
+        for s, (_, conn) in zip(self._slices, self._workers):
+            conn.send(([spec for spec, _ in shared], s.start, s.stop))
+
+        self._slot = 0
+        self._rewards = np.zeros([num_envs], dtype=np.float32)
+        self._dones = np.zeros([num_envs], dtype=bool)
+        self._truncated = np.zeros([num_envs], dtype=bool)
+        self._info = np.zeros([num_envs, len(self.info_keys)], dtype=np.int64)
+        self._final_info = np.zeros_like(self._info)
+
+    def _shared(self, shape):
+        shm = shared_memory.SharedMemory(
+            create=True,
+            size=max(int(np.prod(shape)), 1),
+        )
+        self._shms.append(shm)
+        return (shm.name, shape), np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+
+    def _gather(self):
+        # Every reply is read before raising, so that the replies of the other
+        # workers are not left in the pipes for the next command
+        results, error = [], None
+        for _, conn in self._workers:
+            try:
+                ok, result = conn.recv()
+            except EOFError:
+                ok, result = False, None
+            if not ok and error is None:
+                if result is None:
+                    error = RuntimeError("SubprocVecRetroEnv worker exited")
+                else:
+                    error = RuntimeError(f"SubprocVecRetroEnv worker failed:\n{result}")
+            results.append(result)
+        if error is not None:
+            raise error
+        return results
+
+    def _call(self, cmd, *args):
+        for _, conn in self._workers:
+            conn.send((cmd,) + args)
+        return self._gather()
+
+    def _next_slot(self):
+        self._slot = (self._slot + 1) % len(self._ring)
+        return self._slot
+
+    def _output(self, arr):
+        return arr.copy() if self.copy else arr
+
+    def _infos(self):
+        info = self._output(self._info)
+        return {key: info[:, k] for k, key in enumerate(self.info_keys)}
+
+    def reset(self, seed=None, options=None):
+        slot = self._next_slot()
+        for s, (_, conn) in zip(self._slices, self._workers):
+            conn.send(
+                ("reset", slot, None if seed is None else seed + s.start, options),
+            )
+        for s, info in zip(self._slices, self._gather()):
+            self._info[s] = info
+        return self._output(self._ring[slot]), self._infos()
+
+    def step(self, actions):
+        actions = np.asarray(actions)
+        slot = self._next_slot()
+        for s, (_, conn) in zip(self._slices, self._workers):
+            conn.send(("step", slot, actions[s]))
+        for s, result in zip(self._slices, self._gather()):
+            (
+                self._rewards[s],
+                self._dones[s],
+                self._truncated[s],
+                self._info[s],
+                final_info,
+            ) = result
+            if final_info is not None:
+                self._final_info[s][self._dones[s]] = final_info
+        infos = self._infos()
+
+        dones = self._dones.copy()
+        if dones.any():
+            final_obs = np.empty([self.num_envs], dtype=object)
+            for i in np.flatnonzero(dones):
+                final_obs[i] = self._final[i].copy()
+            _add_final_infos(
+                infos,
+                dones,
+                final_obs,
+                self.info_keys,
+                self._output(self._final_info),
+            )
+
+        return (
+            self._output(self._ring[slot]),
+            self._output(self._rewards),
+            dones,
+            self._output(self._truncated),
+            infos,
+        )
+
+    def render(self):
+        self._call("render")
+        return list(self._screen.copy())
+
+    def close_extras(self, **kwargs):
+        for process, conn in self._workers:
+            try:
+                conn.send(("close",))
+            except OSError:
+                pass
+        for process, conn in self._workers:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+            conn.close()
+        self._workers = []
+
+        self._ring = self._final = self._screen = None
+        for shm in self._shms:
+            try:
+                shm.close()
+            except BufferError:
+                # A view returned with copy=False is still alive; the mapping
+                # goes away with it
+                pass
+            shm.unlink()
+        self._shms = []
@@ -0,0 +1,172 @@
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+__all__ = ["TrajectoryRecorder", "load_trajectory"]
+
+INDEX = "index.json"
+FIELDS = ["obs", "actions", "rewards", "terminated", "truncated", "info"]
+
+
+def _read_index(path):
+    with open(os.path.join(path, INDEX)) as f:
+        return json.load(f)
+
+
+class TrajectoryRecorder:
+    """
+    Append environment steps to memory-mapped ``.npy`` shards in ``path``
+
+    Each shard is a directory of arrays preallocated for ``shard_size``
+    steps: ``obs``, the observation each action was chosen from, and the
+    ``actions``, ``rewards``, ``terminated``, ``truncated`` and ``info`` of
+    the step, where ``info`` is a structured array of the ``info_keys``
+    variables. Steps are copied into the shards by a background thread.
+    ``index.json`` records how many steps of each shard are valid and is
+    rewritten whenever a shard fills up and on :meth:`close`. Recording into
+    an existing directory appends new shards to it
+    """
+
+    def __init__(self, path, info_keys=(), shard_size=10000, queue_size=64):
+        self.path = path
+        self.info_keys = list(info_keys)
+        self.shard_size = shard_size
+        self._info_dtype = np.dtype([(key, np.int64) for key in self.info_keys])
+        self._shards = []
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, INDEX)):
+            index = _read_index(path)
+            if index["info_keys"] != self.info_keys:
+                raise ValueError(
+                    "Recording has info keys %s, not %s"
+                    % (index["info_keys"], self.info_keys),
+                )
+            self._shards = index["shards"]
+
+        self._arrays = None
+        self._steps = 0
+        self._error = None
+        self._queue = queue.Queue(queue_size)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def append(self, obs, action, reward, terminated, truncated, info):
+        """
+        Queue one step. ``obs`` must not be modified until it is written;
+        ``info`` is a dict or structured array holding the ``info_keys``
+        """
+        if self._error is not None:
+            raise RuntimeError("Trajectory recording failed") from self._error
+        if self._thread is None:
+            raise RuntimeError("TrajectoryRecorder is closed")
+        values = tuple(int(info[key]) for key in self.info_keys)
+        self._queue.put(
+            (obs, np.array(action), reward, terminated, truncated, values),
+        )
+
+    def _run(self):
+        try:
+            while True:
+                step = self._queue.get()
+                if step is None:
+                    break
+                self._write(*step)
+        except Exception as e:
+            self._error = e
+            # Keep draining so that append and close do not block
+            while self._queue.get() is not None:
+                pass
+        finally:
+            if self._arrays is not None:
+                self._finish_shard()
+
+    def _open_shard(self, obs, action, reward):
+        name = "%05d" % len(self._shards)
+        os.makedirs(os.path.join(self.path, name))
+        specs = {
+            "obs": (np.shape(obs), np.asarray(obs).dtype),
+            "actions": (action.shape, action.dtype),
+            "rewards": (np.shape(reward), np.float32),
+            "terminated": ((), bool),
+            "truncated": ((), bool),
+            "info": ((), self._info_dtype),
+        }
+        self._arrays = {
+            field: np.lib.format.open_memmap(
+                os.path.join(self.path, name, field + ".npy"),
+                mode="w+",
+                dtype=dtype,
+                shape=(self.shard_size,) + shape,
+            )
+            for field, (shape, dtype) in specs.items()
+        }
+        self._shards.append({"path": name, "steps": 0})
+        self._steps = 0
+
+    def _write(self, obs, action, reward, terminated, truncated, info):
+        if self._arrays is None:
+            self._open_shard(obs, action, reward)
+        step = self._steps
+        arrays = self._arrays
+        arrays["obs"][step] = obs
+        arrays["actions"][step] = action
+        arrays["rewards"][step] = reward
+        arrays["terminated"][step] = terminated
+        arrays["truncated"][step] = truncated
+        arrays["info"][step] = info
+        self._steps += 1
+        if self._steps == self.shard_size:
+            self._finish_shard()
+
+    def _finish_shard(self):
+        for array in self._arrays.values():
+            array.flush()
+        self._arrays = None
+        self._shards[-1]["steps"] = self._steps
+        self._write_index()
+
+    def _write_index(self):
+        index = {
+            "shard_size": self.shard_size,
+            "info_keys": self.info_keys,
+            "shards": self._shards,
+        }
+        tmp = os.path.join(self.path, INDEX + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp, os.path.join(self.path, INDEX))
+
+    def close(self):
+        """
+        Write the remaining steps and the index, then stop the thread
+        """
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        if self._error is not None:
+            raise RuntimeError("Trajectory recording failed") from self._error
+
+
+def load_trajectory(path):
+    """
+    Open a recording made by :class:`TrajectoryRecorder` without copying it.
+    Returns a list with a dict of read-only memory-mapped arrays per shard,
+    trimmed to the steps that were written
+    """
+    shards = []
+    for shard in _read_index(path)["shards"]:
+        shards.append(
+            {
+                field: np.load(
+                    os.path.join(path, shard["path"], field + ".npy"),
+                    mmap_mode="r",
+                )[: shard["steps"]]
+                for field in FIELDS
+            },
+        )
+    return shards
@@ -157,6 +157,8 @@ void GameData::reset() {
 	restart();
 	m_lastMem.reset();
 	m_cloneMem.reset();
+	m_varValues.clear();
+	m_lastVarValues.clear();
 	m_vars.clear();
 	m_searches.clear();
 	m_searchOldMem.clear();
@@ -167,10 +169,32 @@ void GameData::restart() {
 }
 
 void GameData::updateRam() {
-	m_lastMem = move(m_cloneMem);
+	if (m_variableSnapshots) {
+		// Only the values that lookupDelta can ask for are kept
+		swap(m_lastVarValues, m_varValues);
+		const AddressSpace& mem = m_mem;
+		for (const auto& var : m_vars) {
+			try {
+				m_varValues[var.first] = mem[var.second];
+			} catch (const out_of_range&) {
+				m_varValues.erase(var.first);
+			}
+		}
+		return;
+	}
+	// Double buffered, so the previous snapshot's blocks are reused
+	m_lastMem.swap(m_cloneMem);
 	m_cloneMem.clone(m_mem);
 }
 
+void GameData::setVariableSnapshots(bool enabled) {
+	m_variableSnapshots = enabled;
+	m_lastMem.reset();
+	m_cloneMem.reset();
+	m_varValues.clear();
+	m_lastVarValues.clear();
+}
+
 void GameData::setTypes(const vector<DataType> types) {
 	m_types = vector<DataType>(types);
 }
@@ -232,6 +256,14 @@ int64_t GameData::lookupDelta(const string& name) const {
 	if (v == m_vars.end()) {
 		return 0;
 	}
+	if (m_variableSnapshots) {
+		const auto& newVal = m_varValues.find(name);
+		const auto& oldVal = m_lastVarValues.find(name);
+		if (newVal == m_varValues.end() || oldVal == m_lastVarValues.end()) {
+			return 0;
+		}
+		return newVal->second - oldVal->second;
+	}
 	int64_t newVal = m_cloneMem[v->second];
 
 	if (!m_lastMem.ok()) {
@@ -32,6 +32,8 @@ public:
 	AddressSpace& addressSpace() { return m_mem; }
 	const AddressSpace& addressSpace() const { return m_mem; }
 	void updateRam();
+	void setVariableSnapshots(bool);
+	bool variableSnapshots() const { return m_variableSnapshots; }
 
 	void setTypes(const std::vector<DataType> types);
 	void setButtons(const std::vector<std::string>& names);
@@ -77,6 +79,9 @@ private:
 	AddressSpace m_mem;
 	AddressSpace m_cloneMem;
 	AddressSpace m_lastMem;
+	bool m_variableSnapshots = false;
+	std::unordered_map<std::string, int64_t> m_varValues;
+	std::unordered_map<std::string, int64_t> m_lastVarValues;
 	std::vector<DataType> m_types;
 
 	std::map<int, std::set<int>> m_actions;
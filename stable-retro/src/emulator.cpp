@@ -1,9 +1,14 @@
+#include <algorithm>
 #include <cassert>
+#include <cstdio>
+#include <cstdlib>
 #ifndef _WIN32
 #include <dlfcn.h>
+#include <unistd.h>
 #endif
 #include <fstream>
 #include <map>
+#include <mutex>
 #include <sstream>
 #include <unordered_map>
 #include <vector>
@@ -23,7 +28,14 @@ using namespace std;
 
 namespace Retro {
 
-static Emulator* s_loadedEmulator = nullptr;
+// libretro callbacks carry no context, so every call into a core is made with
+// the owning emulator marked as active on the calling thread
+static thread_local Emulator* s_activeEmulator = nullptr;
+
+// Cores keep their state in globals, so only one instance may use a given
+// library image. Additional instances load a private copy of the core.
+static mutex s_coreMutex;
+static unordered_map<string, unsigned> s_coreUsers;
 
 static map<string, const char*> s_envVariables = {
 	{ "genesis_plus_gx_bram", "per game" },
@@ -31,28 +43,53 @@ static map<string, const char*> s_envVariables = {
 	{ "genesis_plus_gx_blargg_ntsc_filter", "disabled" }
 };
 
-static void (*retro_init)(void);
-static void (*retro_deinit)(void);
-static unsigned (*retro_api_version)(void);
-static void (*retro_get_system_info)(struct retro_system_info* info);
-static void (*retro_get_system_av_info)(struct retro_system_av_info* info);
-static void (*retro_reset)(void);
-static void (*retro_run)(void);
-static size_t (*retro_serialize_size)(void);
-static bool (*retro_serialize)(void* data, size_t size);
-static bool (*retro_unserialize)(const void* data, size_t size);
-static bool (*retro_load_game)(const struct retro_game_info* game);
-static void (*retro_unload_game)(void);
-static void* (*retro_get_memory_data)(unsigned id);
-static size_t (*retro_get_memory_size)(unsigned id);
-static void (*retro_cheat_reset)(void);
-static void (*retro_cheat_set)(unsigned index, bool enabled, const char* code);
-static void (*retro_set_environment)(retro_environment_t);
-static void (*retro_set_video_refresh)(retro_video_refresh_t);
-static void (*retro_set_audio_sample)(retro_audio_sample_t);
-static void (*retro_set_audio_sample_batch)(retro_audio_sample_batch_t);
-static void (*retro_set_input_poll)(retro_input_poll_t);
-static void (*retro_set_input_state)(retro_input_state_t);
+namespace {
+class ActiveEmulator {
+public:
+	ActiveEmulator(Emulator* emulator)
+		: m_previous(s_activeEmulator) {
+		s_activeEmulator = emulator;
+	}
+	~ActiveEmulator() {
+		s_activeEmulator = m_previous;
+	}
+
+private:
+	Emulator* m_previous;
+};
+}
+
+static string privateCoreCopy(const string& corePath) {
+	string copyPath;
+#ifdef _WIN32
+	char tmpDir[MAX_PATH];
+	char tmpPath[MAX_PATH];
+	if (!GetTempPathA(MAX_PATH, tmpDir) || !GetTempFileNameA(tmpDir, "rcr", 0, tmpPath)) {
+		return {};
+	}
+	copyPath = tmpPath;
+#else
+	const char* tmpDir = getenv("TMPDIR");
+	string tmpl = string(tmpDir && *tmpDir ? tmpDir : "/tmp") + "/retro-core-XXXXXX";
+	vector<char> tmpPath(tmpl.begin(), tmpl.end());
+	tmpPath.push_back('\0');
+	int fd = mkstemp(tmpPath.data());
+	if (fd < 0) {
+		return {};
+	}
+	close(fd);
+	copyPath = tmpPath.data();
+#endif
+	ifstream in(corePath, ios::binary);
+	ofstream out(copyPath, ios::binary | ios::trunc);
+	out << in.rdbuf();
+	out.close();
+	if (in.fail() || out.fail()) {
+		remove(copyPath.c_str());
+		return {};
+	}
+	return copyPath;
+}
 
 Emulator::Emulator() {
 }
@@ -69,10 +106,6 @@ Emulator::~Emulator() {
 	}
 }
 
-bool Emulator::isLoaded() {
-	return s_loadedEmulator;
-}
-
 bool Emulator::loadRom(const string& romPath) {
 	if (m_romLoaded) {
 		unloadRom();
@@ -122,12 +155,13 @@ bool Emulator::loadRom(const string& romPath) {
 	}
 	in.close();
 
-	auto res = retro_load_game(&gameInfo);
+	ActiveEmulator active(this);
+	auto res = m_api.retro_load_game(&gameInfo);
 	delete[] romData;
 	if (!res) {
 		return false;
 	}
-	retro_get_system_av_info(&m_avInfo);
+	m_api.retro_get_system_av_info(&m_avInfo);
 	fixScreenSize(romPath);
 
 	m_romLoaded = true;
@@ -136,38 +170,69 @@ bool Emulator::loadRom(const string& romPath) {
 }
 
 void Emulator::run() {
-	assert(s_loadedEmulator == this);
+	ActiveEmulator active(this);
+	m_audioData.clear();
+	m_audioRingRunStart = m_audioRingWritten;
+	m_api.retro_run();
+}
+
+void Emulator::setAudioEnabled(bool enabled) {
+	m_audioEnabled = enabled;
 	m_audioData.clear();
-	retro_run();
+}
+
+void Emulator::setAudioRing(size_t frames) {
+	if (frames) {
+		m_audioRing = std::make_shared<std::vector<int16_t>>(frames * 2, 0);
+	} else {
+		m_audioRing.reset();
+	}
+	m_audioRingWritten = 0;
+	m_audioRingRunStart = 0;
+	m_audioData.clear();
+}
+
+void Emulator::appendAudio(const int16_t* data, size_t frames) {
+	if (!m_audioRing) {
+		m_audioData.insert(m_audioData.end(), data, &data[frames * 2]);
+		return;
+	}
+	std::vector<int16_t>& ring = *m_audioRing;
+	size_t capacity = ring.size() / 2;
+	if (frames > capacity) {
+		// Only the newest samples survive a write larger than the ring
+		m_audioRingWritten += frames - capacity;
+		data += (frames - capacity) * 2;
+		frames = capacity;
+	}
+	size_t head = m_audioRingWritten % capacity;
+	size_t first = std::min(frames, capacity - head);
+	memcpy(&ring[head * 2], data, first * 4);
+	memcpy(&ring[0], &data[first * 2], (frames - first) * 4);
+	m_audioRingWritten += frames;
 }
 
 void Emulator::reset() {
-	assert(s_loadedEmulator == this);
+	ActiveEmulator active(this);
 
 	memset(m_buttonMask, 0, sizeof(m_buttonMask));
 
 	retro_system_info systemInfo;
-	retro_get_system_info(&systemInfo);
+	m_api.retro_get_system_info(&systemInfo);
 	if (!strcmp(systemInfo.library_name, "Stella")) {
 		// Stella does not properly clear everything when reseting or loading a savestate
 		string romPath = m_romPath;
 
-#ifdef _WIN32
-		FreeLibrary(m_coreHandle);
-#else
-		dlclose(m_coreHandle);
-#endif
-		m_coreHandle = nullptr;
-		s_loadedEmulator = nullptr;
+		closeCore();
 		m_romLoaded = false;
 		loadRom(m_romPath);
 		if (m_addressSpace) {
 			m_addressSpace->reset();
-			m_addressSpace->addBlock(Retro::ramBase(m_core), retro_get_memory_size(RETRO_MEMORY_SYSTEM_RAM), retro_get_memory_data(RETRO_MEMORY_SYSTEM_RAM));
+			m_addressSpace->addBlock(Retro::ramBase(m_core), m_api.retro_get_memory_size(RETRO_MEMORY_SYSTEM_RAM), m_api.retro_get_memory_data(RETRO_MEMORY_SYSTEM_RAM));
 		}
 	}
 
-	retro_reset();
+	m_api.retro_reset();
 }
 
 void Emulator::unloadCore() {
@@ -177,21 +242,21 @@ void Emulator::unloadCore() {
 	if (m_romLoaded) {
 		unloadRom();
 	}
-	retro_deinit();
-#ifdef _WIN32
-	FreeLibrary(m_coreHandle);
-#else
-	dlclose(m_coreHandle);
-#endif
-	m_coreHandle = nullptr;
-	s_loadedEmulator = nullptr;
+	{
+		ActiveEmulator active(this);
+		m_api.retro_deinit();
+	}
+	closeCore();
 }
 
 void Emulator::unloadRom() {
 	if (!m_romLoaded) {
 		return;
 	}
-	retro_unload_game();
+	{
+		ActiveEmulator active(this);
+		m_api.retro_unload_game();
+	}
 	m_romLoaded = false;
 	m_romPath.clear();
 	m_addressSpace = nullptr;
@@ -199,95 +264,132 @@ void Emulator::unloadRom() {
 }
 
 bool Emulator::serialize(void* data, size_t size) {
-	assert(s_loadedEmulator == this);
-	return retro_serialize(data, size);
+	ActiveEmulator active(this);
+	return m_api.retro_serialize(data, size);
 }
 
 bool Emulator::unserialize(const void* data, size_t size) {
-	assert(s_loadedEmulator == this);
+	ActiveEmulator active(this);
 	try {
 		retro_system_info systemInfo;
-		retro_get_system_info(&systemInfo);
+		m_api.retro_get_system_info(&systemInfo);
 		if (!strcmp(systemInfo.library_name, "Stella")) {
 			reset();
 		}
 
-		return retro_unserialize(data, size);
+		return m_api.retro_unserialize(data, size);
 	} catch (...) {
 		return false;
 	}
 }
 
 size_t Emulator::serializeSize() {
-	assert(s_loadedEmulator == this);
-	return retro_serialize_size();
+	ActiveEmulator active(this);
+	return m_api.retro_serialize_size();
 }
 
 void Emulator::clearCheats() {
-	assert(s_loadedEmulator == this);
-	retro_cheat_reset();
+	ActiveEmulator active(this);
+	m_api.retro_cheat_reset();
 }
 
 void Emulator::setCheat(unsigned index, bool enabled, const char* code) {
-	assert(s_loadedEmulator == this);
-	retro_cheat_set(index, enabled, code);
+	ActiveEmulator active(this);
+	m_api.retro_cheat_set(index, enabled, code);
 }
 
 bool Emulator::loadCore(const string& corePath) {
-	if (s_loadedEmulator) {
-		return false;
-	}
-
+	string libPath = corePath;
+	{
+		lock_guard<mutex> lock(s_coreMutex);
+		if (s_coreUsers[corePath]) {
+			m_corePrivateCopy = privateCoreCopy(corePath);
+			if (m_corePrivateCopy.empty()) {
+				return false;
+			}
+			libPath = m_corePrivateCopy;
+		}
 #ifdef _WIN32
-	m_coreHandle = LoadLibrary(corePath.c_str());
+		m_coreHandle = LoadLibrary(libPath.c_str());
 #else
-	m_coreHandle = dlopen(corePath.c_str(), RTLD_LAZY);
+		m_coreHandle = dlopen(libPath.c_str(), RTLD_LAZY | RTLD_LOCAL);
 #endif
-	if (!m_coreHandle) {
-		return false;
+		if (!m_coreHandle) {
+			if (!m_corePrivateCopy.empty()) {
+				remove(m_corePrivateCopy.c_str());
+				m_corePrivateCopy.clear();
+			}
+			return false;
+		}
+		++s_coreUsers[corePath];
+		m_coreLib = corePath;
+	}
+#ifndef _WIN32
+	if (!m_corePrivateCopy.empty()) {
+		// The mapping stays valid after the file is gone
+		unlink(m_corePrivateCopy.c_str());
+		m_corePrivateCopy.clear();
 	}
+#endif
 
-	retro_init = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_init"));
-	retro_deinit = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_deinit"));
-	retro_api_version = reinterpret_cast<unsigned int (*)()>(GETSYM(m_coreHandle, "retro_api_version"));
-	retro_get_system_info = reinterpret_cast<void (*)(struct retro_system_info*)>(GETSYM(m_coreHandle, "retro_get_system_info"));
-	retro_get_system_av_info = reinterpret_cast<void (*)(struct retro_system_av_info*)>(GETSYM(m_coreHandle, "retro_get_system_av_info"));
-	retro_reset = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_reset"));
-	retro_run = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_run"));
-	retro_serialize_size = reinterpret_cast<size_t (*)()>(GETSYM(m_coreHandle, "retro_serialize_size"));
-	retro_serialize = reinterpret_cast<bool (*)(void*, size_t)>(GETSYM(m_coreHandle, "retro_serialize"));
-	retro_unserialize = reinterpret_cast<bool (*)(const void*, size_t)>(GETSYM(m_coreHandle, "retro_unserialize"));
-	retro_load_game = reinterpret_cast<bool (*)(const struct retro_game_info*)>(GETSYM(m_coreHandle, "retro_load_game"));
-	retro_unload_game = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_unload_game"));
-	retro_get_memory_data = reinterpret_cast<void* (*) (unsigned int)>(GETSYM(m_coreHandle, "retro_get_memory_data"));
-	retro_get_memory_size = reinterpret_cast<size_t (*)(unsigned int)>(GETSYM(m_coreHandle, "retro_get_memory_size"));
-	retro_cheat_reset = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_cheat_reset"));
-	retro_cheat_set = reinterpret_cast<void (*)(unsigned int, bool, const char*)>(GETSYM(m_coreHandle, "retro_cheat_set"));
-	retro_set_environment = reinterpret_cast<void (*)(retro_environment_t)>(GETSYM(m_coreHandle, "retro_set_environment"));
-	retro_set_video_refresh = reinterpret_cast<void (*)(retro_video_refresh_t)>(GETSYM(m_coreHandle, "retro_set_video_refresh"));
-	retro_set_audio_sample = reinterpret_cast<void (*)(retro_audio_sample_t)>(GETSYM(m_coreHandle, "retro_set_audio_sample"));
-	retro_set_audio_sample_batch = reinterpret_cast<void (*)(retro_audio_sample_batch_t)>(GETSYM(m_coreHandle, "retro_set_audio_sample_batch"));
-	retro_set_input_poll = reinterpret_cast<void (*)(retro_input_poll_t)>(GETSYM(m_coreHandle, "retro_set_input_poll"));
-	retro_set_input_state = reinterpret_cast<void (*)(short (*)(unsigned int, unsigned int, unsigned int, unsigned int))>(GETSYM(m_coreHandle, "retro_set_input_state"));
+	m_api.retro_init = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_init"));
+	m_api.retro_deinit = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_deinit"));
+	m_api.retro_api_version = reinterpret_cast<unsigned int (*)()>(GETSYM(m_coreHandle, "retro_api_version"));
+	m_api.retro_get_system_info = reinterpret_cast<void (*)(struct retro_system_info*)>(GETSYM(m_coreHandle, "retro_get_system_info"));
+	m_api.retro_get_system_av_info = reinterpret_cast<void (*)(struct retro_system_av_info*)>(GETSYM(m_coreHandle, "retro_get_system_av_info"));
+	m_api.retro_reset = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_reset"));
+	m_api.retro_run = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_run"));
+	m_api.retro_serialize_size = reinterpret_cast<size_t (*)()>(GETSYM(m_coreHandle, "retro_serialize_size"));
+	m_api.retro_serialize = reinterpret_cast<bool (*)(void*, size_t)>(GETSYM(m_coreHandle, "retro_serialize"));
+	m_api.retro_unserialize = reinterpret_cast<bool (*)(const void*, size_t)>(GETSYM(m_coreHandle, "retro_unserialize"));
+	m_api.retro_load_game = reinterpret_cast<bool (*)(const struct retro_game_info*)>(GETSYM(m_coreHandle, "retro_load_game"));
+	m_api.retro_unload_game = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_unload_game"));
+	m_api.retro_get_memory_data = reinterpret_cast<void* (*) (unsigned int)>(GETSYM(m_coreHandle, "retro_get_memory_data"));
+	m_api.retro_get_memory_size = reinterpret_cast<size_t (*)(unsigned int)>(GETSYM(m_coreHandle, "retro_get_memory_size"));
+	m_api.retro_cheat_reset = reinterpret_cast<void (*)()>(GETSYM(m_coreHandle, "retro_cheat_reset"));
+	m_api.retro_cheat_set = reinterpret_cast<void (*)(unsigned int, bool, const char*)>(GETSYM(m_coreHandle, "retro_cheat_set"));
+	m_api.retro_set_environment = reinterpret_cast<void (*)(retro_environment_t)>(GETSYM(m_coreHandle, "retro_set_environment"));
+	m_api.retro_set_video_refresh = reinterpret_cast<void (*)(retro_video_refresh_t)>(GETSYM(m_coreHandle, "retro_set_video_refresh"));
+	m_api.retro_set_audio_sample = reinterpret_cast<void (*)(retro_audio_sample_t)>(GETSYM(m_coreHandle, "retro_set_audio_sample"));
+	m_api.retro_set_audio_sample_batch = reinterpret_cast<void (*)(retro_audio_sample_batch_t)>(GETSYM(m_coreHandle, "retro_set_audio_sample_batch"));
+	m_api.retro_set_input_poll = reinterpret_cast<void (*)(retro_input_poll_t)>(GETSYM(m_coreHandle, "retro_set_input_poll"));
+	m_api.retro_set_input_state = reinterpret_cast<void (*)(short (*)(unsigned int, unsigned int, unsigned int, unsigned int))>(GETSYM(m_coreHandle, "retro_set_input_state"));
 
 	// The default according to the docs
 	m_imgDepth = 15;
-	s_loadedEmulator = this;
 
-	retro_set_environment(cbEnvironment);
-	retro_set_video_refresh(cbVideoRefresh);
-	retro_set_audio_sample(cbAudioSample);
-	retro_set_audio_sample_batch(cbAudioSampleBatch);
-	retro_set_input_poll(cbInputPoll);
-	retro_set_input_state(cbInputState);
-	retro_init();
+	ActiveEmulator active(this);
+	m_api.retro_set_environment(cbEnvironment);
+	m_api.retro_set_video_refresh(cbVideoRefresh);
+	m_api.retro_set_audio_sample(cbAudioSample);
+	m_api.retro_set_audio_sample_batch(cbAudioSampleBatch);
+	m_api.retro_set_input_poll(cbInputPoll);
+	m_api.retro_set_input_state(cbInputState);
+	m_api.retro_init();
 
 	return true;
 }
 
+void Emulator::closeCore() {
+#ifdef _WIN32
+	FreeLibrary(m_coreHandle);
+#else
+	dlclose(m_coreHandle);
+#endif
+	m_coreHandle = nullptr;
+	m_api = {};
+	if (!m_corePrivateCopy.empty()) {
+		remove(m_corePrivateCopy.c_str());
+		m_corePrivateCopy.clear();
+	}
+	lock_guard<mutex> lock(s_coreMutex);
+	--s_coreUsers[m_coreLib];
+	m_coreLib.clear();
+}
+
 void Emulator::fixScreenSize(const string& romName) {
 	retro_system_info systemInfo;
-	retro_get_system_info(&systemInfo);
+	m_api.retro_get_system_info(&systemInfo);
 	if (!strcmp(systemInfo.library_name, "Genesis Plus GX")) {
 		switch (romName.back()) {
 		case 'd': // Mega Drive
@@ -355,21 +457,21 @@ static void cbLog(enum retro_log_level level, const char *fmt, ...) {
 }
 
 bool Emulator::cbEnvironment(unsigned cmd, void* data) {
-	assert(s_loadedEmulator);
+	assert(s_activeEmulator);
 	switch (cmd) {
 	case RETRO_ENVIRONMENT_SET_PIXEL_FORMAT:
 		switch (*reinterpret_cast<retro_pixel_format*>(data)) {
 		case RETRO_PIXEL_FORMAT_XRGB8888:
-			s_loadedEmulator->m_imgDepth = 32;
+			s_activeEmulator->m_imgDepth = 32;
 			break;
 		case RETRO_PIXEL_FORMAT_RGB565:
-			s_loadedEmulator->m_imgDepth = 16;
+			s_activeEmulator->m_imgDepth = 16;
 			break;
 		case RETRO_PIXEL_FORMAT_0RGB1555:
-			s_loadedEmulator->m_imgDepth = 15;
+			s_activeEmulator->m_imgDepth = 15;
 			break;
 		default:
-			s_loadedEmulator->m_imgDepth = 0;
+			s_activeEmulator->m_imgDepth = 0;
 			break;
 		}
 		return true;
@@ -382,20 +484,25 @@ bool Emulator::cbEnvironment(unsigned cmd, void* data) {
 		return false;
 	}
 	case RETRO_ENVIRONMENT_GET_SYSTEM_DIRECTORY:
-		if (!s_loadedEmulator->m_corePath) {
-			s_loadedEmulator->m_corePath = strdup(corePath().c_str());
+		if (!s_activeEmulator->m_corePath) {
+			s_activeEmulator->m_corePath = strdup(corePath().c_str());
+		}
+		*reinterpret_cast<const char**>(data) = s_activeEmulator->m_corePath;
+		return true;
+	case RETRO_ENVIRONMENT_GET_AUDIO_VIDEO_ENABLE:
+		if (data) {
+			*reinterpret_cast<int*>(data) = (s_activeEmulator->m_videoEnabled ? 1 : 0) | (s_activeEmulator->m_audioEnabled ? 2 : 0);
 		}
-		*reinterpret_cast<const char**>(data) = s_loadedEmulator->m_corePath;
 		return true;
 	case RETRO_ENVIRONMENT_GET_CAN_DUPE:
 		*reinterpret_cast<bool*>(data) = true;
 		return true;
 	case RETRO_ENVIRONMENT_SET_MEMORY_MAPS:
-		s_loadedEmulator->m_map.clear();
+		s_activeEmulator->m_map.clear();
 		for (size_t i = 0; i < static_cast<const retro_memory_map*>(data)->num_descriptors; ++i) {
-			s_loadedEmulator->m_map.emplace_back(static_cast<const retro_memory_map*>(data)->descriptors[i]);
+			s_activeEmulator->m_map.emplace_back(static_cast<const retro_memory_map*>(data)->descriptors[i]);
 		}
-		s_loadedEmulator->reconfigureAddressSpace();
+		s_activeEmulator->reconfigureAddressSpace();
 		return true;
 	// Logs needs to be handled even when not used, otherwise some cores (ex: mame2003_plus) will crash
 	// Also very useful when integrating new emulators to debug issues within the core itself
@@ -411,34 +518,42 @@ bool Emulator::cbEnvironment(unsigned cmd, void* data) {
 }
 
 void Emulator::cbVideoRefresh(const void* data, unsigned, unsigned, size_t pitch) {
-	assert(s_loadedEmulator);
+	assert(s_activeEmulator);
+	if (!s_activeEmulator->m_videoEnabled) {
+		return;
+	}
 	if (data) {
-		s_loadedEmulator->m_imgData = data;
+		s_activeEmulator->m_imgData = data;
 	}
 	if (pitch) {
-		s_loadedEmulator->m_imgPitch = pitch;
+		s_activeEmulator->m_imgPitch = pitch;
 	}
 }
 
 void Emulator::cbAudioSample(int16_t left, int16_t right) {
-	assert(s_loadedEmulator);
-	s_loadedEmulator->m_audioData.push_back(left);
-	s_loadedEmulator->m_audioData.push_back(right);
+	assert(s_activeEmulator);
+	if (!s_activeEmulator->m_audioEnabled) {
+		return;
+	}
+	int16_t sample[2] = { left, right };
+	s_activeEmulator->appendAudio(sample, 1);
 }
 
 size_t Emulator::cbAudioSampleBatch(const int16_t* data, size_t frames) {
-	assert(s_loadedEmulator);
-	s_loadedEmulator->m_audioData.insert(s_loadedEmulator->m_audioData.end(), data, &data[frames * 2]);
+	assert(s_activeEmulator);
+	if (s_activeEmulator->m_audioEnabled) {
+		s_activeEmulator->appendAudio(data, frames);
+	}
 	return frames;
 }
 
 void Emulator::cbInputPoll() {
-	assert(s_loadedEmulator);
+	assert(s_activeEmulator);
 }
 
 int16_t Emulator::cbInputState(unsigned port, unsigned, unsigned, unsigned id) {
-	assert(s_loadedEmulator);
-	return s_loadedEmulator->m_buttonMask[port][id];
+	assert(s_activeEmulator);
+	return s_activeEmulator->m_buttonMask[port][id];
 }
 
 void Emulator::configureData(GameData* data) {
@@ -446,8 +561,9 @@ void Emulator::configureData(GameData* data) {
 	m_addressSpace->reset();
 	Retro::configureData(data, m_core);
 	reconfigureAddressSpace();
-	if (m_addressSpace->blocks().empty() && retro_get_memory_size(RETRO_MEMORY_SYSTEM_RAM)) {
-		m_addressSpace->addBlock(Retro::ramBase(m_core), retro_get_memory_size(RETRO_MEMORY_SYSTEM_RAM), retro_get_memory_data(RETRO_MEMORY_SYSTEM_RAM));
+	ActiveEmulator active(this);
+	if (m_addressSpace->blocks().empty() && m_api.retro_get_memory_size(RETRO_MEMORY_SYSTEM_RAM)) {
+		m_addressSpace->addBlock(Retro::ramBase(m_core), m_api.retro_get_memory_size(RETRO_MEMORY_SYSTEM_RAM), m_api.retro_get_memory_data(RETRO_MEMORY_SYSTEM_RAM));
 	}
 }
 
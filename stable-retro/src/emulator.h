@@ -3,8 +3,10 @@
 #include "libretro.h"
 #include "memory.h"
 
+#include <memory>
 #include <string>
 #include <vector>
+#include <cstdint>
 #include <cstring>
 #include <stdarg.h>
 #ifdef _WIN32
@@ -23,8 +25,6 @@ public:
 	~Emulator();
 	Emulator(const Emulator&) = delete;
 
-	static bool isLoaded();
-
 	bool loadRom(const std::string& romPath);
 
 	void run();
@@ -46,6 +46,20 @@ public:
 	bool unserialize(const void* data, size_t size);
 	size_t serializeSize();
 
+	void setVideoEnabled(bool enabled) { m_videoEnabled = enabled; }
+	bool isVideoEnabled() const { return m_videoEnabled; }
+	void setAudioEnabled(bool enabled);
+	bool isAudioEnabled() const { return m_audioEnabled; }
+
+	// Fixed-capacity ring of stereo sample frames; 0 goes back to the per-run buffer.
+	// Reconfiguring allocates a new ring, so holders of the old one keep valid storage
+	void setAudioRing(size_t frames);
+	size_t getAudioRingCapacity() const { return m_audioRing ? m_audioRing->size() / 2 : 0; }
+	const int16_t* getAudioRingData() const { return m_audioRing ? m_audioRing->data() : nullptr; }
+	std::shared_ptr<const std::vector<int16_t>> getAudioRing() const { return m_audioRing; }
+	uint64_t getAudioRingWritten() const { return m_audioRingWritten; }
+	uint64_t getAudioRingRunStart() const { return m_audioRingRunStart; }
+
 	void setKey(int port, int key, bool active) { m_buttonMask[port][key] = active; }
 	bool getKey(int port, int key) { return m_buttonMask[port][key]; }
 
@@ -58,7 +72,34 @@ public:
 	std::vector<std::string> keybinds() const;
 
 private:
+	// Entry points resolved from this instance's copy of the core
+	struct CoreApi {
+		void (*retro_init)(void);
+		void (*retro_deinit)(void);
+		unsigned (*retro_api_version)(void);
+		void (*retro_get_system_info)(struct retro_system_info* info);
+		void (*retro_get_system_av_info)(struct retro_system_av_info* info);
+		void (*retro_reset)(void);
+		void (*retro_run)(void);
+		size_t (*retro_serialize_size)(void);
+		bool (*retro_serialize)(void* data, size_t size);
+		bool (*retro_unserialize)(const void* data, size_t size);
+		bool (*retro_load_game)(const struct retro_game_info* game);
+		void (*retro_unload_game)(void);
+		void* (*retro_get_memory_data)(unsigned id);
+		size_t (*retro_get_memory_size)(unsigned id);
+		void (*retro_cheat_reset)(void);
+		void (*retro_cheat_set)(unsigned index, bool enabled, const char* code);
+		void (*retro_set_environment)(retro_environment_t);
+		void (*retro_set_video_refresh)(retro_video_refresh_t);
+		void (*retro_set_audio_sample)(retro_audio_sample_t);
+		void (*retro_set_audio_sample_batch)(retro_audio_sample_batch_t);
+		void (*retro_set_input_poll)(retro_input_poll_t);
+		void (*retro_set_input_state)(retro_input_state_t);
+	};
+
 	bool loadCore(const std::string& corePath);
+	void closeCore();
 	void fixScreenSize(const std::string& romName);
 	void reconfigureAddressSpace();
 
@@ -75,9 +116,15 @@ private:
 	const void* m_imgData = nullptr;
 	size_t m_imgPitch = 0;
 	int m_imgDepth = 0;
+	bool m_videoEnabled = true;
 
-	// Audio buffer; accumulated during run()
+	// Audio buffer; accumulated during run() unless the ring is in use
 	std::vector<int16_t> m_audioData;
+	bool m_audioEnabled = true;
+	std::shared_ptr<std::vector<int16_t>> m_audioRing;
+	uint64_t m_audioRingWritten = 0;
+	uint64_t m_audioRingRunStart = 0;
+	void appendAudio(const int16_t* data, size_t frames);
 	AddressSpace* m_addressSpace = nullptr;
 
 	retro_system_av_info m_avInfo = {};
@@ -85,11 +132,14 @@ private:
 
 	char* m_corePath = nullptr;
 
+	CoreApi m_api{};
 #ifdef _WIN32
 	HMODULE m_coreHandle = nullptr;
 #else
 	void* m_coreHandle = nullptr;
 #endif
+	std::string m_coreLib;
+	std::string m_corePrivateCopy;
 	bool m_romLoaded = false;
 	std::string m_core;
 	std::string m_romPath;
@@ -6,6 +6,7 @@
 #endif
 #include <stdexcept>
 #include <cstring>
+#include <vector>
 
 using namespace Retro;
 using namespace std;
@@ -20,6 +21,8 @@ static void imageHalveX888ToGrayInterlace(const uint32_t* in, const uint16_t* ol
 static void imageQuarterX888ToGray(const uint32_t* in, uint8_t* out, size_t w, size_t h, size_t stride);
 static void imageQuarterX888ToGrayInterlace(const uint32_t* in, const uint16_t* oldin, uint16_t* out, size_t w, size_t h, size_t stride);
 static void imageX888To888(const uint32_t* in, uint8_t* out, size_t w, size_t h, size_t stride);
+template<typename T>
+static void imageScale(const T* in, uint8_t* out, size_t w, size_t h, size_t stride, size_t outW, size_t outH, size_t outStride, bool gray);
 
 #ifdef __SSSE3__
 const static __m128i maskR16 = _mm_set1_epi16(0xF800);
@@ -330,8 +333,8 @@ static inline void _convert565To888(const __m128i* in, __m128i* out) {
 	/* 00 B8 00 B9 00 BA 00 BB 00 BC 00 BD 00 BE 00 BF -> BA 00 00 BB 00 00 BC 00 00 BD 00 00 BE 00 00 BF */
 	const static __m128i bblend21 = _mm_set_epi8(0x0E, 0x80, 0x80, 0x0C, 0x80, 0x80, 0x0A, 0x80, 0x80, 0x08, 0x80, 0x80, 0x06, 0x80, 0x80, 0x04);
 
-	__m128i pix0 = _mm_load_si128(&in[0]);
-	__m128i pix1 = _mm_load_si128(&in[1]);
+	__m128i pix0 = _mm_loadu_si128(&in[0]);
+	__m128i pix1 = _mm_loadu_si128(&in[1]);
 
 	// Mask out channels
 	__m128i r0 = _mm_and_si128(pix0, maskR16);
@@ -365,9 +368,9 @@ static inline void _convert565To888(const __m128i* in, __m128i* out) {
 	out2 = _mm_or_si128(out2, _mm_shuffle_epi8(g1, gblend21));
 	out2 = _mm_or_si128(out2, _mm_shuffle_epi8(b1, bblend21));
 
-	_mm_store_si128(&out[0], out0);
-	_mm_store_si128(&out[1], out1);
-	_mm_store_si128(&out[2], out2);
+	_mm_storeu_si128(&out[0], out0);
+	_mm_storeu_si128(&out[1], out1);
+	_mm_storeu_si128(&out[2], out2);
 }
 #endif
 
@@ -375,7 +378,7 @@ void image565To888(const uint16_t* in, uint8_t* out, size_t w, size_t h, size_t
 	for (size_t y = 0; y < h; ++y) {
 		size_t x = 0;
 #ifdef __SSSE3__
-		for (; x < w; x += 16) {
+		for (; x + 15 < w; x += 16) {
 			_convert565To888(reinterpret_cast<const __m128i*>(&in[x]), reinterpret_cast<__m128i*>(out));
 			out += 16 * 3;
 		}
@@ -572,10 +575,10 @@ void imageX888To888(const uint32_t* in, uint8_t* out, size_t w, size_t h, size_t
 			/* BC GC RC XC BD GD RD XD BE GE RE XE BF GF RF XF -> 00 00 00 00 RC GC BC RD GD BD RE GE BE RF GF DF */
 			const static __m128i blend23 = _mm_set_epi8(0x0C, 0x0D, 0x0E, 0x08, 0x09, 0x0A, 0x04, 0x05, 0x06, 0x00, 0x01, 0x02, 0x80, 0x80, 0x80, 0x80);
 
-			__m128i pix0 = _mm_load_si128(reinterpret_cast<const __m128i*>(&in[x]));
-			__m128i pix1 = _mm_load_si128(reinterpret_cast<const __m128i*>(&in[x + 4]));
-			__m128i pix2 = _mm_load_si128(reinterpret_cast<const __m128i*>(&in[x + 8]));
-			__m128i pix3 = _mm_load_si128(reinterpret_cast<const __m128i*>(&in[x + 12]));
+			__m128i pix0 = _mm_loadu_si128(reinterpret_cast<const __m128i*>(&in[x]));
+			__m128i pix1 = _mm_loadu_si128(reinterpret_cast<const __m128i*>(&in[x + 4]));
+			__m128i pix2 = _mm_loadu_si128(reinterpret_cast<const __m128i*>(&in[x + 8]));
+			__m128i pix3 = _mm_loadu_si128(reinterpret_cast<const __m128i*>(&in[x + 12]));
 
 			__m128i out0 = _mm_shuffle_epi8(pix0, blend00);
 			out0 = _mm_or_si128(out0, _mm_shuffle_epi8(pix1, blend01));
@@ -594,15 +597,69 @@ void imageX888To888(const uint32_t* in, uint8_t* out, size_t w, size_t h, size_t
 #endif
 		for (; x < w; ++x) {
 			uint32_t xrgb = in[x];
-			out[0] = xrgb;
+			out[0] = xrgb >> 16;
 			out[1] = xrgb >> 8;
-			out[2] = xrgb >> 16;
+			out[2] = xrgb;
 			out += 3;
 		}
 		in += stride / 4;
 	}
 }
 
+static inline void _unpackRGB(uint16_t rgb, unsigned* r, unsigned* g, unsigned* b) {
+	*r = (rgb & 0xF800) >> 8;
+	*g = (rgb & 0x07E0) >> 3;
+	*b = (rgb & 0x001F) << 3;
+}
+
+static inline void _unpackRGB(uint32_t xrgb, unsigned* r, unsigned* g, unsigned* b) {
+	*r = (xrgb >> 16) & 0xFF;
+	*g = (xrgb >> 8) & 0xFF;
+	*b = xrgb & 0xFF;
+}
+
+template<typename T>
+void imageScale(const T* in, uint8_t* out, size_t w, size_t h, size_t stride, size_t outW, size_t outH, size_t outStride, bool gray) {
+	/* Each output pixel averages the box of input pixels it covers */
+	vector<size_t> xBounds(outW + 1);
+	for (size_t x = 0; x <= outW; ++x) {
+		xBounds[x] = x * w / outW;
+	}
+	for (size_t oy = 0; oy < outH; ++oy) {
+		size_t y0 = oy * h / outH;
+		size_t y1 = max(y0 + 1, (oy + 1) * h / outH);
+		uint8_t* row = &out[oy * outStride];
+		for (size_t ox = 0; ox < outW; ++ox) {
+			size_t x0 = xBounds[ox];
+			size_t x1 = max(x0 + 1, xBounds[ox + 1]);
+			unsigned sumR = 0;
+			unsigned sumG = 0;
+			unsigned sumB = 0;
+			for (size_t y = y0; y < y1; ++y) {
+				const T* line = reinterpret_cast<const T*>(reinterpret_cast<const uint8_t*>(in) + y * stride);
+				for (size_t x = x0; x < x1; ++x) {
+					unsigned r, g, b;
+					_unpackRGB(line[x], &r, &g, &b);
+					sumR += r;
+					sumG += g;
+					sumB += b;
+				}
+			}
+			unsigned count = (y1 - y0) * (x1 - x0);
+			unsigned r = (sumR + count / 2) / count;
+			unsigned g = (sumG + count / 2) / count;
+			unsigned b = (sumB + count / 2) / count;
+			if (gray) {
+				row[ox] = (r * 77 + g * 150 + b * 29 + 128) >> 8;
+			} else {
+				row[ox * 3] = r;
+				row[ox * 3 + 1] = g;
+				row[ox * 3 + 2] = b;
+			}
+		}
+	}
+}
+
 Image::Image(Format format, const void* in, size_t w, size_t h, size_t stride)
 	: m_constBuffer(in)
 	, m_w(w)
@@ -834,6 +891,67 @@ void Image::divideToInterlace(int divisor, Image* other, const Image* old) {
 	}
 }
 
+void Image::scaleTo(Image* other) {
+	if (!other->m_w || !other->m_h || !m_w || !m_h) {
+		throw invalid_argument("Image dimensions must be nonzero");
+	}
+	if (other->m_format != Image::Format::RGB888 && other->m_format != Image::Format::G8) {
+		throw logic_error("unimplemented conversion");
+	}
+	bool gray = other->m_format == Image::Format::G8;
+	switch (m_format) {
+	case Image::Format::RGB565:
+		imageScale(static_cast<const uint16_t*>(m_constBuffer), static_cast<uint8_t*>(other->m_buffer), m_w, m_h, m_stride, other->m_w, other->m_h, other->m_stride, gray);
+		break;
+	case Image::Format::RGBX888:
+		imageScale(static_cast<const uint32_t*>(m_constBuffer), static_cast<uint8_t*>(other->m_buffer), m_w, m_h, m_stride, other->m_w, other->m_h, other->m_stride, gray);
+		break;
+	default:
+		throw logic_error("unimplemented conversion");
+	}
+}
+
+void Image::maxTo(const Image* other, Image* out) {
+	if (m_w != other->m_w || m_h != other->m_h || m_w != out->m_w || m_h != out->m_h) {
+		throw invalid_argument("Image dimensions don't match");
+	}
+	if (m_format != other->m_format || m_format != out->m_format) {
+		throw invalid_argument("Image formats don't match");
+	}
+	const uint8_t* a = static_cast<const uint8_t*>(m_constBuffer);
+	const uint8_t* b = static_cast<const uint8_t*>(other->m_constBuffer);
+	uint8_t* c = static_cast<uint8_t*>(out->m_buffer);
+	for (size_t y = 0; y < m_h; ++y) {
+		const uint8_t* rowA = &a[y * m_stride];
+		const uint8_t* rowB = &b[y * other->m_stride];
+		uint8_t* rowC = &c[y * out->m_stride];
+		switch (m_format) {
+		case Image::Format::RGB565:
+			for (size_t x = 0; x < m_w; ++x) {
+				uint16_t pa = reinterpret_cast<const uint16_t*>(rowA)[x];
+				uint16_t pb = reinterpret_cast<const uint16_t*>(rowB)[x];
+				reinterpret_cast<uint16_t*>(rowC)[x] = max(pa & 0xF800, pb & 0xF800) | max(pa & 0x07E0, pb & 0x07E0) | max(pa & 0x001F, pb & 0x001F);
+			}
+			break;
+		case Image::Format::RGB888:
+			for (size_t x = 0; x < m_w * 3; ++x) {
+				rowC[x] = max(rowA[x], rowB[x]);
+			}
+			break;
+		case Image::Format::RGBX888:
+			for (size_t x = 0; x < m_w * 4; ++x) {
+				rowC[x] = max(rowA[x], rowB[x]);
+			}
+			break;
+		case Image::Format::G8:
+			for (size_t x = 0; x < m_w; ++x) {
+				rowC[x] = max(rowA[x], rowB[x]);
+			}
+			break;
+		}
+	}
+}
+
 void Image::copyDirectlyTo(Image* other) {
 	size_t depth = 1;
 	switch (m_format) {
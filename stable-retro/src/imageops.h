@@ -26,6 +26,8 @@ public:
 	void quarterToInterlace(Image* other, const Image* old);
 	void divideTo(int divisor, Image* other);
 	void divideToInterlace(int divisor, Image* other, const Image* old);
+	void scaleTo(Image* other);
+	void maxTo(const Image* other, Image* out);
 
 private:
 	void copyDirectlyTo(Image* other);
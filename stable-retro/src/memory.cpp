@@ -400,7 +400,15 @@ void AddressSpace::reset() {
 }
 
 void AddressSpace::clone(const AddressSpace& as) {
-	m_blocks.clear();
+	// Blocks that are already cloned at the same offset and size are copied
+	// into in place instead of being reallocated
+	for (auto iter = m_blocks.begin(); iter != m_blocks.end();) {
+		if (as.m_blocks.count(iter->first)) {
+			++iter;
+		} else {
+			iter = m_blocks.erase(iter);
+		}
+	}
 	m_overlay = make_unique<MemoryOverlay>(*as.m_overlay);
 	for (auto& kv : as.m_blocks) {
 		m_blocks[kv.first].clone(kv.second);
@@ -413,6 +421,11 @@ void AddressSpace::clone() {
 	}
 }
 
+void AddressSpace::swap(AddressSpace& as) {
+	m_blocks.swap(as.m_blocks);
+	m_overlay.swap(as.m_overlay);
+}
+
 void AddressSpace::setOverlay(const MemoryOverlay& overlay) {
 	m_overlay = make_unique<MemoryOverlay>(overlay);
 }
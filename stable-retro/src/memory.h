@@ -434,6 +434,7 @@ public:
 	void reset();
 	void clone(const AddressSpace&);
 	void clone();
+	void swap(AddressSpace&);
 
 	void setOverlay(const MemoryOverlay& overlay);
 	const MemoryOverlay& overlay() const { return *m_overlay; };
@@ -0,0 +1,279 @@
+#include "movie-rmv.h"
+
+#include <cstring>
+#include <stdexcept>
+
+#include <fcntl.h>
+#ifndef _WIN32
+#include <sys/mman.h>
+#include <sys/stat.h>
+#endif
+#include <unistd.h>
+
+using namespace std;
+using namespace Retro;
+
+static const char s_magic[4] = { 'R', 'M', 'V', '\x1a' };
+static const uint16_t s_version = 1;
+static const size_t s_headerSize = 32;
+static const size_t s_chunkSize = 32;
+
+constexpr unsigned MovieRMV::DEFAULT_KEYFRAME_INTERVAL;
+
+template<typename T>
+static T getLE(const uint8_t* data) {
+	T value = 0;
+	for (size_t i = 0; i < sizeof(T); ++i) {
+		value |= static_cast<T>(data[i]) << (i * 8);
+	}
+	return value;
+}
+
+template<typename T>
+static void putLE(uint8_t* data, T value) {
+	for (size_t i = 0; i < sizeof(T); ++i) {
+		data[i] = static_cast<uint8_t>(value >> (i * 8));
+	}
+}
+
+unique_ptr<Movie> MovieRMV::load(const string& path) {
+	unique_ptr<MovieRMV> movie = make_unique<MovieRMV>(path);
+	if (!movie->ok()) {
+		return nullptr;
+	}
+	return movie;
+}
+
+MovieRMV::MovieRMV(const string& path, bool write, unsigned players, unsigned keyframeInterval)
+	: m_keyframeInterval(keyframeInterval)
+	, m_write(write) {
+	m_players = players;
+	if (write) {
+		if (!keyframeInterval) {
+			throw runtime_error("Keyframe interval must be positive");
+		}
+		m_out.open(path, ios::binary | ios::trunc);
+		m_ok = m_out.good();
+		return;
+	}
+
+	int fd = ::open(path.c_str(), O_RDONLY);
+	if (fd < 0) {
+		return;
+	}
+	m_size = lseek(fd, 0, SEEK_END);
+#ifdef _WIN32
+	lseek(fd, 0, SEEK_SET);
+	m_buffer.resize(m_size);
+	if (m_size && ::read(fd, m_buffer.data(), m_size) == static_cast<ssize_t>(m_size)) {
+		m_data = m_buffer.data();
+	}
+#else
+	if (m_size) {
+		void* data = mmap(nullptr, m_size, PROT_READ, MAP_SHARED, fd, 0);
+		if (data != MAP_FAILED) {
+			m_data = static_cast<const uint8_t*>(data);
+		}
+	}
+#endif
+	::close(fd);
+	m_ok = m_data && readHeader();
+}
+
+MovieRMV::~MovieRMV() {
+	close();
+}
+
+bool MovieRMV::readHeader() {
+	if (m_size < s_headerSize || memcmp(m_data, s_magic, sizeof(s_magic))) {
+		return false;
+	}
+	if (getLE<uint16_t>(&m_data[4]) != s_version) {
+		return false;
+	}
+	m_players = getLE<uint16_t>(&m_data[6]);
+	m_keyframeInterval = getLE<uint32_t>(&m_data[8]);
+	uint32_t nameSize = getLE<uint32_t>(&m_data[12]);
+	m_frames = getLE<uint64_t>(&m_data[16]);
+	uint64_t indexOffset = getLE<uint64_t>(&m_data[24]);
+	if (!m_players || m_players > MAX_PLAYERS || !m_keyframeInterval) {
+		return false;
+	}
+	if (s_headerSize + nameSize > m_size || indexOffset < s_headerSize + nameSize || indexOffset + 8 > m_size) {
+		// An unfinished recording has no index
+		return false;
+	}
+	m_gameName = string(reinterpret_cast<const char*>(&m_data[s_headerSize]), nameSize);
+
+	uint64_t count = getLE<uint64_t>(&m_data[indexOffset]);
+	if (count != (m_frames + m_keyframeInterval - 1) / m_keyframeInterval || count > (m_size - indexOffset - 8) / s_chunkSize) {
+		return false;
+	}
+	m_chunks.resize(count);
+	for (uint64_t i = 0; i < count; ++i) {
+		const uint8_t* entry = &m_data[indexOffset + 8 + i * s_chunkSize];
+		Chunk& chunk = m_chunks[i];
+		chunk.frame = getLE<uint64_t>(&entry[0]);
+		chunk.stateOffset = getLE<uint64_t>(&entry[8]);
+		chunk.stateSize = getLE<uint64_t>(&entry[16]);
+		chunk.inputOffset = getLE<uint64_t>(&entry[24]);
+		uint64_t frames = min<uint64_t>(m_keyframeInterval, m_frames - i * m_keyframeInterval);
+		if (chunk.frame != i * m_keyframeInterval || chunk.stateOffset + chunk.stateSize > indexOffset || chunk.inputOffset + frames * m_players * 2 > indexOffset) {
+			return false;
+		}
+	}
+	return true;
+}
+
+string MovieRMV::getGameName() const {
+	return m_gameName;
+}
+
+void MovieRMV::setGameName(const string& name) {
+	m_gameName = name;
+}
+
+void MovieRMV::writeHeader(uint64_t frames, uint64_t indexOffset) {
+	uint8_t header[s_headerSize] = { 0 };
+	memcpy(header, s_magic, sizeof(s_magic));
+	putLE<uint16_t>(&header[4], s_version);
+	putLE<uint16_t>(&header[6], m_players);
+	putLE<uint32_t>(&header[8], m_keyframeInterval);
+	putLE<uint32_t>(&header[12], m_gameName.size());
+	putLE<uint64_t>(&header[16], frames);
+	putLE<uint64_t>(&header[24], indexOffset);
+	m_out.write(reinterpret_cast<const char*>(header), sizeof(header));
+}
+
+void MovieRMV::startChunk() {
+	const vector<uint8_t>& state = m_frame ? m_keyframe : m_state;
+	m_chunks.push_back({ m_frame, m_offset, state.size(), m_offset + state.size() });
+	m_out.write(reinterpret_cast<const char*>(state.data()), state.size());
+	m_offset += state.size();
+	m_keyframe.clear();
+}
+
+bool MovieRMV::step() {
+	if (m_write) {
+		if (!m_out.is_open()) {
+			return false;
+		}
+		if (!m_headerWritten) {
+			writeHeader(0, 0);
+			m_out.write(m_gameName.data(), m_gameName.size());
+			m_offset = s_headerSize + m_gameName.size();
+			m_headerWritten = true;
+		}
+		if (m_frame % m_keyframeInterval == 0) {
+			startChunk();
+		}
+		uint8_t keys[MAX_PLAYERS * 2];
+		for (unsigned i = 0; i < m_players; ++i) {
+			putLE<uint16_t>(&keys[i * 2], m_keys[i]);
+			m_keys[i] = 0;
+		}
+		m_out.write(reinterpret_cast<const char*>(keys), m_players * 2);
+		m_offset += m_players * 2;
+		++m_frame;
+		return true;
+	}
+
+	if (m_frame >= m_frames) {
+		return false;
+	}
+	const Chunk& chunk = m_chunks[m_frame / m_keyframeInterval];
+	const uint8_t* keys = &m_data[chunk.inputOffset + (m_frame - chunk.frame) * m_players * 2];
+	for (unsigned i = 0; i < m_players; ++i) {
+		m_keys[i] = getLE<uint16_t>(&keys[i * 2]);
+	}
+	++m_frame;
+	return true;
+}
+
+void MovieRMV::close() {
+	if (m_write) {
+		if (!m_out.is_open()) {
+			return;
+		}
+		if (!m_headerWritten) {
+			writeHeader(0, 0);
+			m_out.write(m_gameName.data(), m_gameName.size());
+			m_offset = s_headerSize + m_gameName.size();
+		}
+		vector<uint8_t> index(8 + m_chunks.size() * s_chunkSize);
+		putLE<uint64_t>(&index[0], m_chunks.size());
+		for (size_t i = 0; i < m_chunks.size(); ++i) {
+			uint8_t* entry = &index[8 + i * s_chunkSize];
+			putLE<uint64_t>(&entry[0], m_chunks[i].frame);
+			putLE<uint64_t>(&entry[8], m_chunks[i].stateOffset);
+			putLE<uint64_t>(&entry[16], m_chunks[i].stateSize);
+			putLE<uint64_t>(&entry[24], m_chunks[i].inputOffset);
+		}
+		m_out.write(reinterpret_cast<const char*>(index.data()), index.size());
+		// The header is only valid once the index is in place
+		m_out.seekp(0);
+		writeHeader(m_frame, m_offset);
+		m_out.close();
+		return;
+	}
+
+	if (m_data) {
+#ifndef _WIN32
+		munmap(const_cast<uint8_t*>(m_data), m_size);
+#endif
+		m_data = nullptr;
+	}
+}
+
+bool MovieRMV::getState(vector<uint8_t>* state) const {
+	if (m_write) {
+		if (m_state.empty()) {
+			return false;
+		}
+		*state = m_state;
+		return true;
+	}
+	size_t keyframe;
+	return getKeyframe(0, state, &keyframe) && keyframe == 0;
+}
+
+void MovieRMV::setState(const uint8_t* state, size_t size) {
+	m_state.assign(state, state + size);
+}
+
+size_t MovieRMV::frames() const {
+	return m_write ? m_frame : m_frames;
+}
+
+bool MovieRMV::seek(size_t frame) {
+	if (m_write || !m_data || frame > m_frames) {
+		return false;
+	}
+	m_frame = frame;
+	return true;
+}
+
+bool MovieRMV::getKeyframe(size_t frame, vector<uint8_t>* state, size_t* keyframe) const {
+	if (m_write || !m_data) {
+		return false;
+	}
+	size_t i = min(frame / m_keyframeInterval + 1, m_chunks.size());
+	while (i--) {
+		const Chunk& chunk = m_chunks[i];
+		if (chunk.stateSize) {
+			const uint8_t* data = &m_data[chunk.stateOffset];
+			state->assign(data, data + chunk.stateSize);
+			*keyframe = chunk.frame;
+			return true;
+		}
+	}
+	return false;
+}
+
+bool MovieRMV::wantsKeyframe() const {
+	return m_write && m_frame && m_frame % m_keyframeInterval == 0;
+}
+
+void MovieRMV::addKeyframe(const uint8_t* state, size_t size) {
+	m_keyframe.assign(state, state + size);
+}
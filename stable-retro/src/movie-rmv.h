@@ -0,0 +1,74 @@
+#pragma once
+
+#include <fstream>
+#include <vector>
+
+#include "movie.h"
+
+namespace Retro {
+
+// Binary movie: a header, then one chunk per keyframe holding a savestate
+// followed by up to keyframeInterval frames of uint16 button masks, one per
+// player, and finally an index of the chunks. All integers are little endian
+class MovieRMV final : public Movie {
+public:
+	static constexpr unsigned DEFAULT_KEYFRAME_INTERVAL = 600;
+
+	MovieRMV(const std::string& path, bool write = false, unsigned players = 1, unsigned keyframeInterval = DEFAULT_KEYFRAME_INTERVAL);
+	~MovieRMV();
+
+	static std::unique_ptr<Movie> load(const std::string& path);
+
+	virtual std::string getGameName() const override;
+	void setGameName(const std::string& name);
+
+	virtual bool step() override;
+
+	virtual void close() override;
+
+	virtual bool getState(std::vector<uint8_t>*) const override;
+	virtual void setState(const uint8_t*, size_t) override;
+
+	virtual size_t frames() const override;
+	virtual size_t position() const override { return m_frame; }
+	virtual bool seek(size_t frame) override;
+	virtual bool getKeyframe(size_t frame, std::vector<uint8_t>* state, size_t* keyframe) const override;
+
+	virtual bool wantsKeyframe() const override;
+	virtual void addKeyframe(const uint8_t*, size_t) override;
+
+	bool ok() const { return m_ok; }
+
+private:
+	struct Chunk {
+		uint64_t frame;
+		uint64_t stateOffset;
+		uint64_t stateSize;
+		uint64_t inputOffset;
+	};
+
+	bool readHeader();
+	void writeHeader(uint64_t frames, uint64_t indexOffset);
+	void startChunk();
+
+	std::string m_gameName;
+	unsigned m_keyframeInterval;
+	bool m_write = false;
+	bool m_ok = false;
+	size_t m_frame = 0;
+	size_t m_frames = 0;
+	std::vector<Chunk> m_chunks;
+
+	std::ofstream m_out;
+	uint64_t m_offset = 0;
+	bool m_headerWritten = false;
+	std::vector<uint8_t> m_state;
+	std::vector<uint8_t> m_keyframe;
+
+	const uint8_t* m_data = nullptr;
+	size_t m_size = 0;
+#ifdef _WIN32
+	std::vector<uint8_t> m_buffer;
+#endif
+};
+}
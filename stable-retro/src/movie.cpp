@@ -2,6 +2,7 @@
 
 #include "movie-bk2.h"
 #include "movie-fm2.h"
+#include "movie-rmv.h"
 
 #include <functional>
 #include <unordered_map>
@@ -12,6 +13,7 @@ using namespace Retro;
 static unordered_map<string, function<unique_ptr<Movie>(const string&)>> s_movieTypes{
 	make_pair("bk2", MovieBK2::load),
 	make_pair("fm2", MovieFM2::load),
+	make_pair("rmv", MovieRMV::load),
 };
 
 std::unique_ptr<Movie> Movie::load(const string& path) {
@@ -22,6 +22,17 @@ public:
 	virtual bool getState(std::vector<uint8_t>*) const { return false; }
 	virtual void setState(const uint8_t*, size_t) {}
 
+	// Seeking is only supported by formats that index their frames
+	virtual size_t frames() const { return 0; }
+	virtual size_t position() const { return 0; }
+	virtual bool seek(size_t) { return false; }
+	virtual bool getKeyframe(size_t, std::vector<uint8_t>*, size_t*) const { return false; }
+
+	// Recording formats that store keyframes ask for the emulator's state
+	// before the frame that is about to be stepped
+	virtual bool wantsKeyframe() const { return false; }
+	virtual void addKeyframe(const uint8_t*, size_t) {}
+
 	bool getKey(int, unsigned player = 0);
 	void setKey(int key, bool, unsigned player = 0);
 
@@ -10,6 +10,7 @@ static inline T _hypot(T x, T y) {
 #endif
 #include <pybind11/pybind11.h>
 #include <pybind11/numpy.h>
+#include <pybind11/stl.h>
 
 #include "coreinfo.h"
 #include "data.h"
@@ -18,9 +19,12 @@ static inline T _hypot(T x, T y) {
 #include "memory.h"
 #include "search.h"
 #include "script.h"
+#include "statestore.h"
 #include "movie.h"
 #include "movie-bk2.h"
+#include "movie-rmv.h"
 
+#include <chrono>
 #include <map>
 #include <unordered_map>
 #include <unordered_set>
@@ -30,14 +34,69 @@ namespace py = pybind11;
 using std::string;
 using namespace Retro;
 
+template<typename T>
+static T* outputBuffer(py::array& arr, size_t size, const char* name) {
+	if (!py::array_t<T>::check_(arr)) {
+		throw std::runtime_error(string(name) + " has the wrong dtype");
+	}
+	if (!(arr.flags() & py::array::c_style) || !arr.writeable()) {
+		throw std::runtime_error(string(name) + " must be a writeable C-contiguous array");
+	}
+	if (static_cast<size_t>(arr.size()) != size) {
+		throw std::runtime_error(string(name) + " has the wrong size");
+	}
+	return static_cast<T*>(arr.mutable_data());
+}
+
+// Adds the time until it goes out of scope to a counter, if there is one
+class PerfTimer {
+public:
+	PerfTimer(uint64_t* counter)
+		: m_counter(counter) {
+		if (m_counter) {
+			m_start = std::chrono::steady_clock::now();
+		}
+	}
+
+	~PerfTimer() {
+		if (m_counter) {
+			*m_counter += std::chrono::duration_cast<std::chrono::nanoseconds>(std::chrono::steady_clock::now() - m_start).count();
+		}
+	}
+
+private:
+	uint64_t* m_counter;
+	std::chrono::steady_clock::time_point m_start;
+};
+
+struct PerfStats {
+	uint64_t frames = 0;
+	uint64_t run = 0;
+	uint64_t updateRam = 0;
+	uint64_t scenario = 0;
+	uint64_t screen = 0;
+	uint64_t info = 0;
+};
+
 struct PyGameData;
 struct PyRetroEmulator {
 	Retro::Emulator m_re;
 	int m_cheats = 0;
+	size_t m_obsWidth = 0;
+	size_t m_obsHeight = 0;
+	bool m_obsGray = false;
+	unsigned m_obsStack = 1;
+	std::vector<uint8_t> m_obsFrames;
+	unsigned m_obsHead = 0;
+	bool m_obsStackFilled = false;
+	std::vector<uint8_t> m_prevScreen;
+	std::vector<uint8_t> m_pooledScreen;
+	bool m_screenPooled = false;
+	std::vector<std::vector<uint8_t>> m_slots;
+	std::vector<uint8_t> m_keyframe;
+	bool m_perfEnabled = false;
+	PerfStats m_perf;
 	PyRetroEmulator(const string& rom_path) {
-		if (Emulator::isLoaded()) {
-			throw std::runtime_error("Cannot create multiple emulator instances per process, make sure to call env.close() on each environment before creating a new one");
-		}
 		if (!m_re.loadRom(rom_path.c_str())) {
 			throw std::runtime_error("Could not load ROM");
 		}
@@ -45,33 +104,261 @@ struct PyRetroEmulator {
 	}
 
 	void step() {
+		m_screenPooled = false;
+		py::gil_scoped_release release;
+		PerfTimer timer(perfCounter(&m_perf.run));
 		m_re.run();
+		m_perf.frames += m_perfEnabled;
+	}
+
+	uint64_t* perfCounter(uint64_t* counter) {
+		return m_perfEnabled ? counter : nullptr;
+	}
+
+	void setPerfEnabled(bool enabled) {
+		m_perfEnabled = enabled;
+	}
+
+	bool isPerfEnabled() const {
+		return m_perfEnabled;
+	}
+
+	py::dict getPerfStats() const {
+		py::dict stats;
+		stats["frames"] = m_perf.frames;
+		stats["run_ns"] = m_perf.run;
+		stats["update_ram_ns"] = m_perf.updateRam;
+		stats["scenario_ns"] = m_perf.scenario;
+		stats["screen_ns"] = m_perf.screen;
+		stats["info_ns"] = m_perf.info;
+		return stats;
+	}
+
+	void resetPerfStats() {
+		m_perf = PerfStats();
+	}
+
+	unsigned runFrames(PyGameData& data, unsigned frames, const uint8_t* delayedMasks, unsigned players, unsigned buttons, bool maxPool, bool render, bool renderAll, float* rewards, bool* done, Movie* movie = nullptr);
+	py::tuple stepFrames(PyGameData& data, unsigned frames, py::object delayedMasks, unsigned players, bool maxPool, bool render, bool renderAll, py::object movie);
+
+	void savePoolScreen() {
+		const uint8_t* screen = static_cast<const uint8_t*>(m_re.getImageData());
+		m_prevScreen.assign(screen, screen + m_re.getImagePitch() * m_re.getImageHeight());
+	}
+
+	void poolScreen() {
+		size_t w = m_re.getImageWidth();
+		size_t h = m_re.getImageHeight();
+		size_t pitch = m_re.getImagePitch();
+		if (m_prevScreen.size() != pitch * h) {
+			return;
+		}
+		m_pooledScreen.resize(pitch * h);
+		Image current(screenFormat(), m_re.getImageData(), w, h, pitch);
+		Image prev(screenFormat(), static_cast<const void*>(m_prevScreen.data()), w, h, pitch);
+		Image pooled(screenFormat(), static_cast<void*>(m_pooledScreen.data()), w, h, pitch);
+		current.maxTo(&prev, &pooled);
+		m_screenPooled = true;
 	}
 
 	py::bytes getState() {
 		size_t size = m_re.serializeSize();
 		py::bytes bytes(NULL, size);
-		m_re.serialize(PyBytes_AsString(bytes.ptr()), size);
+		char* data = PyBytes_AsString(bytes.ptr());
+		{
+			py::gil_scoped_release release;
+			m_re.serialize(data, size);
+		}
 		return bytes;
 	}
 
 	bool setState(py::bytes o) {
-		return m_re.unserialize(PyBytes_AsString(o.ptr()), PyBytes_Size(o.ptr()));
+		// The caller's reference keeps the bytes alive while the GIL is released
+		const char* data = PyBytes_AsString(o.ptr());
+		size_t size = PyBytes_Size(o.ptr());
+		py::gil_scoped_release release;
+		return m_re.unserialize(data, size);
 	}
 
-	py::array_t<uint8_t> getScreen() {
-		long w = m_re.getImageWidth();
-		long h = m_re.getImageHeight();
-		py::array_t<uint8_t> arr({ { h, w, 3 } });
-		uint8_t* data = arr.mutable_data();
+	bool saveSlot(size_t slot) {
+		py::gil_scoped_release release;
+		if (slot >= m_slots.size()) {
+			m_slots.resize(slot + 1);
+		}
+		// Buffers are kept between saves, so only the first save of a slot allocates
+		std::vector<uint8_t>& buffer = m_slots[slot];
+		buffer.resize(m_re.serializeSize());
+		return m_re.serialize(buffer.data(), buffer.size());
+	}
+
+	bool loadSlot(size_t slot) {
+		if (slot >= m_slots.size() || m_slots[slot].empty()) {
+			throw std::runtime_error("slot " + std::to_string(slot) + " is empty");
+		}
+		py::gil_scoped_release release;
+		return m_re.unserialize(m_slots[slot].data(), m_slots[slot].size());
+	}
+
+	void clearSlots() {
+		m_slots.clear();
+		m_slots.shrink_to_fit();
+	}
+
+	py::array getScreen(py::object out, py::object crop) {
+		size_t x, y, w, h;
+		parseCrop(crop, &x, &y, &w, &h);
+		py::array arr = outputArray(out, h, w, 3);
+		uint8_t* data = outputBuffer<uint8_t>(arr, h * w * 3, "out");
+		{
+			py::gil_scoped_release release;
+			PerfTimer timer(perfCounter(&m_perf.screen));
+			screenTo(data, x, y, w, h);
+		}
+		return arr;
+	}
+
+	void configureObservation(size_t width, size_t height, bool grayscale, unsigned stack) {
+		if (!stack) {
+			throw std::runtime_error("stack must be at least 1");
+		}
+		m_obsWidth = width;
+		m_obsHeight = height;
+		m_obsGray = grayscale;
+		m_obsStack = stack;
+		m_obsFrames.clear();
+	}
+
+	py::array getObservation(py::object out, py::object crop) {
+		size_t x, y, w, h;
+		parseCrop(crop, &x, &y, &w, &h);
+		size_t outW, outH, channels;
+		observationShape(w, h, &outW, &outH, &channels);
+		py::array arr = outputArray(out, outH, outW, channels);
+		uint8_t* data = outputBuffer<uint8_t>(arr, outH * outW * channels, "out");
+		{
+			py::gil_scoped_release release;
+			observeTo(data, x, y, w, h);
+		}
+		return arr;
+	}
+
+	void resetObservation() {
+		m_obsStackFilled = false;
+	}
+
+	void observationShape(size_t w, size_t h, size_t* outW, size_t* outH, size_t* channels) const {
+		*outW = m_obsWidth ? m_obsWidth : w;
+		*outH = m_obsHeight ? m_obsHeight : h;
+		*channels = (m_obsGray ? 1 : 3) * m_obsStack;
+	}
+
+	void observeTo(uint8_t* data, size_t x, size_t y, size_t w, size_t h) {
+		PerfTimer timer(perfCounter(&m_perf.screen));
+		if (!m_obsWidth && !m_obsHeight && !m_obsGray && m_obsStack == 1) {
+			screenTo(data, x, y, w, h);
+			return;
+		}
+		size_t outW, outH, channels;
+		observationShape(w, h, &outW, &outH, &channels);
+		size_t depth = m_obsGray ? 1 : 3;
+		size_t frameSize = outW * outH * depth;
+
+		uint8_t* frame = data;
+		if (m_obsStack > 1) {
+			if (m_obsFrames.size() != frameSize * m_obsStack) {
+				m_obsFrames.resize(frameSize * m_obsStack);
+				m_obsStackFilled = false;
+			}
+			m_obsHead = (m_obsHead + 1) % m_obsStack;
+			frame = &m_obsFrames[m_obsHead * frameSize];
+		}
+
+		Image out(m_obsGray ? Image::Format::G8 : Image::Format::RGB888, frame, outW, outH, outW * depth);
+		Image in = screenImage(x, y, w, h);
+		if (outW == w && outH == h && !m_obsGray) {
+			in.copyTo(&out);
+		} else {
+			in.scaleTo(&out);
+		}
+
+		if (m_obsStack > 1) {
+			if (!m_obsStackFilled) {
+				for (unsigned i = 0; i < m_obsStack; ++i) {
+					if (i != m_obsHead) {
+						memcpy(&m_obsFrames[i * frameSize], frame, frameSize);
+					}
+				}
+				m_obsStackFilled = true;
+			}
+			// Interleave the ring, oldest frame first, along the channel axis
+			for (unsigned i = 0; i < m_obsStack; ++i) {
+				const uint8_t* stacked = &m_obsFrames[((m_obsHead + 1 + i) % m_obsStack) * frameSize];
+				uint8_t* dest = &data[i * depth];
+				for (size_t p = 0; p < outW * outH; ++p) {
+					memcpy(&dest[p * channels], &stacked[p * depth], depth);
+				}
+			}
+		}
+	}
+
+	void screenTo(uint8_t* data, size_t x, size_t y, size_t w, size_t h) {
 		Image out(Image::Format::RGB888, data, w, h, w);
-		Image in;
+		Image in = screenImage(x, y, w, h);
+		in.copyTo(&out);
+	}
+
+	Image screenImage(size_t x, size_t y, size_t w, size_t h) {
+		const uint8_t* screen = m_screenPooled ? m_pooledScreen.data() : static_cast<const uint8_t*>(m_re.getImageData());
+		screen += y * m_re.getImagePitch() + x * m_re.getImageDepth() / 8;
+		return Image(screenFormat(), static_cast<const void*>(screen), w, h, m_re.getImagePitch());
+	}
+
+	Image::Format screenFormat() {
 		if (m_re.getImageDepth() == 16) {
-			in = Image(Image::Format::RGB565, m_re.getImageData(), w, h, m_re.getImagePitch());
+			return Image::Format::RGB565;
 		} else if (m_re.getImageDepth() == 32) {
-			in = Image(Image::Format::RGBX888, m_re.getImageData(), w, h, m_re.getImagePitch());
+			return Image::Format::RGBX888;
+		}
+		throw std::runtime_error("unsupported screen depth");
+	}
+
+	void parseCrop(py::object crop, size_t* x, size_t* y, size_t* w, size_t* h) {
+		*x = 0;
+		*y = 0;
+		*w = 0;
+		*h = 0;
+		if (!crop.is_none()) {
+			py::tuple rect = crop;
+			if (rect.size() != 4) {
+				throw std::runtime_error("crop must be (x, y, width, height)");
+			}
+			*x = rect[0].cast<size_t>();
+			*y = rect[1].cast<size_t>();
+			*w = rect[2].cast<size_t>();
+			*h = rect[3].cast<size_t>();
+		}
+		clampCrop(x, y, w, h);
+	}
+
+	void clampCrop(size_t* x, size_t* y, size_t* w, size_t* h) {
+		size_t width = m_re.getImageWidth();
+		size_t height = m_re.getImageHeight();
+		size_t right = !*w || *x + *w > width ? width : *x + *w;
+		size_t bottom = !*h || *y + *h > height ? height : *y + *h;
+		*x = std::min(*x, right);
+		*y = std::min(*y, bottom);
+		*w = right - *x;
+		*h = bottom - *y;
+	}
+
+	static py::array outputArray(py::object out, size_t h, size_t w, size_t channels) {
+		if (out.is_none()) {
+			return py::array_t<uint8_t>({ h, w, channels });
+		}
+		py::array arr = out;
+		if (arr.ndim() != 3 || arr.shape(0) != h || arr.shape(1) != w || arr.shape(2) != channels) {
+			throw std::runtime_error("out must have shape (" + std::to_string(h) + ", " + std::to_string(w) + ", " + std::to_string(channels) + ")");
 		}
-		in.copyTo(&out);
 		return arr;
 	}
 
@@ -80,12 +367,63 @@ struct PyRetroEmulator {
 	}
 
 	py::array_t<int16_t> getAudio() {
-		py::array_t<int16_t> arr(py::array::ShapeContainer{ m_re.getAudioSamples(), 2 });
+		size_t capacity = m_re.getAudioRingCapacity();
+		if (!capacity) {
+			py::array_t<int16_t> arr(py::array::ShapeContainer{ m_re.getAudioSamples(), 2 });
+			int16_t* data = arr.mutable_data();
+			{
+				py::gil_scoped_release release;
+				memcpy(data, m_re.getAudioData(), m_re.getAudioSamples() * 4);
+			}
+			return arr;
+		}
+		// Samples produced by the last run, oldest first
+		size_t samples = std::min<uint64_t>(m_re.getAudioRingWritten() - m_re.getAudioRingRunStart(), capacity);
+		py::array_t<int16_t> arr(py::array::ShapeContainer{ static_cast<py::ssize_t>(samples), py::ssize_t(2) });
 		int16_t* data = arr.mutable_data();
-		memcpy(data, m_re.getAudioData(), m_re.getAudioSamples() * 4);
+		size_t head = (m_re.getAudioRingWritten() - samples) % capacity;
+		size_t first = std::min(samples, capacity - head);
+		{
+			py::gil_scoped_release release;
+			memcpy(data, &m_re.getAudioRingData()[head * 2], first * 4);
+			memcpy(&data[first * 2], m_re.getAudioRingData(), (samples - first) * 4);
+		}
 		return arr;
 	}
 
+	void setAudioEnabled(bool enabled) {
+		m_re.setAudioEnabled(enabled);
+	}
+
+	bool isAudioEnabled() {
+		return m_re.isAudioEnabled();
+	}
+
+	void configureAudioRing(size_t frames) {
+		m_re.setAudioRing(frames);
+	}
+
+	uint64_t getAudioRingWritten() {
+		return m_re.getAudioRingWritten();
+	}
+
+	static py::object audioRing(py::object self) {
+		PyRetroEmulator& emu = self.cast<PyRetroEmulator&>();
+		auto ring = emu.m_re.getAudioRing();
+		if (!ring) {
+			return py::none();
+		}
+		// Read-only view that owns a reference to the ring, so it stays valid
+		// after the ring is reconfigured or the emulator is gone
+		auto* owner = new std::shared_ptr<const std::vector<int16_t>>(ring);
+		py::capsule base(owner, [](void* ptr) {
+			delete static_cast<std::shared_ptr<const std::vector<int16_t>>*>(ptr);
+		});
+		py::array_t<int16_t> arr({ ring->size() / 2, size_t(2) }, ring->data(), base);
+		arr.attr("setflags")(py::arg("write") = false);
+		return std::move(arr);
+	}
+
 	double getAudioRate() {
 		return m_re.getAudioRate();
 	}
@@ -106,6 +444,22 @@ struct PyRetroEmulator {
 		}
 	}
 
+	void setActionIndex(py::array_t<uint8_t, py::array::c_style | py::array::forcecast> table, size_t index, unsigned player) {
+		if (table.ndim() != 2 || table.shape(1) > N_BUTTONS) {
+			throw std::runtime_error("table must have shape (actions, buttons <= N_BUTTONS)");
+		}
+		if (index >= static_cast<size_t>(table.shape(0))) {
+			throw std::runtime_error("index >= number of actions");
+		}
+		if (player >= MAX_PLAYERS) {
+			throw std::runtime_error("player >= MAX_PLAYERS");
+		}
+		const uint8_t* row = table.data(index);
+		for (int key = 0; key < table.shape(1); ++key) {
+			m_re.setKey(player, key, row[key]);
+		}
+	}
+
 	void addCheat(const string& code) {
 		m_re.setCheat(m_cheats, true, code.c_str());
 		++m_cheats;
@@ -219,6 +573,7 @@ struct PySearch {
 struct PyGameData {
 	Retro::GameData m_data;
 	Retro::Scenario m_scen{ m_data };
+	std::vector<string> m_infoKeys;
 
 	bool load(py::handle data = py::none(), py::handle scen = py::none()) {
 		ScriptContext::reset();
@@ -270,6 +625,9 @@ struct PyGameData {
 		m_scen.update();
 	}
 
+	void setVariableSnapshots(bool enabled) { m_data.setVariableSnapshots(enabled); }
+	bool variableSnapshots() const { return m_data.variableSnapshots(); }
+
 	py::object lookupValue(py::str name) const {
 		try {
 			Variant data = m_data.lookupValue(name);
@@ -304,6 +662,27 @@ struct PyGameData {
 		return value;
 	}
 
+	void lookupInto(const std::vector<string>& keys, int64_t* out) const {
+		for (size_t k = 0; k < keys.size(); ++k) {
+			out[k] = static_cast<int64_t>(m_data.lookupValue(keys[k]));
+		}
+	}
+
+	void setInfoKeys(const std::vector<string>& keys) {
+		for (const auto& key : keys) {
+			try {
+				m_data.lookupValue(key);
+			} catch (std::invalid_argument e) {
+				throw pybind11::key_error(e.what());
+			}
+		}
+		m_infoKeys = keys;
+	}
+
+	void lookupInfo(py::array out) const {
+		lookupInto(m_infoKeys, outputBuffer<int64_t>(out, m_infoKeys.size(), "out"));
+	}
+
 	py::dict lookupAll() const {
 		py::dict data;
 		for (const auto& var : m_data.lookupAll()) {
@@ -394,12 +773,145 @@ void PyRetroEmulator::configureData(PyGameData& data) {
 	m_re.configureData(&data.m_data);
 }
 
+struct PyRetroVecEmulator {
+	std::vector<PyRetroEmulator*> m_emus;
+	std::vector<PyGameData*> m_data;
+	std::vector<string> m_infoKeys;
+	py::list m_refs;
+	unsigned m_players;
+	unsigned m_buttons;
+	bool m_filter;
+
+	PyRetroVecEmulator(py::sequence emulators, py::sequence data, unsigned players, unsigned buttons, bool filter, std::vector<string> infoKeys)
+		: m_infoKeys(infoKeys)
+		, m_players(players)
+		, m_buttons(buttons)
+		, m_filter(filter) {
+		if (emulators.size() != data.size()) {
+			throw std::runtime_error("emulators and data must have the same length");
+		}
+		if (players > MAX_PLAYERS) {
+			throw std::runtime_error("players > MAX_PLAYERS");
+		}
+		if (buttons > N_BUTTONS) {
+			throw std::runtime_error("buttons > N_BUTTONS");
+		}
+		for (size_t i = 0; i < emulators.size(); ++i) {
+			m_emus.emplace_back(emulators[i].cast<PyRetroEmulator*>());
+			m_data.emplace_back(data[i].cast<PyGameData*>());
+			if (emulators.size() > 1 && !m_data.back()->m_scen.scripts().empty()) {
+				// Script contexts are shared by the whole process
+				throw std::runtime_error("Scenarios using scripts cannot be vectorized");
+			}
+			m_refs.append(emulators[i]);
+			m_refs.append(data[i]);
+		}
+	}
+
+	size_t size() const {
+		return m_emus.size();
+	}
+
+	void step(py::array masks, py::array obs, py::array rewards, py::array dones, py::array info, unsigned frames, bool maxPool, py::object sticky, bool renderAll) {
+		size_t n = m_emus.size();
+		const uint8_t* mask = static_cast<const uint8_t*>(masks.data());
+		if (!py::array_t<uint8_t>::check_(masks) || !(masks.flags() & py::array::c_style)) {
+			throw std::runtime_error("masks must be a C-contiguous uint8 array");
+		}
+		if (static_cast<size_t>(masks.size()) != n * m_players * m_buttons) {
+			throw std::runtime_error("masks has the wrong size");
+		}
+		uint8_t* obsData = outputBuffer<uint8_t>(obs, obs.size(), "obs");
+		float* rewardData = outputBuffer<float>(rewards, n, "rewards");
+		bool* doneData = outputBuffer<bool>(dones, n, "dones");
+		int64_t* infoData = outputBuffer<int64_t>(info, n * m_infoKeys.size(), "info");
+		if (n && obs.size() % n) {
+			throw std::runtime_error("obs has the wrong size");
+		}
+		size_t obsSize = n ? obs.size() / n : 0;
+		bool ram = obs.ndim() == 2;
+		py::array_t<bool, py::array::c_style | py::array::forcecast> stickyArr;
+		const bool* stickyData = nullptr;
+		if (!sticky.is_none()) {
+			stickyArr = sticky;
+			if (static_cast<size_t>(stickyArr.size()) != n) {
+				throw std::runtime_error("sticky has the wrong size");
+			}
+			stickyData = stickyArr.data();
+		}
+
+		py::gil_scoped_release release;
+		for (size_t i = 0; i < n; ++i) {
+			Emulator& re = m_emus[i]->m_re;
+			PyGameData* data = m_data[i];
+			bool delay = stickyData && stickyData[i];
+			uint8_t actionMask[MAX_PLAYERS * N_BUTTONS];
+			for (unsigned p = 0; p < m_players; ++p) {
+				const uint8_t* pmask = &mask[(i * m_players + p) * m_buttons];
+				unsigned action = 0;
+				for (unsigned key = 0; key < m_buttons; ++key) {
+					action |= (pmask[key] ? 1 : 0) << key;
+				}
+				if (m_filter) {
+					action = data->m_scen.filterAction(action);
+				}
+				for (unsigned key = 0; key < m_buttons; ++key) {
+					actionMask[p * m_buttons + key] = (action >> key) & 1;
+					if (!delay) {
+						re.setKey(p, key, (action >> key) & 1);
+					}
+				}
+			}
+			float playerRewards[MAX_PLAYERS];
+			m_emus[i]->runFrames(*data, frames, delay ? actionMask : nullptr, m_players, m_buttons, maxPool, !ram, renderAll, playerRewards, &doneData[i]);
+
+			if (ram) {
+				observeRam(i, &obsData[i * obsSize], obsSize);
+			} else {
+				observeScreen(i, &obsData[i * obsSize], obsSize);
+			}
+			rewardData[i] = playerRewards[0];
+			PerfTimer timer(m_emus[i]->perfCounter(&m_emus[i]->m_perf.info));
+			data->lookupInto(m_infoKeys, &infoData[i * m_infoKeys.size()]);
+		}
+	}
+
+	void observeScreen(size_t i, uint8_t* out, size_t size) {
+		size_t x, y, w, h;
+		m_data[i]->m_scen.getCrop(&x, &y, &w, &h);
+		m_emus[i]->clampCrop(&x, &y, &w, &h);
+		size_t outW, outH, channels;
+		m_emus[i]->observationShape(w, h, &outW, &outH, &channels);
+		if (outW * outH * channels != size) {
+			throw std::runtime_error("screen size does not match obs");
+		}
+		m_emus[i]->observeTo(out, x, y, w, h);
+	}
+
+	void observeRam(size_t i, uint8_t* out, size_t size) {
+		for (const auto& block : m_data[i]->m_data.addressSpace().blocks()) {
+			if (block.second.size() > size) {
+				throw std::runtime_error("RAM size does not match obs");
+			}
+			memcpy(out, block.second.offset(0), block.second.size());
+			out += block.second.size();
+			size -= block.second.size();
+		}
+	}
+};
+
 struct PyMovie {
 	std::unique_ptr<Retro::Movie> m_movie;
 	bool recording = false;
-	PyMovie(py::str name, bool record, unsigned players) {
+	PyMovie(py::str name, bool record, unsigned players, unsigned keyframeInterval) {
 		recording = record;
-		if (record) {
+		std::string path = name;
+		if (record && path.size() > 4 && path.substr(path.size() - 4) == ".rmv") {
+			m_movie = std::make_unique<MovieRMV>(path, true, players, keyframeInterval);
+			if (!static_cast<MovieRMV*>(m_movie.get())->ok()) {
+				m_movie.reset();
+			}
+		} else if (record) {
 			m_movie = std::make_unique<MovieBK2>(name, true, players);
 		} else {
 			m_movie = Movie::load(name);
@@ -410,9 +922,14 @@ struct PyMovie {
 	}
 
 	void configure(py::str name, const PyRetroEmulator& emu) {
-		if (recording) {
-			static_cast<MovieBK2*>(m_movie.get())->setGameName(name);
-			static_cast<MovieBK2*>(m_movie.get())->loadKeymap(emu.m_re.core());
+		if (!recording) {
+			return;
+		}
+		if (MovieBK2* bk2 = dynamic_cast<MovieBK2*>(m_movie.get())) {
+			bk2->setGameName(name);
+			bk2->loadKeymap(emu.m_re.core());
+		} else if (MovieRMV* rmv = dynamic_cast<MovieRMV*>(m_movie.get())) {
+			rmv->setGameName(name);
 		}
 	}
 
@@ -432,6 +949,38 @@ struct PyMovie {
 		return m_movie->players();
 	}
 
+	size_t frames() const {
+		return m_movie->frames();
+	}
+
+	size_t position() const {
+		return m_movie->position();
+	}
+
+	void seek(size_t frame, PyRetroEmulator& emu) {
+		std::vector<uint8_t> state;
+		size_t keyframe;
+		if (recording || !m_movie->getKeyframe(frame, &state, &keyframe)) {
+			throw std::runtime_error("Movie has no keyframe to seek from");
+		}
+		if (!m_movie->seek(frame)) {
+			throw std::runtime_error("Frame is past the end of the movie");
+		}
+		py::gil_scoped_release release;
+		// Replay from the nearest keyframe with the recorded buttons
+		emu.m_re.unserialize(state.data(), state.size());
+		m_movie->seek(keyframe);
+		for (size_t i = keyframe; i < frame; ++i) {
+			m_movie->step();
+			for (unsigned p = 0; p < m_movie->players(); ++p) {
+				for (int key = 0; key < N_BUTTONS; ++key) {
+					emu.m_re.setKey(p, key, m_movie->getKey(key, p));
+				}
+			}
+			emu.m_re.run();
+		}
+	}
+
 	bool getKey(int key, unsigned player = 0) {
 		return m_movie->getKey(key, player);
 	}
@@ -451,6 +1000,161 @@ struct PyMovie {
 	}
 };
 
+struct PyStateStore {
+	Retro::StateStore m_store;
+	std::vector<uint8_t> m_buffer;
+
+	PyStateStore(size_t budget)
+		: m_store(budget) {
+	}
+
+	void put(int64_t id, py::bytes state) {
+		m_store.put(id, reinterpret_cast<const uint8_t*>(PyBytes_AsString(state.ptr())), PyBytes_Size(state.ptr()));
+	}
+
+	void save(int64_t id, PyRetroEmulator& emu) {
+		m_buffer.resize(emu.m_re.serializeSize());
+		if (!emu.m_re.serialize(m_buffer.data(), m_buffer.size())) {
+			throw std::runtime_error("Could not serialize state");
+		}
+		m_store.put(id, m_buffer.data(), m_buffer.size());
+	}
+
+	py::bytes get(int64_t id) {
+		if (!m_store.get(id, &m_buffer)) {
+			throw py::key_error(std::to_string(id));
+		}
+		return py::bytes(reinterpret_cast<const char*>(m_buffer.data()), m_buffer.size());
+	}
+
+	bool restore(int64_t id, PyRetroEmulator& emu) {
+		if (!m_store.get(id, &m_buffer)) {
+			throw py::key_error(std::to_string(id));
+		}
+		return emu.m_re.unserialize(m_buffer.data(), m_buffer.size());
+	}
+
+	bool discard(int64_t id) {
+		return m_store.discard(id);
+	}
+
+	void clear() {
+		m_store.clear();
+	}
+
+	size_t budget() const {
+		return m_store.budget();
+	}
+
+	void setBudget(size_t budget) {
+		m_store.setBudget(budget);
+	}
+
+	size_t bytes() const {
+		return m_store.bytes();
+	}
+
+	size_t evictions() const {
+		return m_store.evictions();
+	}
+
+	bool contains(int64_t id) const {
+		return m_store.contains(id);
+	}
+
+	size_t size() const {
+		return m_store.size();
+	}
+};
+
+unsigned PyRetroEmulator::runFrames(PyGameData& data, unsigned frames, const uint8_t* delayedMasks, unsigned players, unsigned buttons, bool maxPool, bool render, bool renderAll, float* rewards, bool* done, Movie* movie) {
+	m_screenPooled = false;
+	for (unsigned p = 0; p < players; ++p) {
+		rewards[p] = 0;
+	}
+	*done = false;
+	unsigned frame;
+	for (frame = 0; frame < frames && !*done; ++frame) {
+		if (frame == 1 && delayedMasks) {
+			// Sticky actions: the previous buttons stay held for the first frame
+			for (unsigned p = 0; p < players; ++p) {
+				for (unsigned key = 0; key < buttons; ++key) {
+					m_re.setKey(p, key, delayedMasks[p * buttons + key]);
+				}
+			}
+		}
+		if (maxPool && frame > 0 && frame + 1 == frames) {
+			savePoolScreen();
+		}
+		if (movie) {
+			for (unsigned p = 0; p < players; ++p) {
+				for (int key = 0; key < N_BUTTONS; ++key) {
+					movie->setKey(key, m_re.getKey(p, key), p);
+				}
+			}
+			if (movie->wantsKeyframe()) {
+				m_keyframe.resize(m_re.serializeSize());
+				m_re.serialize(m_keyframe.data(), m_keyframe.size());
+				movie->addKeyframe(m_keyframe.data(), m_keyframe.size());
+			}
+			movie->step();
+		}
+		// Only the frames that end up in the observation need to be rendered,
+		// unless the caller wants the exact frame an episode ends on
+		m_re.setVideoEnabled(render && (renderAll || frame + (maxPool ? 2 : 1) >= frames));
+		{
+			PerfTimer timer(perfCounter(&m_perf.run));
+			m_re.run();
+		}
+		{
+			PerfTimer timer(perfCounter(&m_perf.updateRam));
+			data.m_data.updateRam();
+		}
+		{
+			PerfTimer timer(perfCounter(&m_perf.scenario));
+			data.m_scen.update();
+		}
+		m_perf.frames += m_perfEnabled;
+		for (unsigned p = 0; p < players; ++p) {
+			rewards[p] += data.m_scen.currentReward(p);
+		}
+		*done = data.m_scen.isDone();
+	}
+	m_re.setVideoEnabled(true);
+	if (maxPool && render && frames > 1 && frame == frames) {
+		poolScreen();
+	}
+	return frame;
+}
+
+py::tuple PyRetroEmulator::stepFrames(PyGameData& data, unsigned frames, py::object delayedMasks, unsigned players, bool maxPool, bool render, bool renderAll, py::object movie) {
+	if (players > MAX_PLAYERS) {
+		throw std::runtime_error("players > MAX_PLAYERS");
+	}
+	py::array_t<uint8_t, py::array::c_style | py::array::forcecast> delayed;
+	unsigned buttons = 0;
+	if (!delayedMasks.is_none()) {
+		delayed = delayedMasks;
+		if (!players || delayed.size() % players || delayed.size() / players > N_BUTTONS) {
+			throw std::runtime_error("delayed masks have the wrong size");
+		}
+		buttons = delayed.size() / players;
+	}
+	Movie* recording = movie.is_none() ? nullptr : movie.cast<PyMovie&>().m_movie.get();
+	float rewards[MAX_PLAYERS];
+	bool done;
+	unsigned ran;
+	{
+		py::gil_scoped_release release;
+		ran = runFrames(data, frames, buttons ? delayed.data() : nullptr, players, buttons, maxPool, render, renderAll, rewards, &done, recording);
+	}
+	py::list rewardList;
+	for (unsigned p = 0; p < players; ++p) {
+		rewardList.append(rewards[p]);
+	}
+	return py::make_tuple(rewardList, done, ran);
+}
+
 py::str corePath(py::handle hint = py::none()) {
 	return Retro::corePath(py::str(hint));
 }
@@ -466,11 +1170,28 @@ PYBIND11_MODULE(_retro, m) {
 		.def(py::init<const string&>())
 		.def("step", &PyRetroEmulator::step)
 		.def("set_button_mask", &PyRetroEmulator::setButtonMask, py::arg("mask"), py::arg("player") = 0)
+		.def("set_action_index", &PyRetroEmulator::setActionIndex, py::arg("table"), py::arg("index"), py::arg("player") = 0)
 		.def("get_state", &PyRetroEmulator::getState)
 		.def("set_state", &PyRetroEmulator::setState)
-		.def("get_screen", &PyRetroEmulator::getScreen)
+		.def("save_slot", &PyRetroEmulator::saveSlot, py::arg("slot"))
+		.def("load_slot", &PyRetroEmulator::loadSlot, py::arg("slot"))
+		.def("clear_slots", &PyRetroEmulator::clearSlots)
+		.def("step_frames", &PyRetroEmulator::stepFrames, py::arg("data"), py::arg("frames") = 1, py::arg("delayed_masks") = py::none(), py::arg("players") = 1, py::arg("max_pool") = false, py::arg("render") = true, py::arg("render_all") = false, py::arg("movie") = py::none())
+		.def("get_screen", &PyRetroEmulator::getScreen, py::arg("out") = py::none(), py::arg("crop") = py::none())
+		.def("configure_observation", &PyRetroEmulator::configureObservation, py::arg("width") = 0, py::arg("height") = 0, py::arg("grayscale") = false, py::arg("stack") = 1)
+		.def("get_observation", &PyRetroEmulator::getObservation, py::arg("out") = py::none(), py::arg("crop") = py::none())
+		.def("reset_observation", &PyRetroEmulator::resetObservation)
 		.def("get_screen_rate", &PyRetroEmulator::getScreenRate)
 		.def("get_audio", &PyRetroEmulator::getAudio)
+		.def("set_audio_enabled", &PyRetroEmulator::setAudioEnabled, py::arg("enabled"))
+		.def("is_audio_enabled", &PyRetroEmulator::isAudioEnabled)
+		.def("set_perf_enabled", &PyRetroEmulator::setPerfEnabled, py::arg("enabled"))
+		.def("is_perf_enabled", &PyRetroEmulator::isPerfEnabled)
+		.def("get_perf_stats", &PyRetroEmulator::getPerfStats)
+		.def("reset_perf_stats", &PyRetroEmulator::resetPerfStats)
+		.def("configure_audio_ring", &PyRetroEmulator::configureAudioRing, py::arg("frames"))
+		.def("get_audio_ring", &PyRetroEmulator::audioRing)
+		.def("get_audio_ring_written", &PyRetroEmulator::getAudioRingWritten)
 		.def("get_audio_rate", &PyRetroEmulator::getAudioRate)
 		.def("get_resolution", &PyRetroEmulator::getResolution)
 		.def("configure_data", &PyRetroEmulator::configureData)
@@ -478,6 +1199,11 @@ PYBIND11_MODULE(_retro, m) {
 		.def("clear_cheats", &PyRetroEmulator::clearCheats)
 		.def_static("load_core_info", &PyRetroEmulator::loadCoreInfo);
 
+	py::class_<PyRetroVecEmulator>(m, "RetroVecEmulator")
+		.def(py::init<py::sequence, py::sequence, unsigned, unsigned, bool, std::vector<string>>(), py::arg("emulators"), py::arg("data"), py::arg("players") = 1, py::arg("buttons") = N_BUTTONS, py::arg("filter") = false, py::arg("info_keys") = std::vector<string>())
+		.def("step", &PyRetroVecEmulator::step, py::arg("masks"), py::arg("obs"), py::arg("rewards"), py::arg("dones"), py::arg("info"), py::arg("frames") = 1, py::arg("max_pool") = false, py::arg("sticky") = py::none(), py::arg("render_all") = false)
+		.def("__len__", &PyRetroVecEmulator::size);
+
 	py::class_<PyMemoryView>(m, "Memory")
 		.def(py::init<Retro::AddressSpace&>())
 		.def("extract", &PyMemoryView::extract, py::arg("address"), py::arg("type"))
@@ -501,9 +1227,13 @@ PYBIND11_MODULE(_retro, m) {
 		.def("filter_action", &PyGameData::filterAction)
 		.def("valid_actions", &PyGameData::validActions)
 		.def("update_ram", &PyGameData::updateRam)
+		.def("set_variable_snapshots", &PyGameData::setVariableSnapshots, py::arg("enabled"))
+		.def("variable_snapshots", &PyGameData::variableSnapshots)
 		.def("lookup_value", &PyGameData::lookupValue)
 		.def("set_value", &PyGameData::setValue)
 		.def("lookup_all", &PyGameData::lookupAll)
+		.def("set_info_keys", &PyGameData::setInfoKeys, py::arg("keys"))
+		.def("lookup_info", &PyGameData::lookupInfo, py::arg("out"))
 		.def("get_variable", &PyGameData::getVariable)
 		.def("set_variable", &PyGameData::setVariable)
 		.def("remove_variable", &PyGameData::removeVariable)
@@ -520,17 +1250,34 @@ PYBIND11_MODULE(_retro, m) {
 		.def_property_readonly("memory", &PyGameData::memory);
 
 	py::class_<PyMovie>(m, "Movie")
-		.def(py::init<py::str, bool, unsigned>(), py::arg("path"), py::arg("record") = false, py::arg("players") = 1)
+		.def(py::init<py::str, bool, unsigned, unsigned>(), py::arg("path"), py::arg("record") = false, py::arg("players") = 1, py::arg("keyframe_interval") = MovieRMV::DEFAULT_KEYFRAME_INTERVAL)
 		.def("configure", &PyMovie::configure)
 		.def("get_game", &PyMovie::getGameName)
 		.def("step", &PyMovie::step)
 		.def("close", &PyMovie::close)
 		.def_property_readonly("players", &PyMovie::players)
+		.def_property_readonly("frames", &PyMovie::frames)
+		.def_property_readonly("position", &PyMovie::position)
+		.def("seek", &PyMovie::seek, py::arg("frame"), py::arg("emulator"))
 		.def("get_key", &PyMovie::getKey)
 		.def("set_key", &PyMovie::setKey)
 		.def("get_state", &PyMovie::getState)
 		.def("set_state", &PyMovie::setState);
 
+	py::class_<PyStateStore>(m, "StateStore")
+		.def(py::init<size_t>(), py::arg("budget") = 0)
+		.def("put", &PyStateStore::put, py::arg("id"), py::arg("state"))
+		.def("save", &PyStateStore::save, py::arg("id"), py::arg("emulator"))
+		.def("get", &PyStateStore::get, py::arg("id"))
+		.def("restore", &PyStateStore::restore, py::arg("id"), py::arg("emulator"))
+		.def("discard", &PyStateStore::discard, py::arg("id"))
+		.def("clear", &PyStateStore::clear)
+		.def_property("budget", &PyStateStore::budget, &PyStateStore::setBudget)
+		.def_property_readonly("nbytes", &PyStateStore::bytes)
+		.def_property_readonly("evictions", &PyStateStore::evictions)
+		.def("__contains__", &PyStateStore::contains)
+		.def("__len__", &PyStateStore::size);
+
 	m.def("core_path", &::corePath, py::arg("hint") = py::none());
 	m.def("data_path", &::dataPath, py::arg("hint") = py::none());
 }
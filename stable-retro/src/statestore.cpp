@@ -0,0 +1,156 @@
+#include "statestore.h"
+
+#include <cstring>
+
+using namespace Retro;
+using namespace std;
+
+// Equal runs shorter than this are copied along with the surrounding changes,
+// since a new record would cost about as much as the bytes it skips
+static const size_t MIN_SKIP = 8;
+
+static void putVarint(vector<uint8_t>* out, size_t value) {
+	while (value >= 0x80) {
+		out->push_back(static_cast<uint8_t>(value) | 0x80);
+		value >>= 7;
+	}
+	out->push_back(static_cast<uint8_t>(value));
+}
+
+static size_t getVarint(const uint8_t** in) {
+	size_t value = 0;
+	unsigned shift = 0;
+	while (**in & 0x80) {
+		value |= static_cast<size_t>(**in & 0x7F) << shift;
+		shift += 7;
+		++*in;
+	}
+	value |= static_cast<size_t>(**in) << shift;
+	++*in;
+	return value;
+}
+
+StateStore::StateStore(size_t budget)
+	: m_budget(budget) {
+}
+
+void StateStore::encode(const uint8_t* data, size_t size, const Keyframe& keyframe, vector<uint8_t>* delta) const {
+	const uint8_t* base = keyframe.data.data();
+	size_t pos = 0;
+	size_t last = 0;
+	while (pos < size) {
+		if (pos + 8 <= size && !memcmp(&data[pos], &base[pos], 8)) {
+			pos += 8;
+			continue;
+		}
+		if (data[pos] == base[pos]) {
+			++pos;
+			continue;
+		}
+		size_t start = pos;
+		size_t equal = 0;
+		for (; pos < size && equal < MIN_SKIP; ++pos) {
+			equal = data[pos] == base[pos] ? equal + 1 : 0;
+		}
+		size_t end = pos - equal;
+		putVarint(delta, start - last);
+		putVarint(delta, end - start);
+		delta->insert(delta->end(), &data[start], &data[end]);
+		last = end;
+	}
+}
+
+void StateStore::put(int64_t id, const uint8_t* data, size_t size) {
+	discard(id);
+
+	Entry entry;
+	if (m_keyframe && m_keyframe->data.size() == size) {
+		encode(data, size, *m_keyframe, &entry.delta);
+	}
+	if (!m_keyframe || m_keyframe->data.size() != size || entry.delta.size() > size / 4) {
+		// Too far from the current keyframe; this state becomes the new one
+		if (m_keyframe && !m_keyframe->users) {
+			m_bytes -= m_keyframe->data.size();
+		}
+		m_keyframe = make_shared<Keyframe>();
+		m_keyframe->data.assign(data, data + size);
+		m_bytes += size;
+		entry.delta.clear();
+	}
+	entry.delta.shrink_to_fit();
+	entry.keyframe = m_keyframe;
+	++m_keyframe->users;
+	m_bytes += entry.delta.size() + sizeof(Entry);
+
+	m_lru.push_front(id);
+	entry.lru = m_lru.begin();
+	m_entries.emplace(id, move(entry));
+	evict(id);
+}
+
+bool StateStore::get(int64_t id, vector<uint8_t>* out) {
+	auto iter = m_entries.find(id);
+	if (iter == m_entries.end()) {
+		return false;
+	}
+	Entry& entry = iter->second;
+	m_lru.splice(m_lru.begin(), m_lru, entry.lru);
+
+	out->assign(entry.keyframe->data.begin(), entry.keyframe->data.end());
+	const uint8_t* delta = entry.delta.data();
+	const uint8_t* end = delta + entry.delta.size();
+	size_t pos = 0;
+	while (delta < end) {
+		pos += getVarint(&delta);
+		size_t length = getVarint(&delta);
+		memcpy(&(*out)[pos], delta, length);
+		delta += length;
+		pos += length;
+	}
+	return true;
+}
+
+bool StateStore::contains(int64_t id) const {
+	return m_entries.find(id) != m_entries.end();
+}
+
+void StateStore::release(Entry& entry) {
+	m_bytes -= entry.delta.size() + sizeof(Entry);
+	--entry.keyframe->users;
+	if (!entry.keyframe->users && entry.keyframe != m_keyframe) {
+		m_bytes -= entry.keyframe->data.size();
+	}
+	m_lru.erase(entry.lru);
+}
+
+bool StateStore::discard(int64_t id) {
+	auto iter = m_entries.find(id);
+	if (iter == m_entries.end()) {
+		return false;
+	}
+	release(iter->second);
+	m_entries.erase(iter);
+	return true;
+}
+
+void StateStore::clear() {
+	m_entries.clear();
+	m_lru.clear();
+	m_keyframe.reset();
+	m_bytes = 0;
+}
+
+void StateStore::setBudget(size_t budget) {
+	m_budget = budget;
+	evict(m_lru.empty() ? 0 : m_lru.front());
+}
+
+void StateStore::evict(int64_t keep) {
+	if (!m_budget) {
+		return;
+	}
+	while (m_bytes > m_budget && !m_lru.empty() && m_lru.back() != keep) {
+		discard(m_lru.back());
+		++m_evictions;
+	}
+}
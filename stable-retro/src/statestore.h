@@ -0,0 +1,54 @@
+#pragma once
+
+#include <cstddef>
+#include <cstdint>
+#include <list>
+#include <memory>
+#include <unordered_map>
+#include <vector>
+
+namespace Retro {
+
+// Savestates kept in memory as deltas against a shared keyframe. Only the
+// byte ranges that differ from the keyframe are stored, and the least
+// recently used states are dropped once the store grows past its budget.
+class StateStore {
+public:
+	StateStore(size_t budget = 0);
+
+	void put(int64_t id, const uint8_t* data, size_t size);
+	bool get(int64_t id, std::vector<uint8_t>* out);
+	bool contains(int64_t id) const;
+	bool discard(int64_t id);
+	void clear();
+
+	size_t size() const { return m_entries.size(); }
+	size_t bytes() const { return m_bytes; }
+	size_t budget() const { return m_budget; }
+	void setBudget(size_t budget);
+	size_t evictions() const { return m_evictions; }
+
+private:
+	struct Keyframe {
+		std::vector<uint8_t> data;
+		size_t users = 0;
+	};
+
+	struct Entry {
+		std::shared_ptr<Keyframe> keyframe;
+		std::vector<uint8_t> delta;
+		std::list<int64_t>::iterator lru;
+	};
+
+	void encode(const uint8_t* data, size_t size, const Keyframe& keyframe, std::vector<uint8_t>* delta) const;
+	void release(Entry& entry);
+	void evict(int64_t keep);
+
+	std::unordered_map<int64_t, Entry> m_entries;
+	std::list<int64_t> m_lru;
+	std::shared_ptr<Keyframe> m_keyframe;
+	size_t m_budget;
+	size_t m_bytes = 0;
+	size_t m_evictions = 0;
+};
+}
@@ -121,6 +121,31 @@ TEST(GameData, Delta) {
 	data.updateRam();
 	EXPECT_EQI(data.lookupValue("foo"), 2);
 	EXPECT_EQI(data.lookupDelta("foo"), 1);
+
+	ram[0] = 5;
+	data.updateRam();
+	EXPECT_EQI(data.lookupDelta("foo"), 3);
+}
+
+TEST(GameData, VariableSnapshots) {
+	GameData data;
+	uint8_t ram[] = { 1, 7 };
+	data.addressSpace().addBlock(0, sizeof(ram), ram);
+	data.setVariable("foo", {"|u1", 0});
+	data.setVariable("bar", {"|u1", 8});
+	data.setVariableSnapshots(true);
+	data.updateRam();
+	EXPECT_EQI(data.lookupDelta("foo"), 0);
+
+	ram[0] = 4;
+	ram[1] = 9;
+	data.updateRam();
+	EXPECT_EQI(data.lookupDelta("foo"), 3);
+	EXPECT_EQI(data.lookupDelta("bar"), 0);
+	EXPECT_EQI(data.lookupDelta("baz"), 0);
+
+	data.updateRam();
+	EXPECT_EQI(data.lookupDelta("foo"), 0);
 }
 
 TEST(Scenario, Measurement) {
@@ -129,6 +129,28 @@ TEST_P(EmulatorTest, States) {
 	e.run();
 }
 
+TEST_P(EmulatorTest, MultipleInstances) {
+	const auto& param = GetParam();
+	Emulator e;
+	Emulator f;
+	ASSERT_TRUE(e.loadRom("roms/" + param.rom));
+	ASSERT_TRUE(f.loadRom("roms/" + param.rom));
+	e.run();
+	f.run();
+	ASSERT_EQ(e.serializeSize(), f.serializeSize());
+
+	vector<uint8_t> v(e.serializeSize());
+	vector<uint8_t> w(f.serializeSize());
+	EXPECT_TRUE(e.serialize(v.data(), v.size()));
+	e.run();
+	EXPECT_TRUE(f.serialize(w.data(), w.size()));
+	EXPECT_EQ(v, w);
+
+	f.unloadCore();
+	EXPECT_TRUE(e.unserialize(v.data(), v.size()));
+	e.run();
+}
+
 vector<EmulatorTestParam> s_systems{
 	{ "Nes", "Dr88-FamiconIntro.nes" },
 	{ "Snes", "Anthrox-SineDotDemo.sfc" },
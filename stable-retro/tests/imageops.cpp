@@ -0,0 +1,48 @@
+#include "gtest/gtest.h"
+#include "gmock/gmock.h"
+
+#include "imageops.h"
+
+#include <vector>
+
+using namespace std;
+using namespace ::testing;
+
+namespace Retro {
+
+TEST(Image, X888To888) {
+	// 17 wide so that the last pixel of each row misses the SIMD loop
+	const size_t w = 17, h = 2;
+	vector<uint32_t> in(w * h);
+	for (size_t i = 0; i < in.size(); ++i) {
+		in[i] = 0xFF000000 | (i << 16) | ((i + 0x40) << 8) | (i + 0x80);
+	}
+	vector<uint8_t> out(w * h * 3);
+	Image src(Image::Format::RGBX888, in.data(), w, h, w * 4);
+	Image dst(Image::Format::RGB888, out.data(), w, h, w * 3);
+	src.copyTo(&dst);
+	for (size_t i = 0; i < in.size(); ++i) {
+		EXPECT_EQ(out[i * 3], i) << "pixel " << i;
+		EXPECT_EQ(out[i * 3 + 1], i + 0x40) << "pixel " << i;
+		EXPECT_EQ(out[i * 3 + 2], i + 0x80) << "pixel " << i;
+	}
+}
+
+TEST(Image, 565To888) {
+	const size_t w = 17, h = 2;
+	vector<uint16_t> in(w * h);
+	for (size_t i = 0; i < in.size(); ++i) {
+		in[i] = (i << 11) | ((i + 8) << 5) | (31 - i % 32);
+	}
+	vector<uint8_t> out(w * h * 3);
+	Image src(Image::Format::RGB565, in.data(), w, h, w * 2);
+	Image dst(Image::Format::RGB888, out.data(), w, h, w * 3);
+	src.copyTo(&dst);
+	for (size_t i = 0; i < in.size(); ++i) {
+		EXPECT_EQ(out[i * 3], (i & 0x1F) << 3) << "pixel " << i;
+		EXPECT_EQ(out[i * 3 + 1], ((i + 8) & 0x3F) << 2) << "pixel " << i;
+		EXPECT_EQ(out[i * 3 + 2], (31 - i % 32) << 3) << "pixel " << i;
+	}
+}
+
+}
@@ -0,0 +1,122 @@
+#include "gtest/gtest.h"
+#include "gmock/gmock.h"
+
+#include "movie-rmv.h"
+
+#include <cstdio>
+#include <fstream>
+#include <vector>
+
+using namespace std;
+using namespace ::testing;
+
+namespace Retro {
+
+class MovieRMVTest : public Test {
+protected:
+	void SetUp() override {
+		const TestInfo* test = UnitTest::GetInstance()->current_test_info();
+		m_path = TempDir() + "movie-" + test->name() + ".rmv";
+	}
+
+	void TearDown() override {
+		remove(m_path.c_str());
+	}
+
+	void record(unsigned frames, unsigned interval, bool state = true) {
+		MovieRMV movie(m_path, true, 2, interval);
+		ASSERT_TRUE(movie.ok());
+		movie.setGameName("Test-Nes");
+		if (state) {
+			vector<uint8_t> initial{ 1, 2, 3 };
+			movie.setState(initial.data(), initial.size());
+		}
+		for (unsigned frame = 0; frame < frames; ++frame) {
+			if (movie.wantsKeyframe()) {
+				vector<uint8_t> keyframe(4, static_cast<uint8_t>(frame));
+				movie.addKeyframe(keyframe.data(), keyframe.size());
+			}
+			movie.setKey(frame % 12, true, 0);
+			movie.setKey(15, frame & 1, 1);
+			EXPECT_TRUE(movie.step());
+		}
+		movie.close();
+	}
+
+	string m_path;
+};
+
+TEST_F(MovieRMVTest, RoundTrip) {
+	record(25, 10);
+	unique_ptr<Movie> movie = MovieRMV::load(m_path);
+	ASSERT_TRUE(movie);
+	EXPECT_EQ(movie->getGameName(), "Test-Nes");
+	EXPECT_EQ(movie->players(), 2);
+	EXPECT_EQ(movie->frames(), 25);
+
+	vector<uint8_t> state;
+	ASSERT_TRUE(movie->getState(&state));
+	EXPECT_THAT(state, ElementsAre(1, 2, 3));
+
+	for (unsigned frame = 0; frame < 25; ++frame) {
+		ASSERT_TRUE(movie->step());
+		for (int key = 0; key < 16; ++key) {
+			EXPECT_EQ(movie->getKey(key, 0), key == frame % 12);
+			EXPECT_EQ(movie->getKey(key, 1), key == 15 && (frame & 1));
+		}
+	}
+	EXPECT_FALSE(movie->step());
+	EXPECT_EQ(movie->position(), 25);
+}
+
+TEST_F(MovieRMVTest, Seek) {
+	record(25, 10);
+	unique_ptr<Movie> movie = MovieRMV::load(m_path);
+	ASSERT_TRUE(movie);
+
+	vector<uint8_t> state;
+	size_t keyframe;
+	ASSERT_TRUE(movie->getKeyframe(9, &state, &keyframe));
+	EXPECT_EQ(keyframe, 0);
+	EXPECT_THAT(state, ElementsAre(1, 2, 3));
+	ASSERT_TRUE(movie->getKeyframe(10, &state, &keyframe));
+	EXPECT_EQ(keyframe, 10);
+	EXPECT_THAT(state, ElementsAre(10, 10, 10, 10));
+	ASSERT_TRUE(movie->getKeyframe(100, &state, &keyframe));
+	EXPECT_EQ(keyframe, 20);
+
+	ASSERT_TRUE(movie->seek(17));
+	ASSERT_TRUE(movie->step());
+	EXPECT_TRUE(movie->getKey(5, 0));
+	EXPECT_TRUE(movie->getKey(15, 1));
+	EXPECT_TRUE(movie->seek(25));
+	EXPECT_FALSE(movie->step());
+	EXPECT_FALSE(movie->seek(26));
+}
+
+TEST_F(MovieRMVTest, NoState) {
+	record(15, 10, false);
+	unique_ptr<Movie> movie = MovieRMV::load(m_path);
+	ASSERT_TRUE(movie);
+
+	vector<uint8_t> state;
+	size_t keyframe;
+	EXPECT_FALSE(movie->getState(&state));
+	EXPECT_FALSE(movie->getKeyframe(5, &state, &keyframe));
+	ASSERT_TRUE(movie->getKeyframe(12, &state, &keyframe));
+	EXPECT_EQ(keyframe, 10);
+}
+
+TEST_F(MovieRMVTest, Unfinished) {
+	{
+		MovieRMV movie(m_path, true);
+		movie.step();
+		ofstream copy(m_path + ".part", ios::binary);
+		ifstream original(m_path, ios::binary);
+		copy << original.rdbuf();
+	}
+	EXPECT_FALSE(MovieRMV::load(m_path + ".part"));
+	EXPECT_TRUE(MovieRMV::load(m_path));
+	remove((m_path + ".part").c_str());
+}
+}
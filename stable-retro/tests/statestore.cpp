@@ -0,0 +1,90 @@
+#include "gtest/gtest.h"
+#include "gmock/gmock.h"
+
+#include "statestore.h"
+
+#include <vector>
+
+using namespace std;
+using namespace ::testing;
+
+namespace Retro {
+
+static vector<uint8_t> makeState(size_t size, uint8_t seed) {
+	vector<uint8_t> state(size);
+	for (size_t i = 0; i < size; ++i) {
+		state[i] = static_cast<uint8_t>(i * 7);
+	}
+	for (size_t i = seed; i < size; i += 97) {
+		state[i] = seed;
+	}
+	return state;
+}
+
+TEST(StateStore, RoundTrip) {
+	StateStore store;
+	vector<vector<uint8_t>> states;
+	for (uint8_t i = 0; i < 20; ++i) {
+		states.emplace_back(makeState(4096, i));
+		store.put(i, states.back().data(), states.back().size());
+	}
+	EXPECT_EQ(store.size(), 20);
+	EXPECT_LT(store.bytes(), 4096 * 4);
+
+	vector<uint8_t> out;
+	for (uint8_t i = 0; i < 20; ++i) {
+		ASSERT_TRUE(store.get(i, &out));
+		EXPECT_EQ(out, states[i]);
+	}
+	EXPECT_FALSE(store.get(20, &out));
+}
+
+TEST(StateStore, NewKeyframe) {
+	StateStore store;
+	vector<uint8_t> first = makeState(1024, 1);
+	vector<uint8_t> other(1024, 0xAA);
+	vector<uint8_t> shorter = makeState(512, 2);
+	store.put(0, first.data(), first.size());
+	store.put(1, other.data(), other.size());
+	store.put(2, shorter.data(), shorter.size());
+
+	vector<uint8_t> out;
+	ASSERT_TRUE(store.get(0, &out));
+	EXPECT_EQ(out, first);
+	ASSERT_TRUE(store.get(1, &out));
+	EXPECT_EQ(out, other);
+	ASSERT_TRUE(store.get(2, &out));
+	EXPECT_EQ(out, shorter);
+
+	EXPECT_TRUE(store.discard(0));
+	EXPECT_TRUE(store.discard(1));
+	EXPECT_FALSE(store.discard(1));
+	EXPECT_TRUE(store.discard(2));
+	EXPECT_EQ(store.bytes(), 512);
+	store.clear();
+	EXPECT_EQ(store.bytes(), 0);
+}
+
+TEST(StateStore, Budget) {
+	vector<uint8_t> key = makeState(4096, 0);
+	StateStore store;
+	store.put(0, key.data(), key.size());
+	vector<uint8_t> state = makeState(4096, 1);
+	store.put(1, state.data(), state.size());
+	size_t delta = store.bytes() - key.size();
+
+	store.setBudget(key.size() + delta * 4);
+	for (uint8_t i = 2; i < 10; ++i) {
+		state = makeState(4096, i);
+		store.put(i, state.data(), state.size());
+		EXPECT_LE(store.bytes(), store.budget());
+	}
+	EXPECT_GT(store.evictions(), 0);
+	EXPECT_TRUE(store.contains(9));
+	EXPECT_FALSE(store.contains(0));
+
+	vector<uint8_t> out;
+	ASSERT_TRUE(store.get(9, &out));
+	EXPECT_EQ(out, state);
+}
+}
@@ -0,0 +1,39 @@
+import json
+import os
+
+import retro.benchmark
+
+
+def test_benchmark(tmp_path):
+    roms = os.path.join(os.path.dirname(__file__), "../roms")
+    output = tmp_path / "benchmark.json"
+    retro.benchmark.main(
+        [
+            "--roms",
+            roms,
+            "--system",
+            "Nes",
+            "--frames",
+            "10",
+            "--steps",
+            "10",
+            "--processes",
+            "2",
+            "--startup-runs",
+            "1",
+            "--output",
+            str(output),
+        ],
+    )
+
+    with open(output) as f:
+        report = json.load(f)
+    assert report["cores"]["fceumm"]["fps"] > 0
+    phases = report["env_us"]["Dr88-FamiconIntro"]
+    for phase in ["action_decode", "emulate", "update_ram", "obs", "lookup_all"]:
+        assert phases[phase] > 0
+    assert phases["step"] > phases["emulate"]
+    vec = report["vec"]["Dr88-FamiconIntro"]
+    assert [run["processes"] for run in vec] == [1, 2]
+    assert 0 < report["startup_ms"]["import"] < report["startup_ms"]["import_env"]
+    assert not retro.data.Integrations.CUSTOM_ONLY.paths
@@ -1,5 +1,13 @@
+import asyncio
+import gzip
+import json
 import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+import gymnasium as gym
+import numpy as np
 import pytest
 
 import retro
@@ -36,7 +44,8 @@ def generate_test_env(request):
 
     yield create
 
-    created_env[0].close()
+    for env in created_env:
+        env.close()
     del created_env
 
     retro.data.get_file_path = get_file_path_fn
@@ -87,3 +96,1096 @@ def test_env_data(generate_test_env):
     with pytest.raises(KeyError):
         val = env.data["foo"]
         assert val
+
+
+def test_env_multiple(generate_test_env):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+
+    env1 = generate_test_env(info=json_path, scenario=json_path, render_mode=None)
+    env2 = generate_test_env(info=json_path, scenario=json_path, render_mode=None)
+    obs1, _ = env1.reset()
+    obs2, _ = env2.reset()
+    assert (obs1 == obs2).all()
+
+    state = env1.em.get_state()
+    for _ in range(10):
+        action = env1.action_space.sample()
+        obs1, *_ = env1.step(action)
+        obs2, *_ = env2.step(action)
+        assert (obs1 == obs2).all()
+    assert env1.em.get_state() != state
+
+    env2.close()
+    env1.em.set_state(state)
+    assert env1.em.get_state() == state
+
+
+@pytest.mark.parametrize("obs_type", [retro.Observations.IMAGE, retro.Observations.RAM])
+@pytest.mark.parametrize(
+    "actions",
+    [retro.Actions.FILTERED, retro.Actions.DISCRETE, retro.Actions.MULTI_DISCRETE],
+)
+def test_vec_env(obs_type, actions, generate_test_env):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+    kwargs = dict(
+        info=json_path,
+        scenario=json_path,
+        obs_type=obs_type,
+        use_restricted_actions=actions,
+    )
+
+    envs = [generate_test_env(render_mode=None, **kwargs) for _ in range(2)]
+    venv = retro.VecRetroEnv(envs[0].gamename, 2, state=retro.State.NONE, **kwargs)
+    try:
+        assert venv.observation_space.shape == (2,) + envs[0].observation_space.shape
+
+        # Start both sides from the same state, since power-on RAM is not
+        # guaranteed to be identical between core instances
+        for i, env in enumerate(envs):
+            state = venv.envs[i].em.get_state()
+            venv.envs[i].initial_state = state
+            env.initial_state = state
+
+        obs, info = venv.reset()
+        for i, env in enumerate(envs):
+            assert (obs[i] == env.reset()[0]).all()
+
+        for _ in range(10):
+            action = venv.action_space.sample()
+            obs, rew, terminated, truncated, info = venv.step(action)
+            assert obs in venv.observation_space
+            for i, env in enumerate(envs):
+                ob, r, term, trunc, inf = env.step(action[i])
+                assert (obs[i] == ob).all()
+                assert rew[i] == r
+                assert terminated[i] == term
+                assert truncated[i] == trunc
+                for key in venv.info_keys:
+                    assert info[key][i] == inf[key]
+    finally:
+        venv.close()
+
+
+@pytest.mark.parametrize("obs_type", [retro.Observations.IMAGE, retro.Observations.RAM])
+def test_subproc_vec_env(obs_type, generate_test_env, tmp_path):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+    kwargs = dict(
+        info=json_path,
+        scenario=json_path,
+        obs_type=obs_type,
+        use_restricted_actions=retro.Actions.DISCRETE,
+    )
+
+    envs = [generate_test_env(render_mode=None, **kwargs) for _ in range(3)]
+    # Every worker loads the same savestate, since power-on RAM is not
+    # guaranteed to be identical between core instances
+    state = envs[0].em.get_state()
+    with gzip.open(tmp_path / "start.state", "wb") as f:
+        f.write(state)
+    get_file_path = retro.data.get_file_path
+    retro.data.get_file_path = lambda game, file, *args, **kwargs: (
+        str(tmp_path / file) if file == "start.state" else get_file_path(game, file)
+    )
+    try:
+        venv = retro.SubprocVecRetroEnv(
+            envs[0].gamename,
+            3,
+            state="start",
+            num_workers=2,
+            context="fork",
+            **kwargs,
+        )
+    finally:
+        retro.data.get_file_path = get_file_path
+    try:
+        assert venv.observation_space.shape == (3,) + envs[0].observation_space.shape
+        for env in envs:
+            env.initial_state = state
+
+        obs, info = venv.reset(seed=0)
+        for i, env in enumerate(envs):
+            assert (obs[i] == env.reset()[0]).all()
+
+        for _ in range(10):
+            action = venv.action_space.sample()
+            obs, rew, terminated, truncated, info = venv.step(action)
+            assert obs in venv.observation_space
+            for i, env in enumerate(envs):
+                ob, r, term, trunc, inf = env.step(action[i])
+                assert (obs[i] == ob).all()
+                assert rew[i] == r
+                assert terminated[i] == term
+                assert truncated[i] == trunc
+                for key in venv.info_keys:
+                    assert info[key][i] == inf[key]
+
+        screens = venv.render()
+        for screen, env in zip(screens, envs):
+            assert (screen == env.get_screen()).all()
+
+        # A failure in one worker must not leave the other replies queued
+        with pytest.raises(RuntimeError):
+            venv.step(np.array([0, 0, None]))
+        obs, info = venv.reset(seed=0)
+        for i, env in enumerate(envs):
+            assert (obs[i] == env.reset()[0]).all()
+        action = venv.action_space.sample()
+        obs, *_ = venv.step(action)
+        for i, env in enumerate(envs):
+            assert (obs[i] == env.step(action[i])[0]).all()
+    finally:
+        venv.close()
+
+
+def test_env_screen_buffer(generate_test_env):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+
+    env = generate_test_env(info=json_path, scenario=json_path, render_mode=None)
+    env.reset()
+    full = env.em.get_screen()
+    h, w, _ = full.shape
+
+    out = np.zeros([2, h, w, 3], dtype=np.uint8)
+    env.em.get_screen(out=out[1])
+    assert (out[1] == full).all()
+    assert not out[0].any()
+
+    crop = (3, 5, w // 2, h // 2)
+    out = np.zeros([h // 2, w // 2, 3], dtype=np.uint8)
+    env.em.get_screen(out=out, crop=crop)
+    assert (out == full[5 : 5 + h // 2, 3 : 3 + w // 2]).all()
+    assert (env.em.get_screen(crop=crop) == out).all()
+
+    # A width that is not a multiple of 16 goes through the scalar tail
+    crop = (3, 5, 17, 9)
+    assert (env.em.get_screen(crop=crop) == full[5:14, 3:20]).all()
+
+    with pytest.raises(RuntimeError):
+        env.em.get_screen(out=np.zeros([h, w, 3], dtype=np.float32))
+    with pytest.raises(RuntimeError):
+        env.em.get_screen(out=np.zeros([h, w + 1, 3], dtype=np.uint8))
+
+
+@pytest.mark.parametrize("obs_type", [retro.Observations.IMAGE, retro.Observations.RAM])
+def test_env_double_buffer(obs_type, generate_test_env):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+
+    env = generate_test_env(
+        info=json_path,
+        scenario=json_path,
+        obs_type=obs_type,
+        render_mode=None,
+        double_buffer=True,
+    )
+    ob0, _ = env.reset()
+    ob1, *_ = env.step(env.action_space.sample())
+    ob2, *_ = env.step(env.action_space.sample())
+    assert ob0 is not ob1
+    assert ob0 is ob2
+    assert ob1 in env.observation_space
+
+
+def test_env_preprocess(generate_test_env):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+
+    env = generate_test_env(info=json_path, scenario=json_path, render_mode=None)
+    pre = generate_test_env(
+        info=json_path,
+        scenario=json_path,
+        render_mode=None,
+        grayscale=True,
+        resize=(84, 84),
+        frame_stack=4,
+    )
+    assert pre.observation_space.shape == (84, 84, 4)
+
+    obs, _ = pre.reset()
+    assert obs in pre.observation_space
+    for i in range(1, 4):
+        assert (obs[:, :, i] == obs[:, :, 0]).all()
+
+    prev = obs[:, :, 3].copy()
+    obs, *_ = pre.step(pre.action_space.sample())
+    assert (obs[:, :, 2] == prev).all()
+
+    # An exact 2x downscale averages each 2x2 block before converting to gray
+    env.reset()
+    screen = env.get_screen().astype(np.uint32)
+    h, w = screen.shape[0] // 2, screen.shape[1] // 2
+    env.em.configure_observation(width=w, height=h, grayscale=True)
+    gray = env.get_observation()
+    assert gray.shape == (h, w, 1)
+    blocks = screen[: h * 2, : w * 2].reshape(h, 2, w, 2, 3).sum(axis=(1, 3))
+    rgb = (blocks + 2) // 4
+    expected = (rgb[..., 0] * 77 + rgb[..., 1] * 150 + rgb[..., 2] * 29 + 128) >> 8
+    assert (gray[..., 0] == expected).all()
+
+
+def test_env_frameskip(generate_test_env):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+    kwargs = dict(info=json_path, scenario=json_path, render_mode=None)
+
+    with pytest.raises(ValueError):
+        generate_test_env(frameskip=0, **kwargs)
+    for sticky_prob in (-0.1, 1.5):
+        with pytest.raises(ValueError):
+            generate_test_env(sticky_prob=sticky_prob, **kwargs)
+
+    ref = generate_test_env(**kwargs)
+    ref_sticky = generate_test_env(**kwargs)
+    skip = generate_test_env(frameskip=4, **kwargs)
+    pooled = generate_test_env(frameskip=4, max_pool=True, **kwargs)
+    sticky = generate_test_env(frameskip=4, sticky_prob=1.0, **kwargs)
+    for env in (ref, ref_sticky, skip, pooled, sticky):
+        env.reset()
+
+    held = None
+    for _ in range(5):
+        action = ref.action_space.sample()
+        frames = [ref.step(action) for _ in range(4)]
+
+        ob, rew, *_ = skip.step(action)
+        assert (ob == frames[-1][0]).all()
+        assert rew == sum(frame[1] for frame in frames)
+
+        ob, *_ = pooled.step(action)
+        assert (ob == np.maximum(frames[-2][0], frames[-1][0])).all()
+
+        # The previous action is held for the first frame of each step
+        ref_sticky.step(action if held is None else held)
+        for _ in range(3):
+            expected, *_ = ref_sticky.step(action)
+        ob, *_ = sticky.step(action)
+        assert (ob == expected).all()
+        held = action
+
+
+def _ending_scenario(generate_test_env, tmp_path):
+    """
+    Write a scenario that ends when the test variable first changes under a
+    null action, and return it with the observations up to that frame
+    """
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+    ref = generate_test_env(info=json_path, scenario=json_path, render_mode=None)
+    ref.reset()
+    state = ref.em.get_state()
+    action = np.zeros(ref.action_space.shape, dtype=ref.action_space.dtype)
+    initial = ref.data.lookup_value(ref.system)
+    frames = []
+    for _ in range(300):
+        ob, *_ = ref.step(action)
+        frames.append(ob.copy())
+        if ref.data.lookup_value(ref.system) != initial:
+            break
+    else:
+        pytest.skip("The test variable never changes")
+
+    scenario_path = tmp_path / "scenario.json"
+    done = {"variables": {ref.system: {"op": "not-equal", "reference": initial}}}
+    scenario_path.write_text(json.dumps({"done": done}))
+    return str(scenario_path), state, action, frames, ref
+
+
+def test_env_frameskip_done(generate_test_env, tmp_path):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+    scenario_path, state, action, frames, _ = _ending_scenario(
+        generate_test_env,
+        tmp_path,
+    )
+
+    # The episode ends on a frame in the middle of the frameskip
+    kwargs = dict(
+        info=json_path,
+        scenario=scenario_path,
+        frameskip=len(frames) + 2,
+        render_all_frames=True,
+    )
+    env = generate_test_env(render_mode=None, **kwargs)
+    env.reset()
+    ob, _, terminated, *_ = env.step(action)
+    assert terminated
+    assert (ob == frames[-1]).all()
+
+    venv = retro.VecRetroEnv(env.gamename, 1, state=retro.State.NONE, **kwargs)
+    try:
+        venv.envs[0].initial_state = state
+        venv.reset()
+        _, _, terminated, _, info = venv.step([action])
+        assert terminated[0]
+        final = info["final_obs" if "final_obs" in info else "final_observation"]
+        assert (final[0] == frames[-1]).all()
+    finally:
+        venv.close()
+
+
+@pytest.mark.parametrize("vec_env", ["vec", "subproc"])
+def test_vec_env_autoreset(vec_env, generate_test_env, tmp_path):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+    scenario_path, state, action, frames, ref = _ending_scenario(
+        generate_test_env,
+        tmp_path,
+    )
+    kwargs = dict(info=json_path, scenario=scenario_path, frameskip=len(frames))
+    if vec_env == "vec":
+        venv = retro.VecRetroEnv(ref.gamename, 2, state=retro.State.NONE, **kwargs)
+        for env in venv.envs:
+            env.initial_state = state
+    else:
+        with gzip.open(tmp_path / "start.state", "wb") as f:
+            f.write(state)
+        get_file_path = retro.data.get_file_path
+        retro.data.get_file_path = lambda game, file, *args, **kwargs: (
+            str(tmp_path / file) if file == "start.state" else get_file_path(game, file)
+        )
+        try:
+            venv = retro.SubprocVecRetroEnv(
+                ref.gamename,
+                2,
+                state="start",
+                num_workers=2,
+                context="fork",
+                **kwargs,
+            )
+        finally:
+            retro.data.get_file_path = get_file_path
+    try:
+        if hasattr(gym.vector, "AutoresetMode"):
+            mode = gym.vector.AutoresetMode.SAME_STEP
+            assert venv.metadata["autoreset_mode"] == mode
+        obs, reset_info = venv.reset()
+        ob, _, terminated, _, info = venv.step([action] * 2)
+        assert terminated.all()
+        # Both environments were reset in the same step
+        assert (ob == obs).all()
+        for key in venv.info_keys:
+            assert (info[key] == reset_info[key]).all()
+
+        terminal = ref.data.lookup_all()
+        if int(gym.__version__.split(".")[0]) >= 1:
+            final_obs = info["final_obs"]
+            assert info["_final_obs"].all()
+            assert info["_final_info"].all()
+            for key in venv.info_keys:
+                assert (info["final_info"][key] == terminal[key]).all()
+        else:
+            final_obs = info["final_observation"]
+            for final in info["final_info"]:
+                assert final == {key: terminal[key] for key in venv.info_keys}
+        for ob in final_obs:
+            assert (ob == frames[-1]).all()
+    finally:
+        venv.close()
+
+
+def test_env_want_render(generate_test_env):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+
+    env = generate_test_env(info=json_path, scenario=json_path, render_mode=None)
+    ref = generate_test_env(info=json_path, scenario=json_path, render_mode=None)
+    assert env.supports_want_render
+
+    ob, _ = env.reset()
+    ref.reset()
+    for _ in range(3):
+        action = env.action_space.sample()
+        skipped, *_ = env.step(action, want_render=False)
+        assert skipped is ob
+        ref.step(action)
+
+    action = env.action_space.sample()
+    ob, *_ = env.step(action)
+    expected, *_ = ref.step(action)
+    assert (ob == expected).all()
+
+
+def test_env_audio(generate_test_env):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+
+    env = generate_test_env(info=json_path, scenario=json_path, render_mode=None)
+    muted = generate_test_env(
+        info=json_path,
+        scenario=json_path,
+        render_mode=None,
+        audio=False,
+    )
+    assert env.em.is_audio_enabled()
+    assert not muted.em.is_audio_enabled()
+
+    env.reset()
+    muted.reset()
+    env.em.step()
+    muted.em.step()
+    sound = env.em.get_audio()
+    assert len(sound) > 0
+    assert len(muted.em.get_audio()) == 0
+    assert env.em.get_audio_ring() is None
+
+    capacity = len(sound) * 3 + 1
+    env.em.configure_audio_ring(capacity)
+    ring = env.em.get_audio_ring()
+    assert ring.shape == (capacity, 2)
+    assert not ring.flags.writeable
+
+    chunks = []
+    for _ in range(5):
+        env.em.step()
+        chunks.append(env.em.get_audio())
+        assert len(chunks[-1]) > 0
+    history = np.concatenate(chunks)
+    written = env.em.get_audio_ring_written()
+    assert written == len(history)
+    assert (np.roll(ring, -(written % capacity), axis=0) == history[-capacity:]).all()
+
+    # Views of a replaced ring keep their own storage
+    old = ring.copy()
+    env.em.configure_audio_ring(capacity * 2)
+    env.em.step()
+    assert env.em.get_audio_ring().shape == (capacity * 2, 2)
+    assert (ring == old).all()
+    env.em.configure_audio_ring(0)
+    assert env.em.get_audio_ring() is None
+    assert (ring == old).all()
+
+
+def test_env_info_keys(generate_test_env):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+
+    packed = generate_test_env(
+        info=json_path,
+        scenario=json_path,
+        render_mode=None,
+        info_array=True,
+    )
+    env = generate_test_env(
+        info=json_path,
+        scenario=json_path,
+        render_mode=None,
+        info_keys=[packed.system],
+    )
+    assert packed.info_keys == sorted(packed.data.lookup_all())
+    with pytest.raises(KeyError):
+        generate_test_env(info=json_path, scenario=json_path, info_keys=["foo"])
+
+    env.reset()
+    packed.reset()
+    action = env.action_space.sample()
+    *_, info = env.step(action)
+    *_, first = packed.step(action)
+    assert info == {env.system: env.data[env.system]}
+    assert first.dtype.names == tuple(packed.info_keys)
+    for key, value in packed.data.lookup_all().items():
+        assert first[key] == value
+
+    packed.data.set_value(packed.system, 7)
+    *_, second = packed.step(action)
+    assert second is first
+    assert first[packed.system] == packed.data[packed.system]
+
+
+@pytest.mark.parametrize(
+    "actions",
+    [retro.Actions.ALL, retro.Actions.DISCRETE, retro.Actions.MULTI_DISCRETE],
+)
+@pytest.mark.parametrize("players", [1, 2])
+def test_env_action_tables(actions, players, generate_test_env):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+
+    env = generate_test_env(
+        info=json_path,
+        scenario=json_path,
+        render_mode=None,
+        use_restricted_actions=actions,
+        players=players,
+    )
+    batch = [env.action_space.sample() for _ in range(16)]
+    masks = env.decode_actions(batch)
+    assert masks.shape == (16, players, env.num_buttons)
+
+    for a, mask in zip(batch, masks):
+        assert (np.array(env.action_to_array(a)) == mask).all()
+        for p in range(players):
+            if actions == retro.Actions.DISCRETE:
+                expected = 0
+                index = a // len(env._action_table) ** p
+                for combo in env.button_combos:
+                    expected |= combo[index % len(combo)]
+                    index //= len(combo)
+            elif actions == retro.Actions.MULTI_DISCRETE:
+                groups = len(env.button_combos)
+                expected = 0
+                for combo, choice in zip(
+                    env.button_combos,
+                    a[groups * p : groups * (p + 1)],
+                ):
+                    expected |= combo[choice]
+            else:
+                expected = sum(
+                    int(b) << i
+                    for i, b in enumerate(a[env.num_buttons * p :][: env.num_buttons])
+                )
+            assert [(expected >> i) & 1 for i in range(env.num_buttons)] == list(
+                mask[p],
+            )
+
+    env.reset()
+    env.step(batch[0])
+
+
+def test_env_step_async(generate_test_env):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+
+    env = generate_test_env(info=json_path, scenario=json_path, render_mode=None)
+    env.initial_state = env.em.get_state()
+    actions = [env.action_space.sample() for _ in range(10)]
+
+    env.reset()
+    expected = [env.step(action) for action in actions]
+    expected = [(ob.copy(), rew, term, info) for ob, rew, term, _, info in expected]
+
+    async def run():
+        results = []
+        for action in actions:
+            await asyncio.wrap_future(env.step_async(action))
+            ob, rew, term, _, info = env.step_wait()
+            results.append((ob.copy(), rew, term, info))
+        return results
+
+    env.reset()
+    for (ob, rew, term, info), (eob, erew, eterm, einfo) in zip(
+        asyncio.run(run()),
+        expected,
+    ):
+        assert (ob == eob).all()
+        assert rew == erew
+        assert term == eterm
+        assert info == einfo
+
+    env.step_async(actions[0])
+    env.step_wait()
+    with pytest.raises(RuntimeError):
+        env.step_wait()
+
+    # A finished step has to be collected before the next one starts
+    env.step_async(actions[0]).result()
+    with pytest.raises(RuntimeError):
+        env.step_async(actions[1])
+    env.step_wait()
+
+
+def test_async_vec_env(generate_test_env):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+    kwargs = dict(
+        info=json_path,
+        scenario=json_path,
+        use_restricted_actions=retro.Actions.DISCRETE,
+    )
+
+    envs = [generate_test_env(render_mode=None, **kwargs) for _ in range(2)]
+    venv = retro.AsyncRetroVecEnv(
+        envs[0].gamename,
+        2,
+        state=retro.State.NONE,
+        **kwargs,
+    )
+    try:
+        for i, env in enumerate(envs):
+            state = venv.envs[i].em.get_state()
+            venv.envs[i].initial_state = state
+            env.initial_state = state
+
+        async def run():
+            obs, info = await venv.areset()
+            for i, env in enumerate(envs):
+                assert (obs[i] == env.reset()[0]).all()
+            for _ in range(10):
+                action = venv.action_space.sample()
+                pending = venv.astep(action)
+                expected = [env.step(action[i]) for i, env in enumerate(envs)]
+                obs, rew, terminated, truncated, info = await pending
+                for i, (ob, r, term, trunc, inf) in enumerate(expected):
+                    assert (obs[i] == ob).all()
+                    assert rew[i] == r
+                    assert terminated[i] == term
+                    for key in venv.info_keys:
+                        assert info[key][i] == inf[key]
+
+        asyncio.run(run())
+
+        venv.step_async(venv.action_space.sample())
+        obs, *_ = venv.step_wait()
+        assert obs in venv.observation_space
+        with pytest.raises(RuntimeError):
+            venv.step_wait()
+
+        venv.step_async(venv.action_space.sample()).result()
+        with pytest.raises(RuntimeError):
+            venv.step_async(venv.action_space.sample())
+        venv.step_wait()
+    finally:
+        venv.close()
+
+
+def test_env_variable_snapshots(generate_test_env, tmp_path):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+    system = generate_test_env(
+        info=json_path,
+        scenario=json_path,
+        render_mode=None,
+    ).system
+    scenario = str(tmp_path / "scenario.json")
+    with open(scenario, "w") as f:
+        json.dump({"reward": {"variables": {system: {"reward": 1}}}}, f)
+
+    envs = [
+        generate_test_env(info=json_path, scenario=scenario, render_mode=None)
+        for _ in range(2)
+    ]
+    assert not envs[0].data.variable_snapshots()
+    envs[1].data.set_variable_snapshots(True)
+    assert envs[1].data.variable_snapshots()
+
+    for env in envs:
+        env.reset(seed=0)
+    for _ in range(20):
+        action = envs[0].action_space.sample()
+        for env in envs:
+            env.data.set_value(system, (env.data[system] + 3) % 256)
+        rewards = [env.step(action)[1] for env in envs]
+        assert rewards[0] == rewards[1]
+
+
+def test_env_perf_stats(generate_test_env):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+
+    env = generate_test_env(info=json_path, scenario=json_path, render_mode=None)
+    with pytest.raises(RuntimeError):
+        env.perf_stats()
+
+    env = generate_test_env(
+        info=json_path,
+        scenario=json_path,
+        render_mode=None,
+        perf_stats=True,
+        frameskip=2,
+    )
+    env.reset()
+    for _ in range(10):
+        env.step(env.action_space.sample())
+    stats = env.perf_stats()
+    assert stats["steps"] == 10
+    assert stats["frames"] == 20
+    for key in ["run_ns", "update_ram_ns", "screen_ns", "info_ns", "step_ns"]:
+        assert stats[key] > 0
+    assert stats["step_ns"] > stats["run_ns"] + stats["screen_ns"]
+    assert stats["python_ns"] == stats["step_ns"] - sum(
+        stats[key]
+        for key in ["run_ns", "update_ram_ns", "scenario_ns", "screen_ns", "info_ns"]
+    )
+
+    assert env.perf_stats(reset=True) == stats
+    assert set(env.perf_stats().values()) == {0}
+    env.reset()
+    assert env.perf_stats()["frames"] == 0
+    env.step(env.action_space.sample())
+    assert env.perf_stats()["frames"] == 2
+
+
+def test_env_threads(generate_test_env):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+
+    envs = [
+        generate_test_env(info=json_path, scenario=json_path, render_mode=None)
+        for _ in range(5)
+    ]
+    state = envs[0].em.get_state()
+    actions = [envs[0].action_space.sample() for _ in range(20)]
+
+    def run(env):
+        env.initial_state = state
+        env.reset()
+        screens, audio, states = [], [], []
+        for i, action in enumerate(actions):
+            env.step(action)
+            if i == len(actions) // 2:
+                env.em.save_slot(0)
+            screens.append(env.em.get_screen())
+            audio.append(env.em.get_audio())
+            states.append(env.em.get_state())
+        env.em.load_slot(0)
+        states.append(env.em.get_state())
+        return screens, audio, states
+
+    # Audio timing is not part of the savestate, so every run needs an
+    # emulator that has not been stepped yet
+    expected = run(envs.pop())
+    with ThreadPoolExecutor(max_workers=len(envs)) as pool:
+        results = list(pool.map(run, envs))
+    for screens, audio, states in results:
+        for a, b in zip(screens, expected[0]):
+            assert (a == b).all()
+        for a, b in zip(audio, expected[1]):
+            assert (a == b).all()
+        assert states == expected[2]
+
+
+def test_movie_seek(generate_test_env, tmp_path):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+    env = generate_test_env(
+        info=json_path,
+        scenario=json_path,
+        render_mode=None,
+        frameskip=10,
+    )
+    env.initial_state = env.em.get_state()
+    env.record_movie(str(tmp_path / "movie.rmv"))
+    env.reset(seed=0)
+    for _ in range(150):
+        env.step(env.action_space.sample())
+    env.stop_record()
+
+    movie = retro.Movie(str(tmp_path / "movie.rmv"))
+    assert movie.frames == 1501
+    assert movie.get_game() == env.gamename
+    assert movie.get_state() == env.initial_state
+
+    # Savestates can differ in core bookkeeping that depends on the emulator's
+    # history, so seeking is checked against the RAM of a linear replay
+    env.em.set_state(movie.get_state())
+    rams = {}
+    while True:
+        rams[movie.position] = env.get_ram().copy()
+        if not movie.step():
+            break
+        for p in range(movie.players):
+            keys = [movie.get_key(i, p) for i in range(env.num_buttons)]
+            env.em.set_button_mask(np.array(keys, dtype=np.uint8), p)
+        env.em.step()
+    assert movie.position == 1501
+
+    for frame in [1234, 0, 600, 599, 1501, 601]:
+        movie.seek(frame, env.em)
+        assert movie.position == frame
+        assert (env.get_ram() == rams[frame]).all()
+    with pytest.raises(RuntimeError):
+        movie.seek(1502, env.em)
+
+
+def test_movie_export(generate_test_env, tmp_path):
+    from retro.scripts import playback_movie
+
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+    kwargs = dict(info=json_path, scenario=json_path)
+    env = generate_test_env(
+        render_mode=None,
+        use_restricted_actions=retro.Actions.ALL,
+        **kwargs,
+    )
+    env.initial_state = env.em.get_state()
+    env.record_movie(str(tmp_path / "movie.rmv"))
+    obs, _ = env.reset(seed=0)
+    observations = []
+    actions = []
+    for _ in range(50):
+        observations.append(obs.copy())
+        actions.append(env.action_space.sample())
+        obs, *_ = env.step(actions[-1])
+    env.stop_record()
+
+    try:
+        shards = playback_movie.export_movie(
+            str(tmp_path / "movie.rmv"),
+            str(tmp_path),
+            shard_size=16,
+            **kwargs,
+        )
+        os.mkdir(tmp_path / "other")
+        shutil.copy(tmp_path / "movie.rmv", tmp_path / "other" / "movie.rmv")
+        other = playback_movie.export_movie(
+            str(tmp_path / "other" / "movie.rmv"),
+            str(tmp_path),
+            shard_size=16,
+            **kwargs,
+        )
+        os.mkdir(tmp_path / "again")
+        again = playback_movie.export_movie(
+            str(tmp_path / "movie.rmv"),
+            str(tmp_path / "again"),
+            shard_size=64,
+            **kwargs,
+        )
+    finally:
+        playback_movie._export_env[0].close()
+        playback_movie._export_env = None
+    assert [shard["steps"] for shard in shards] == [16, 16, 16, 2]
+    # A movie with the same name in another directory does not overwrite them
+    assert not {shard["path"] for shard in shards} & {shard["path"] for shard in other}
+    data = [np.load(tmp_path / shard["path"]) for shard in shards]
+    assert (np.concatenate([d["obs"] for d in data]) == observations).all()
+    assert (np.concatenate([d["actions"] for d in data]) == actions).all()
+    assert np.concatenate([d["info"] for d in data]).dtype.names == tuple(
+        sorted(env.data.lookup_all()),
+    )
+
+    # The warm emulator is reset to the movie's state for the next one
+    [shard] = again
+    assert (np.load(tmp_path / "again" / shard["path"])["obs"] == observations).all()
+
+
+@pytest.mark.parametrize("double_buffer", [False, True])
+def test_env_record_trajectory(double_buffer, generate_test_env, tmp_path):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+    env = generate_test_env(
+        info=json_path,
+        scenario=json_path,
+        render_mode=None,
+        double_buffer=double_buffer,
+    )
+    env.record_trajectory(str(tmp_path), info_keys=[env.system], shard_size=16)
+    expected = {"obs": [], "actions": [], "info": []}
+    for steps in [30, 10]:
+        obs, _ = env.reset()
+        for _ in range(steps):
+            action = env.action_space.sample()
+            expected["obs"].append(obs.copy())
+            expected["actions"].append(action)
+            obs, _, _, _, info = env.step(action)
+            expected["info"].append(info[env.system])
+    env.stop_trajectory()
+
+    shards = retro.load_trajectory(str(tmp_path))
+    assert [len(shard["obs"]) for shard in shards] == [16, 16, 8]
+    assert isinstance(shards[0]["obs"], np.memmap)
+    for field in ["obs", "actions"]:
+        recorded = np.concatenate([shard[field] for shard in shards])
+        assert (recorded == expected[field]).all()
+    info = np.concatenate([shard["info"] for shard in shards])
+    assert (info[env.system] == expected["info"]).all()
+    assert not any(shard["terminated"].any() for shard in shards)
+
+    # Recording again appends to the same store
+    env.record_trajectory(str(tmp_path), info_keys=[env.system], shard_size=16)
+    env.reset()
+    env.step(env.action_space.sample())
+    env.stop_trajectory()
+    assert [len(shard["obs"]) for shard in retro.load_trajectory(str(tmp_path))] == [
+        16,
+        16,
+        8,
+        1,
+    ]
+    with pytest.raises(ValueError):
+        env.record_trajectory(str(tmp_path), info_keys=[])
+
+
+def test_env_slots(generate_test_env):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+
+    env = generate_test_env(info=json_path, scenario=json_path, render_mode=None)
+    env.reset()
+    with pytest.raises(RuntimeError):
+        env.em.load_slot(0)
+
+    assert env.em.save_slot(2)
+    state = env.em.get_state()
+    ram = env.get_ram()
+    with pytest.raises(RuntimeError):
+        env.em.load_slot(1)
+
+    for _ in range(10):
+        env.step(env.action_space.sample())
+    assert env.em.save_slot(0)
+    later = env.em.get_state()
+
+    assert env.em.load_slot(2)
+    assert env.em.get_state() == state
+    assert (env.get_ram() == ram).all()
+    assert env.em.load_slot(0)
+    assert env.em.get_state() == later
+
+    env.em.clear_slots()
+    with pytest.raises(RuntimeError):
+        env.em.load_slot(0)
+
+
+def test_state_store(generate_test_env):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+
+    env = generate_test_env(info=json_path, scenario=json_path, render_mode=None)
+    env.reset()
+    store = retro.StateStore()
+    states = []
+    for i in range(20):
+        env.step(env.action_space.sample())
+        if i % 2:
+            store.save(i, env.em)
+        else:
+            store.put(i, env.em.get_state())
+        states.append(env.em.get_state())
+    assert len(store) == 20
+    assert 19 in store
+    assert store.nbytes < sum(len(state) for state in states)
+
+    for i, state in enumerate(states):
+        assert store.get(i) == state
+    assert store.restore(3, env.em)
+    assert env.em.get_state() == states[3]
+    with pytest.raises(KeyError):
+        store.restore(20, env.em)
+
+    assert store.discard(0)
+    assert 0 not in store
+    # The budget includes the keyframe the deltas are taken against
+    store.budget = (store.nbytes + len(states[0])) // 2
+    assert store.nbytes <= store.budget
+    assert store.evictions > 0
+    assert store.get(19) == states[19]
+
+
+def test_env_reconfigure(generate_test_env, tmp_path):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+
+    env = generate_test_env(info=json_path, scenario=json_path, render_mode=None)
+    with open(json_path) as f:
+        variable = json.load(f)["info"][env.system]
+    other_path = str(tmp_path / "other.json")
+    with open(other_path, "w") as f:
+        json.dump({"info": {"other": variable}}, f)
+
+    env.reset()
+    env.step(env.action_space.sample())
+    em = env.em
+    env.reconfigure(retro.State.NONE, scenario=other_path, info=other_path)
+    assert env.em is em
+    assert set(env.data.lookup_all()) == {"other"}
+    with pytest.raises(RuntimeError):
+        env.step(env.action_space.sample())
+
+    env.reset()
+    *_, info = env.step(env.action_space.sample())
+    assert set(info) == {"other"}
+
+    with pytest.raises(AssertionError):
+        env.reconfigure(retro.State.NONE, info=str(tmp_path / "missing.json"))
+    assert set(env.data.lookup_all()) == {"other"}
+
+
+def test_make_pooled(generate_test_env):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+
+    try:
+        env = generate_test_env(
+            info=json_path,
+            scenario=json_path,
+            render_mode=None,
+            pooled=True,
+        )
+        other = generate_test_env(
+            info=json_path,
+            scenario=json_path,
+            render_mode=None,
+            pooled=True,
+        )
+        assert other is not env
+        em = env.em
+        env.close()
+        env.close()
+        assert hasattr(env, "em")
+
+        again = generate_test_env(
+            info=json_path,
+            scenario=json_path,
+            render_mode=None,
+            pooled=True,
+        )
+        assert again is env
+        assert again.em is em
+        again.reset()
+        again.step(again.action_space.sample())
+
+        # Closing waits for a running step and drops its thread
+        again.step_async(again.action_space.sample())
+        again.close()
+        assert again._pending is None and again._executor is None
+        again = generate_test_env(
+            info=json_path,
+            scenario=json_path,
+            render_mode=None,
+            pooled=True,
+        )
+        assert again is env
+        again.reset()
+        again.step_async(again.action_space.sample())
+        again.step_wait()
+
+        changed = generate_test_env(
+            info=json_path,
+            scenario=json_path,
+            render_mode=None,
+            pooled=True,
+            frameskip=2,
+        )
+        assert changed is not env
+    finally:
+        retro.clear_env_pool()
+
+
+def _sampling_policy(buttons):
+    return lambda obs: np.random.randint(0, 2, buttons)
+
+
+def _stalling_policy(delay):
+    def act(obs):
+        time.sleep(delay)
+        return np.zeros(9, dtype=np.uint8)
+
+    return act
+
+
+def test_population_evaluator(generate_test_env):
+    json_path = os.path.join(os.path.dirname(__file__), "../dummy.json")
+
+    env = generate_test_env(info=json_path, scenario=json_path, render_mode=None)
+    kwargs = dict(
+        state=retro.State.NONE,
+        info=json_path,
+        scenario=json_path,
+        use_restricted_actions=retro.Actions.ALL,
+        context="fork",
+    )
+    params = [env.num_buttons] * 4
+    with retro.PopulationEvaluator(
+        env.gamename,
+        _sampling_policy,
+        num_workers=2,
+        **kwargs,
+    ) as pool:
+        results = pool.evaluate(params, max_steps=20)
+        again = pool.evaluate(params, max_steps=20, seeds=[3, 2, 1, 0])
+    with retro.PopulationEvaluator(
+        env.gamename,
+        _sampling_policy,
+        num_workers=1,
+        **kwargs,
+    ) as pool:
+        serial = pool.evaluate(params, max_steps=20)
+
+    for result in results:
+        assert result.error is None
+        assert result.steps == 20
+        assert not result.done
+        assert not result.timed_out
+    for a, b, c in zip(results, reversed(again), serial):
+        assert a.info == b.info == c.info
+
+    with retro.PopulationEvaluator(
+        env.gamename,
+        _stalling_policy,
+        num_workers=1,
+        timeout=0.2,
+        **kwargs,
+    ) as pool:
+        slow, stuck = pool.evaluate([0.05, 1.0], max_steps=100)
+        assert slow.timed_out and slow.error is None and 0 < slow.steps < 100
+        assert stuck.timed_out and stuck.fitness is None and stuck.error
+        (fine,) = pool.evaluate([0.0], max_steps=5)
+        assert fine.steps == 5 and fine.error is None
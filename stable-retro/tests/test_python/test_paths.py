@@ -1,4 +1,8 @@
+import gzip
+import json
 import os
+import subprocess
+import sys
 
 import pytest
 
@@ -91,3 +95,104 @@ def test_custom_path_relative(custom_cleanup):
         "rom.md",
         inttype=retro.data.Integrations.STABLE,
     )
+
+
+@pytest.mark.parametrize("disk_cache", [False, True])
+def test_file_cache(tmp_path, monkeypatch, disk_cache):
+    monkeypatch.setattr(
+        retro.data,
+        "STATE_CACHE_DIR",
+        str(tmp_path / "cache") if disk_cache else None,
+    )
+    retro.data.clear_cache()
+
+    state_path = tmp_path / "test.state"
+    with gzip.open(state_path, "wb") as f:
+        f.write(b"state one")
+    json_path = tmp_path / "metadata.json"
+    json_path.write_text(json.dumps({"default_state": "test"}))
+
+    assert retro.data.load_state(str(state_path)) == b"state one"
+    assert retro.data.load_json(str(json_path)) == {"default_state": "test"}
+    assert retro.data.load_json(str(json_path)) is retro.data.load_json(str(json_path))
+    assert bool(disk_cache) == (tmp_path / "cache").exists()
+
+    # The disk cache survives clearing the in-process one
+    retro.data.clear_cache()
+    assert retro.data.load_state(str(state_path)) == b"state one"
+
+    # A rewritten file is picked up through its new size and modification time
+    with gzip.open(state_path, "wb") as f:
+        f.write(b"state number two")
+    json_path.write_text(json.dumps({"default_state": "other"}))
+    assert retro.data.load_state(str(state_path)) == b"state number two"
+    assert retro.data.load_json(str(json_path)) == {"default_state": "other"}
+    retro.data.clear_cache()
+
+
+def _touch_dir(path):
+    # Make sure the change is visible on filesystems with coarse timestamps
+    mtime = os.stat(path).st_mtime_ns + 2_000_000_000
+    os.utime(path, ns=(mtime, mtime))
+
+
+@pytest.mark.parametrize("disk_cache", [False, True])
+def test_integration_index(tmp_path, monkeypatch, custom_cleanup, disk_cache):
+    monkeypatch.setattr(
+        retro.data,
+        "INDEX_CACHE_DIR",
+        str(tmp_path / "cache") if disk_cache else None,
+    )
+    retro.data.clear_cache()
+    inttype = retro.data.Integrations.CUSTOM_ONLY
+    root = tmp_path / "custom"
+    game = root / "Test-Nes"
+    game.mkdir(parents=True)
+    (game / "rom.sha").write_text("0123\n4567\n")
+    (game / "Level1.state").write_bytes(b"")
+    (game / "_hidden.state").write_bytes(b"")
+    (game / "rom.nes").write_bytes(b"")
+    (root / "NoSha-Nes").mkdir()
+    retro.data.Integrations.add_custom_path(str(root))
+
+    assert retro.data.list_games(inttype) == ["Test-Nes"]
+    assert retro.data.list_states("Test-Nes", inttype) == ["Level1"]
+    assert retro.data.get_romfile_path("Test-Nes", inttype) == str(game / "rom.nes")
+    assert retro.data.get_file_path("Test-Nes", "rom.sha", inttype) == str(
+        game / "rom.sha",
+    )
+    assert not retro.data.get_file_path("Test-Nes", "data.json", inttype)
+    assert not retro.data.get_file_path("Missing-Nes", "rom.sha", inttype)
+    assert bool(disk_cache) == (tmp_path / "cache").exists()
+
+    # Added games and files are noticed through directory modification times
+    retro.data.clear_cache()
+    (root / "NoSha-Nes" / "rom.sha").write_text("89ab\n")
+    _touch_dir(root / "NoSha-Nes")
+    (game / "Level2.state").write_bytes(b"")
+    _touch_dir(game)
+    assert retro.data.list_games(inttype) == ["NoSha-Nes", "Test-Nes"]
+    assert retro.data.list_states("Test-Nes", inttype) == ["Level1", "Level2"]
+
+    (root / "Other-Nes").mkdir()
+    (root / "Other-Nes" / "rom.sha").write_text("cdef\n")
+    _touch_dir(root)
+    assert retro.data.list_games(inttype) == ["NoSha-Nes", "Other-Nes", "Test-Nes"]
+    retro.data.clear_cache()
+
+
+def test_lazy_import():
+    code = (
+        "import sys, retro\n"
+        "assert 'numpy' not in sys.modules and 'gymnasium' not in sys.modules\n"
+        "assert not retro.data._core_info_loaded\n"
+        "assert retro.get_romfile_system('game.nes') == 'Nes'\n"
+        "assert retro.data._core_info_loaded\n"
+        "assert retro.RetroEnv is retro.retro_env.RetroEnv\n"
+        "assert 'RetroEnv' in dir(retro)\n"
+    )
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [os.path.dirname(retro.ROOT_DIR), env.get("PYTHONPATH")]),
+    )
+    subprocess.run([sys.executable, "-c", code], env=env, check=True)